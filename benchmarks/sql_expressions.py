@@ -0,0 +1,64 @@
+"""
+Measures SQL expression translation throughput (expressions per second) for each target dialect over a mix of
+column references, literals, dimension/entity references and filters from a synthetic project, both through the
+expression cache and bypassing it.
+
+Usage: python -m benchmarks.sql_expressions [--models 200] [--seconds 2]
+"""
+import argparse
+import time
+
+import mf_translate.to_looker as to_looker
+import mf_translate.to_cube as to_cube
+import mf_translate.to_ldsh as to_ldsh
+
+from .synthetic_project import synthetic_manifests
+
+
+def expressions_for_model(i):
+    parent = f"model_{i - 1}"
+    return [
+        "amount_0 * 0.1",
+        "case when amount_1 > 10 then amount_2 else 0 end",
+        f"{{{{ Dimension('{parent}_id__{parent}_status') }}}} = 'complete'",
+        f"coalesce({{{{ Dimension('model_{i}_id__model_{i}_status') }}}}, 'amount_0') != 'STAFF_ORDER'\n and amount_3 > 0",
+        f"{{{{ Entity('model_{i}_id') }}}} is not null",
+    ]
+
+
+def measure(translate, model_pairs, seconds):
+
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for model, expressions in model_pairs:
+            for expression in expressions:
+                translate(expression, model)
+            count += len(expressions)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmarks SQL expression translation throughput.')
+    parser.add_argument('--models', type=int, default=200, help='Number of semantic models in the synthetic project.')
+    parser.add_argument('--seconds', type=float, default=2, help='Seconds to run each dialect for.')
+    args = parser.parse_args()
+
+    semantic_manifest, dbt_manifest = synthetic_manifests(args.models)
+    model_pairs = [(model, expressions_for_model(i))
+                   for i, model in enumerate(semantic_manifest['semantic_models']) if i > 0]
+
+    print(f"{'dialect':<10} {'uncached/s':>12} {'cached/s':>12}")
+    for dialect, translator, translate, translate_uncached in [
+            ('looker', to_looker, to_looker.sql_expression_to_lkml, to_looker._sql_expression_to_lkml),
+            ('cube', to_cube, to_cube.sql_expression_to_cube, to_cube._sql_expression_to_cube),
+            ('lightdash', to_ldsh, to_ldsh.sql_expression_to_ldsh, to_ldsh._sql_expression_to_ldsh)]:
+        translator.set_manifests(metricflow_semantic_manifest=semantic_manifest, dbt_manifest=dbt_manifest)
+        uncached = measure(lambda expression, model: translate_uncached(expression, model, translator.semantic_index()),
+                           model_pairs, args.seconds)
+        print(f"{dialect:<10} {uncached:>12,.0f} {measure(translate, model_pairs, args.seconds):>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
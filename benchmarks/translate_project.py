@@ -0,0 +1,46 @@
+"""
+Times whole-project translation of synthetic projects of increasing size. With metric-ownership pruning each model only
+translates the metrics it owns, so the time per model should stay roughly flat as the project grows (linear overall).
+
+Usage: python -m benchmarks.translate_project [--sizes 50,100,200,400]
+"""
+import argparse
+import os
+import time
+
+import mf_translate.to_looker as to_looker
+import mf_translate.to_cube as to_cube
+
+from .synthetic_project import synthetic_manifests
+
+
+def time_project(translator, model_to_view, num_models):
+
+    semantic_manifest, dbt_manifest = synthetic_manifests(num_models)
+    translator.set_manifests(metricflow_semantic_manifest=semantic_manifest, dbt_manifest=dbt_manifest)
+
+    start = time.perf_counter()
+    for model in semantic_manifest['semantic_models']:
+        model_to_view(model)
+    return time.perf_counter() - start
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmarks whole-project translation time against project size.')
+    parser.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[50, 100, 200, 400],
+                        help='Comma-separated list of project sizes (number of semantic models).')
+    args = parser.parse_args()
+
+    os.environ.setdefault("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE", "snowflake")
+
+    print(f"{'target':<8} {'models':>8} {'total (s)':>10} {'per model (ms)':>15}")
+    for target, translator, model_to_view in [('looker', to_looker, to_looker.model_to_lkml_view),
+                                              ('cube', to_cube, to_cube.model_to_cube_cube)]:
+        for size in args.sizes:
+            elapsed = time_project(translator, model_to_view, size)
+            print(f"{target:<8} {size:>8} {elapsed:>10.3f} {1000 * elapsed / size:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,19 @@
+import os
 import sys
 import argparse
-import subprocess
 import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s  %(message)s',
-    datefmt='%H:%M:%S'
-)
-import json
 import ast
+import concurrent.futures
 
 from . import to_looker
+from .phases import PhaseTimer
+from .explore_cache import EXPLORE_CACHE_TTL
+from .diff import column_tolerances, DEFAULT_TOP_N
+from .stream_diff import STREAM_MEMORY_LIMIT
+from .pushdown import WAREHOUSE_ENV_VAR
+from .result_cache import ResultCache, RESULT_CACHE_TTL, RESULT_CACHE_MAX_SIZE
+from mf_translate.dbt_project import parse_dbt_project, target_path
+from mf_translate.manifest_cache import load_manifests
 
 def parse_csv_str(value):
     return value.split(',')
@@ -22,29 +25,392 @@ def parse_dict(dict_string):
         logging.error("Invalid format for dictionary string. Example: \"{'orders.revenue': '>100', 'customers.region': 'US'}\"")
         sys.exit(1)
 
+def configure_logging():
+    """
+    Configures logging for the command line. Not done at import time so that importing mf_compare_query as a library leaves the caller's logging untouched.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s  %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    logging.getLogger('looker_sdk').setLevel(logging.WARNING)
+
+
+def parse_project(manifest_dir='target', force_parse=False):
+    """
+    Parses the dbt project and sets the semantic manifest used to translate queries to Looker.
+    """
+
+    parse_dbt_project(manifest_dir=manifest_dir, force_parse=force_parse)
+
+    semantic_manifest, _, semantic_index = load_manifests(manifest_dir)
+    to_looker.set_semantic_manifest(semantic_manifest, semantic_index=semantic_index)
+    logging.debug(f"Parsed dbt project.")
+
+
+def compare_query(args, timer=None):
+    """
+    Runs the query of the parsed command line arguments against MetricFlow and Looker and compares the results.
+
+    Independent phases run concurrently: connecting to Looker and fetching the explore's fields overlaps with parsing
+    the dbt project, then the MetricFlow and Looker queries run at the same time. Each phase's duration and the
+    critical path are logged at the end.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    timer (PhaseTimer): Optional, records the phases. A new timer is used if not provided.
+
+    Returns:
+    bool: True if the query results match, False otherwise.
+    """
+
+    timer = timer or PhaseTimer()
+    if args.pushdown:
+        return compare_query_pushdown(args, timer)
+    if args.streaming:
+        return compare_query_streaming(args, timer)
+    if args.checksum:
+        return compare_query_checksum(args, timer)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+
+        # CONNECT TO LOOKER WHILE PARSING THE DBT PROJECT
+        looker_connection = executor.submit(timer.run, 'looker_connect', [], to_looker.connect_looker,
+                                            explore=args.to_looker_explore, dev_branch=args.looker_dev_branch,
+                                            cache_dir=args.manifest_dir, ttl=args.explore_cache_ttl)
+        timer.run('dbt_parse', [], parse_project, manifest_dir=args.manifest_dir, force_parse=args.force_parse)
+
+        if looker_connection.done():
+            looker_connection.result() # Exit now rather than after the MetricFlow query if Looker could not be reached
+
+        # QUERY METRICFLOW AND LOOKER
+        mf_query = executor.submit(timer.run, 'metricflow_query', ['dbt_parse'], to_looker.query_metricflow,
+                                   metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                                   where=args.where)
+
+        sdk, looker_model, valid_fields = looker_connection.result()
+        lkr_results = timer.run('looker_query', ['dbt_parse', 'looker_connect'], to_looker.run_looker_query,
+                                sdk, looker_model, valid_fields,
+                                explore=args.to_looker_explore,
+                                metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                                filters=args.looker_filters, dev_branch=args.looker_dev_branch)
+        logging.info(f"Looker query returned {lkr_results.shape[0]} rows.")
+
+        mf_results = mf_query.result()
+        logging.info(f"MetricFlow query returned {mf_results.shape[0]} rows.")
+
+    mf_results.columns = lkr_results.columns # MF does not return column names so overwrite them with Looker's.
+    key_count = len(args.group_by or [])
+    try:
+        tolerances = column_tolerances(args.metrics, list(lkr_results.columns), key_count, args.tolerances)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    results_match = timer.run('compare', ['metricflow_query', 'looker_query'], to_looker.do_query_results_match,
+                              metricflow_results=mf_results, looker_results=lkr_results, key_count=key_count,
+                              tolerances=tolerances, top_n=args.top_n)
+
+    timer.log_summary()
+    return results_match
+
+
+def compare_query_checksum(args, timer=None):
+    """
+    Runs the query of the parsed command line arguments like compare_query(), but first compares the metrics at
+    coarse grains of the query's time dimension and then only the partitions that differ (see
+    checksum.compare_hierarchically()), so results that match are not fetched row by row. Falls back to
+    compare_query() if the results cannot be partitioned.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    timer (PhaseTimer): Optional, records the phases. A new timer is used if not provided.
+
+    Returns:
+    bool: True if the query results match, False otherwise.
+    """
+
+    from . import checksum
+
+    timer = timer or PhaseTimer()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+
+        # CONNECT TO LOOKER WHILE PARSING THE DBT PROJECT
+        looker_connection = executor.submit(timer.run, 'looker_connect', [], to_looker.connect_looker,
+                                            explore=args.to_looker_explore, dev_branch=args.looker_dev_branch,
+                                            cache_dir=args.manifest_dir, ttl=args.explore_cache_ttl)
+        timer.run('dbt_parse', [], parse_project, manifest_dir=args.manifest_dir, force_parse=args.force_parse)
+        sdk, looker_model, valid_fields = looker_connection.result()
+
+        def query_results(group_by, where, looker_filters):
+            mf_query = executor.submit(to_looker.query_metricflow, metrics=args.metrics, group_by=group_by,
+                                       order_by=args.order_by, where=where)
+            lkr_results = to_looker.run_looker_query(sdk, looker_model, valid_fields, explore=args.to_looker_explore,
+                                                     metrics=args.metrics, group_by=group_by, order_by=args.order_by,
+                                                     filters=looker_filters, dev_branch=args.looker_dev_branch)
+            mf_results = mf_query.result()
+            mf_results.columns = lkr_results.columns # MF does not return column names so overwrite them with Looker's.
+            return mf_results, lkr_results
+
+        # COMPARE COARSE PARTITIONS, THEN THE ROWS OF THOSE THAT DIFFER
+        try:
+            results_match = timer.run('checksum_compare', ['dbt_parse', 'looker_connect'], checksum.compare_hierarchically,
+                                      args.metrics, args.group_by, to_looker.semantic_index(), query_results,
+                                      where=args.where, looker_filters=args.looker_filters, grains=args.checksum_grains,
+                                      tolerances=args.tolerances, top_n=args.top_n)
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(1)
+
+    if results_match is None:
+        logging.info("Comparing the whole results instead.")
+        return compare_query(argparse.Namespace(**{**vars(args), 'checksum': False}), timer=timer)
+
+    timer.log_summary()
+    return results_match
+
+
+def compare_query_streaming(args, timer=None):
+    """
+    Runs the query of the parsed command line arguments like compare_query(), but for results too large for memory:
+    both semantic layers write their results to scratch files, which are compared in chunks (see stream_diff). When
+    --order-by sorts the results by all the --group-by fields, ascending, they are compared with a streaming
+    sort-merge, otherwise by hash-partitioning them to disk.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    timer (PhaseTimer): Optional, records the phases. A new timer is used if not provided.
+
+    Returns:
+    bool: True if the query results match, False otherwise.
+    """
+
+    import tempfile
+    from . import result_types, stream_diff
+    from .diff import log_diff
+
+    timer = timer or PhaseTimer()
+    key_count = len(args.group_by or [])
+
+    with tempfile.TemporaryDirectory(prefix='mf_compare_query_', dir=args.spill_dir) as scratch_dir, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+
+        mf_results_path = os.path.join(scratch_dir, 'metricflow.csv')
+        lkr_results_path = os.path.join(scratch_dir, 'looker.csv')
+
+        # CONNECT TO LOOKER WHILE PARSING THE DBT PROJECT
+        looker_connection = executor.submit(timer.run, 'looker_connect', [], to_looker.connect_looker,
+                                            explore=args.to_looker_explore, dev_branch=args.looker_dev_branch,
+                                            cache_dir=args.manifest_dir, ttl=args.explore_cache_ttl)
+        timer.run('dbt_parse', [], parse_project, manifest_dir=args.manifest_dir, force_parse=args.force_parse)
+
+        if looker_connection.done():
+            looker_connection.result() # Exit now rather than after the MetricFlow query if Looker could not be reached
+
+        # QUERY METRICFLOW AND LOOKER, WRITING THE RESULTS TO DISK
+        mf_query = executor.submit(timer.run, 'metricflow_query', ['dbt_parse'], to_looker.run_metricflow_query,
+                                   metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                                   where=args.where, results_path=mf_results_path, result_format='csv')
+
+        sdk, looker_model, valid_fields = looker_connection.result()
+        columns = timer.run('looker_query', ['dbt_parse', 'looker_connect'], to_looker.download_looker_query,
+                            sdk, looker_model, valid_fields,
+                            explore=args.to_looker_explore,
+                            metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                            filters=args.looker_filters, results_path=lkr_results_path)
+        mf_query.result()
+
+        if not os.path.exists(mf_results_path):
+            logging.error(f"MetricFlow query returned no results.")
+            sys.exit(1)
+
+        try:
+            tolerances = column_tolerances(args.metrics, columns, key_count, args.tolerances)
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(1)
+
+        # COMPARE THE RESULTS IN CHUNKS
+        kinds = result_types.query_column_kinds(args.metrics, args.group_by, to_looker.semantic_index())
+        sorted_by_keys = bool(args.group_by) and args.order_by == args.group_by
+        diff = timer.run('compare', ['metricflow_query', 'looker_query'], stream_diff.stream_diff,
+                         mf_results_path, lkr_results_path, kinds, columns, key_count,
+                         metricflow_skiprows=result_types.csv_header_rows(mf_results_path, (args.group_by or []) + args.metrics),
+                         looker_skiprows=1, tolerances=tolerances, top_n=args.top_n, memory_limit=args.memory_limit,
+                         sorted_by_keys=sorted_by_keys)
+
+    log_diff(diff)
+    timer.log_summary()
+    return diff['passed']
+
+
+def compare_query_pushdown(args, timer=None):
+    """
+    Runs the query of the parsed command line arguments like compare_query(), but compares the results in the
+    warehouse rather than downloading them: the SQL MetricFlow compiles the query to and the SQL Looker generates for
+    it are wrapped in one warehouse query (see pushdown.pushdown_sql()), which returns only the rows that differ most.
+    Both semantic layers must query the warehouse --warehouse connects to.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    timer (PhaseTimer): Optional, records the phases. A new timer is used if not provided.
+
+    Returns:
+    bool: True if the query results match, False otherwise.
+    """
+
+    from . import pushdown, result_types
+    from .diff import log_diff
+
+    timer = timer or PhaseTimer()
+
+    if not args.warehouse:
+        logging.error(f"--pushdown needs a warehouse connection, given by --warehouse or the {WAREHOUSE_ENV_VAR} environment variable.")
+        sys.exit(1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+
+        # CONNECT TO LOOKER WHILE PARSING THE DBT PROJECT
+        looker_connection = executor.submit(timer.run, 'looker_connect', [], to_looker.connect_looker,
+                                            explore=args.to_looker_explore, dev_branch=args.looker_dev_branch,
+                                            cache_dir=args.manifest_dir, ttl=args.explore_cache_ttl)
+        timer.run('dbt_parse', [], parse_project, manifest_dir=args.manifest_dir, force_parse=args.force_parse)
+
+        if looker_connection.done():
+            looker_connection.result() # Exit now rather than after compiling the MetricFlow query if Looker could not be reached
+
+        # COMPILE BOTH QUERIES TO SQL
+        mf_sql = executor.submit(timer.run, 'metricflow_explain', ['dbt_parse'], to_looker.metricflow_query_sql,
+                                 metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                                 where=args.where)
+
+        sdk, looker_model, valid_fields = looker_connection.result()
+        lkr_sql, columns = timer.run('looker_sql', ['dbt_parse', 'looker_connect'], to_looker.looker_query_sql,
+                                     sdk, looker_model, valid_fields,
+                                     explore=args.to_looker_explore,
+                                     metrics=args.metrics, group_by=args.group_by, order_by=args.order_by,
+                                     filters=args.looker_filters)
+        mf_sql = mf_sql.result()
+
+    try:
+        tolerances = column_tolerances(args.metrics, columns, len(args.group_by or []), args.tolerances)
+        connection = pushdown.connect_warehouse(args.warehouse)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+    # COMPARE THE RESULTS IN THE WAREHOUSE
+    kinds = result_types.query_column_kinds(args.metrics, args.group_by, to_looker.semantic_index())
+    try:
+        diff = timer.run('compare', ['metricflow_explain', 'looker_sql'], pushdown.run_pushdown_diff,
+                         connection, mf_sql, lkr_sql, args.group_by or [], kinds, columns, len(args.metrics),
+                         tolerances=tolerances, top_n=args.top_n)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    finally:
+        connection.close()
+
+    log_diff(diff)
+    timer.log_summary()
+    return diff['passed']
+
+
 def main():
 
+    configure_logging()
+
     # LOAD ARGUMENTS
     parser = argparse.ArgumentParser(description='Asserts if the results for the specified MetricFlow query match the results from an equivalent Looker/Cube/Lightdash query.')
 
-    parser.add_argument('--metrics', type=parse_csv_str, required=True, metavar='SEQUENCE',
+    parser.add_argument('--metrics', type=parse_csv_str, required=False, metavar='SEQUENCE',
                         help='Comma-separated list of metrics, for example, --metrics bookings,messages. Note that the listed metrics should be derived from measures in the same semantic model.')
 
     parser.add_argument('--group-by', type=parse_csv_str, required=False, metavar='SEQUENCE',
                         help='List of dimensions/entities to group by, e.g. --group-by customer_name,region.')
 
+    parser.add_argument('--order-by', type=parse_csv_str, required=False, metavar='SEQUENCE',
+                        help='List of dimensions/entities/metrics to order both queries\' results by, e.g. --order-by customer_name,region. With --streaming, ordering by the --group-by fields compares the results with a streaming sort-merge.')
+
     parser.add_argument('--where', type=str, required=False, metavar='STRING',
                         help='SQL-like where statement provided as a string and wrapped in quotes: --where "condition_statement" - e.g. --where "{{ Dimension(\'order_id__revenue\') }} > 100 and {{ Dimension(\'customer_id__region\') }}  = \'US\'". Note that a corresponding `--looker-filters` argument must be provided to apply like for like filtering when comparing against Looker.')
 
-    parser.add_argument('--to-looker-explore', type=str, required=True,
+    parser.add_argument('--to-looker-explore', type=str, required=False,
                         help='Compare the query results to the specified Looker Explore (rather than inferring the Explore from the --metrics input).')
 
     parser.add_argument('--looker-filters', type=parse_dict, required=False, metavar='STRING',
                         help='List of Looker filters wrapped in curly braces and quotes:  --looker-filters "{\'orders.revenue\': \'>100\', \'customers.region\': \'US\'}".')
 
+    parser.add_argument('--tolerances', type=parse_dict, required=False, metavar='STRING',
+                        help='How far each metric\'s values may differ and still match, wrapped in curly braces and quotes: an absolute difference or a dict of absolute and/or relative differences, e.g. --tolerances "{\'revenue\': 0.01, \'average_order_value\': {\'rel\': 0.001}}". Other metrics match within a relative difference of 1e-9.')
+
+    parser.add_argument('--top-n', type=int, required=False, default=DEFAULT_TOP_N, metavar='N',
+                        help='The number of largest differences (and of rows only in one of the results) logged when the results do not match. Defaults to 10.')
+
+    mode_group = parser.add_mutually_exclusive_group() # Each mode compares the results its own way
+
+    mode_group.add_argument('--checksum', action='store_true',
+                        help='Compare the metrics by coarse grains of the query\'s time dimension first (by default by year, then month), and only compare the rows of the periods that differ. Needs a --group-by time dimension of an entity, e.g. order_id__ordered_at__day. Not used with --suite.')
+
+    parser.add_argument('--checksum-grains', type=parse_csv_str, required=False, metavar='SEQUENCE',
+                        help='With --checksum, the coarse grains compared before the query\'s own, e.g. --checksum-grains year,quarter,month. Defaults to year,month.')
+
+    mode_group.add_argument('--streaming', action='store_true',
+                        help='Compare results too large for memory: both results are written to disk and compared in chunks, holding at most --memory-limit MB at a time. Not used with --suite.')
+
+    parser.add_argument('--memory-limit', type=float, required=False, default=STREAM_MEMORY_LIMIT, metavar='MB',
+                        help='With --streaming, the MB of results compared at a time. Defaults to 512.')
+
+    parser.add_argument('--spill-dir', type=str, required=False, metavar='DIR',
+                        help='With --streaming, the directory results are written to while they are compared. Defaults to the system temporary directory.')
+
+    mode_group.add_argument('--pushdown', action='store_true',
+                        help='Compare the results in the warehouse rather than downloading them: the SQL of both queries is run as one warehouse query that returns only the rows that differ most. Both MetricFlow and Looker must query the --warehouse. Not used with --suite.')
+
+    parser.add_argument('--warehouse', type=str, required=False, default=os.getenv(WAREHOUSE_ENV_VAR), metavar='STRING',
+                        help=f'With --pushdown, the warehouse connection: duckdb:FILE for a local DuckDB database, or package.module:function naming a function that returns a DB-API connection. Defaults to the {WAREHOUSE_ENV_VAR} environment variable.')
+
     parser.add_argument('--looker-dev-branch', type=str, required=False,
                         help='The development git branch to use when querying Looker. If not specified, the production environment will be used. Note that MF_TRANSLATE_LOOKER_PROJECT environment variable must be set.')
 
+    parser.add_argument('--force-parse', action='store_true',
+                        help='Run `dbt parse` even if the project has not changed since the manifests were generated.')
+
+    parser.add_argument('--explore-cache-ttl', type=float, required=False, default=EXPLORE_CACHE_TTL, metavar='SECONDS',
+                        help='How long the fields of a Looker Explore are cached (in dbt\'s target directory) before they are fetched again. Defaults to 3600, 0 disables the cache.')
+
+    parser.add_argument('--result-cache', action='store_true',
+                        help='Cache query results (in dbt\'s target directory) and reuse them while the query, semantic manifest, warehouse target and Looker SQL are unchanged. Changes to the warehouse\'s data are not detected.')
+
+    parser.add_argument('--result-cache-ttl', type=float, required=False, default=RESULT_CACHE_TTL, metavar='SECONDS',
+                        help='With --result-cache, how long query results are reused. Defaults to 3600.')
+
+    parser.add_argument('--result-cache-size', type=float, required=False, default=RESULT_CACHE_MAX_SIZE, metavar='MB',
+                        help='With --result-cache, the MB of query results cached, the least recently used are evicted beyond it. Defaults to 256.')
+
+    parser.add_argument('--refresh-mf', action='store_true',
+                        help='With --result-cache, run the MetricFlow query even if its results are cached.')
+
+    parser.add_argument('--refresh-looker', action='store_true',
+                        help='With --result-cache, run the Looker query even if its results are cached, and drop the cached Looker results.')
+
+    parser.add_argument('--suite', type=str, required=False, metavar='FILE',
+                        help='Compare every query of a YAML suite file in one run instead of a single query given by --metrics and --to-looker-explore. See the readme for the file format.')
+
+    parser.add_argument('--concurrency', type=int, required=False, default=4, metavar='N',
+                        help='The number of suite queries compared at the same time. Defaults to 4.')
+
+    parser.add_argument('--mf-workers', type=int, required=False, metavar='N',
+                        help='The number of persistent MetricFlow processes suite queries run on, each loading the semantic manifest and connecting to the warehouse once. Defaults to --concurrency, 0 runs `mf query` for each query.')
+
+    parser.add_argument('--shard', type=str, required=False, metavar='I/N',
+                        help='Only compare the I-th of N equal shares of the suite queries, e.g. --shard 2/4 to split a suite across CI runners.')
+
+    parser.add_argument('--report', type=str, required=False, metavar='FILE',
+                        help='Write the suite pass/fail report as JSON to the specified file.')
+
     parser.add_argument('--log-level', type=str, required=False, default='INFO',
                         help='Set the logging level, options are DEBUG, INFO, WARNING, ERROR, CRITICAL.')
 
@@ -53,45 +419,40 @@ def main():
     if args.log_level:
         logging.getLogger().setLevel(args.log_level)
 
+    # `mf query` reads the manifests from dbt's target path, so parse the project to (and keep caches in) the same one
+    args.manifest_dir = target_path()
 
-    # PARSE DBT PROJECT
-    logging.info("Parsing dbt project...")
-    result = subprocess.run(['dbt', 'parse'], capture_output=True, text=True)
-    if result.returncode != 0:
-        logging.error(f"Project could not be parsed.\n"
-                      f"dbt log:---\n{result.stdout.strip()}\n---"
-        )
-        sys.exit(1)
-    logging.info("...finished parsing project.")
+    if args.result_cache:
+        refresh = [side for side, flag in (('metricflow', args.refresh_mf), ('looker', args.refresh_looker)) if flag]
+        result_cache = ResultCache(args.manifest_dir, ttl=args.result_cache_ttl, max_size=args.result_cache_size,
+                                   refresh=refresh)
+        if args.refresh_looker:
+            result_cache.clear('looker') # Refreshed Looker results are not cached, so must not be shadowed by older ones
+        to_looker.set_result_cache(result_cache)
 
-    semantic_manifest = {}
-    try:
-        with open(f'target/semantic_manifest.json') as f:
-            semantic_manifest = json.load(f)
-    except FileNotFoundError:
-        logging.error(f"The file {f'target/semantic_manifest.json'} does not exist.")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        logging.error(f"The file {f'target/semantic_manifest.json'} is not a valid JSON file.")
-        sys.exit(1)
+    if args.suite:
+        from . import suite
 
-    to_looker.set_semantic_manifest(semantic_manifest)
-    logging.debug(f"Parsed dbt project.")
+        specs = suite.load_suite(args.suite)
+        if args.shard:
+            try:
+                shard_index, shard_count = suite.parse_shard(args.shard)
+            except ValueError as e:
+                parser.error(str(e))
+            specs = suite.shard_specs(specs, shard_index, shard_count)
+            logging.info(f"Shard {shard_index}/{shard_count}: {len(specs)} queries.")
 
+        reports = suite.run_suite(specs, concurrency=args.concurrency, dev_branch=args.looker_dev_branch,
+                                  manifest_dir=args.manifest_dir, force_parse=args.force_parse,
+                                  explore_cache_ttl=args.explore_cache_ttl, mf_workers=args.mf_workers) if specs else []
+        if not suite.log_suite_report(reports, report_path=args.report):
+            sys.exit(1)
+        return
 
-    # QUERY METRICFLOW AND LOOKER
-    mf_results = to_looker.query_metricflow(metrics=args.metrics, group_by=args.group_by,
-                                            where=args.where)
-    logging.info(f"MetricFlow query returned {mf_results.shape[0]} rows.")
-    lkr_results = to_looker.query_looker(metrics=args.metrics, group_by=args.group_by,
-                                         filters=args.looker_filters,
-                                         explore=args.to_looker_explore,
-                                         dev_branch=args.looker_dev_branch)
-    logging.info(f"Looker query returned {lkr_results.shape[0]} rows.")
+    if not args.metrics or not args.to_looker_explore:
+        parser.error("--metrics and --to-looker-explore are required unless --suite is given.")
 
-    mf_results.columns = lkr_results.columns # MF does not return column names so overwrite them with Looker's.
-    if not to_looker.do_query_results_match(metricflow_results=mf_results,
-                                            looker_results=lkr_results):
+    if not compare_query(args):
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,165 @@
+import logging
+
+from . import result_types
+from .diff import diff_results, log_diff, column_tolerances, DEFAULT_TOP_N
+
+CHECKSUM_GRAINS = ['year', 'month'] # Coarse grains compared before the query's own, unless --checksum-grains is given
+NESTED_GRAINS = ['day', 'month', 'quarter', 'year'] # Each grain's periods nest in those of the coarser ones (unlike weeks)
+GRAIN_OFFSETS = {'day': {'days': 1}, 'month': {'months': 1}, 'quarter': {'months': 3}, 'year': {'years': 1}}
+
+
+def time_group_by(group_by, index):
+    """
+    Finds the time dimension the results can be partitioned by: the first group by field of an entity's time
+    dimension (e.g. 'order_id__ordered_at__day') at a grain of NESTED_GRAINS. A bare time dimension is at day grain.
+
+    Returns:
+    tuple: (position in `group_by`, time dimension e.g. 'order_id__ordered_at', grain), or None if there is none.
+    """
+
+    for position, field in enumerate(group_by or []):
+        parts = field.split('__')
+        if parts[0] == 'metric_time' or len(parts) not in (2, 3):
+            continue
+        if result_types.group_by_kind(field, index) != 'datetime' or not index.model_for_dimension(parts[0], parts[1]):
+            continue
+        grain = parts[2] if len(parts) == 3 else 'day'
+        if grain in NESTED_GRAINS:
+            return position, '__'.join(parts[:2]), grain
+
+    return None
+
+
+def checksum_levels(grain, grains=None):
+    """
+    Returns the grains of `grains` (default CHECKSUM_GRAINS) coarser than `grain`, coarsest first.
+    """
+    coarser = [level for level in grains or CHECKSUM_GRAINS if level in NESTED_GRAINS and NESTED_GRAINS.index(level) > NESTED_GRAINS.index(grain)]
+    return sorted(set(coarser), key=NESTED_GRAINS.index, reverse=True)
+
+
+def partition_ranges(starts, grain):
+    """
+    Returns the periods of `grain` starting at `starts` as sorted [start, end) timestamp ranges, adjacent periods merged.
+    """
+
+    import pandas as pd
+
+    ranges = []
+    for start in sorted(pd.Timestamp(start) for start in starts):
+        end = start + pd.DateOffset(**GRAIN_OFFSETS[grain])
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def metricflow_range_filter(dimension, grain, ranges, where=None):
+    """
+    Returns a MetricFlow where statement keeping the rows of `dimension` in `ranges`, and `where` if given.
+    """
+
+    time_dimension = f"{{{{ TimeDimension('{dimension}', '{grain}') }}}}"
+    in_ranges = ' OR '.join(f"({time_dimension} >= '{start:%Y-%m-%d}' AND {time_dimension} < '{end:%Y-%m-%d}')"
+                            for start, end in ranges)
+    return f"({where}) AND ({in_ranges})" if where else in_ranges
+
+
+def looker_range_filter(looker_field, ranges, filters=None):
+    """
+    Returns Looker filters keeping the rows of `looker_field` in `ranges`, and `filters` if given.
+
+    Raises:
+    ValueError: If `filters` already filter `looker_field`.
+    """
+
+    if looker_field in (filters or {}):
+        raise ValueError(f"The Looker filters already filter `{looker_field}`.")
+    return {**(filters or {}), looker_field: ','.join(f"{start:%Y/%m/%d} to {end:%Y/%m/%d}" for start, end in ranges)}
+
+
+def mismatched_partitions(diff, time_column):
+    """
+    Returns the partitions (values of `time_column`) of the rows that differ in a diff_results() comparison made with
+    `top_n` large enough to report every difference, or None if rows without a time differ.
+    """
+
+    rows = [diff['deviations'], diff['metricflow_only_rows'], diff['looker_only_rows']]
+    starts = [value for frame in rows if len(frame) for value in frame[time_column]]
+    if any(value is None or value != value for value in starts): # NaT
+        return None
+    return set(starts)
+
+
+def compare_hierarchically(metrics, group_by, index, query_results, where=None, looker_filters=None, grains=None,
+                           tolerances=None, top_n=DEFAULT_TOP_N):
+    """
+    Compares a query's results Merkle-style: first the metrics at coarse grains of its time dimension (e.g. by year,
+    then month), then only the partitions that differ at the query's own grain. When the results match, only the
+    coarsest results are fetched. Metrics are compared as aggregates of each partition, so differences that cancel
+    out within a partition (e.g. a row counted on the wrong day of the right month) are not found.
+
+    Parameters:
+    metrics (list): The query's metric names.
+    group_by (list): The query's group by fields.
+    index (SemanticIndex): Lookups over the semantic manifest.
+    query_results (function): query_results(group_by, where, looker_filters) runs the query on both semantic layers
+                              and returns (MetricFlow results, Looker results) with the same column names.
+    where (str): Optional, the query's MetricFlow where statement.
+    looker_filters (dict): Optional, the query's Looker filters.
+    grains (list): Optional, the coarse grains to compare first, see checksum_levels().
+    tolerances (dict): Optional, {metric: tolerance}, see column_tolerances().
+    top_n (int): Optional, the number of largest differences logged.
+
+    Returns:
+    bool: True if the results match, or None if they cannot be partitioned (no time dimension at a nested grain, or
+          Looker filters on it), in which case compare the whole results instead.
+    """
+
+    time = time_group_by(group_by, index)
+    if not time:
+        logging.info("Checksum comparison needs a time dimension (not metric_time) grouped by day, month, quarter or year.")
+        return None
+    position, dimension, grain = time
+
+    from .to_looker import field_to_looker_dim
+    looker_field = field_to_looker_dim(group_by[position])
+    if looker_field in (looker_filters or {}):
+        logging.info(f"Checksum comparison cannot partition `{looker_field}`, as the Looker filters already filter it.")
+        return None
+
+    key_count = len(group_by)
+    ranges = None # Every partition
+    rows_fetched = 0
+
+    for level in checksum_levels(grain, grains) + [grain]:
+
+        level_group_by = group_by[:position] + [f"{dimension}__{level}"] + group_by[position + 1:]
+        mf_results, lkr_results = query_results(
+            level_group_by,
+            metricflow_range_filter(dimension, grain, ranges, where) if ranges else where,
+            looker_range_filter(looker_field, ranges, looker_filters) if ranges else looker_filters)
+        rows_fetched += mf_results.shape[0] + lkr_results.shape[0]
+
+        columns = list(lkr_results.columns)
+        level_tolerances = column_tolerances(metrics, columns, key_count, tolerances)
+
+        if level != grain: # Report every difference, to drill into each partition that has one
+            diff = diff_results(mf_results, lkr_results, key_count, tolerances=level_tolerances,
+                                top_n=max(len(mf_results), len(lkr_results)) * len(metrics))
+            partitions = mismatched_partitions(diff, columns[position])
+            logging.info(f"By {level}: {diff['matched']} of {max(len(mf_results), len(lkr_results))} rows match, "
+                         f"{'some rows without a time' if partitions is None else len(partitions)} {level}s differ.")
+            if partitions == set():
+                logging.info(f"Fetched {rows_fetched} rows in total.")
+                logging.info("PASS: query results match.")
+                return True
+            if partitions is not None:
+                ranges = partition_ranges(partitions, level)
+        else:
+            diff = diff_results(mf_results, lkr_results, key_count, tolerances=level_tolerances, top_n=top_n)
+
+    logging.info(f"Fetched {rows_fetched} rows in total.")
+    log_diff(diff)
+    return diff['passed']
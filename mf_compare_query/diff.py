@@ -0,0 +1,213 @@
+import logging
+
+DEFAULT_TOLERANCE = (0.0, 1e-9) # (absolute, relative) tolerance of metric values, enough to absorb float noise
+DEFAULT_TOP_N = 10 # Largest deviations reported
+DIFF_COUNTS = ('matched', 'value_mismatches', 'metricflow_only', 'looker_only') # Row counts of a diff_results() comparison
+
+
+def parse_tolerance(tolerance):
+    """
+    Parses a metric's tolerance: a number (an absolute tolerance) or a dict with `abs` and/or `rel` keys.
+
+    Returns:
+    tuple: (absolute, relative) tolerance.
+    """
+
+    if isinstance(tolerance, (int, float)):
+        return (float(tolerance), 0.0)
+    if isinstance(tolerance, dict) and set(tolerance) <= {'abs', 'rel'}:
+        return (float(tolerance.get('abs', 0.0)), float(tolerance.get('rel', 0.0)))
+    raise ValueError(f"Invalid tolerance `{tolerance}`, expected a number or e.g. {{'abs': 0.01, 'rel': 1e-6}}.")
+
+
+def column_tolerances(metrics, columns, key_count, tolerances=None):
+    """
+    Maps the tolerances of metrics, {metric name: tolerance} (see parse_tolerance()), to the results' value columns.
+    The metric columns follow the `key_count` group by columns, in the order of `metrics`.
+
+    Returns:
+    dict: {column: (absolute, relative) tolerance}.
+
+    Raises:
+    ValueError: If a tolerance is invalid or names a metric not in `metrics`.
+    """
+
+    tolerances = tolerances or {}
+    unknown_metrics = set(tolerances) - set(metrics)
+    if unknown_metrics:
+        raise ValueError(f"Tolerances given for metrics not in the query: {', '.join(sorted(unknown_metrics))}.")
+
+    return {columns[key_count + position]: parse_tolerance(tolerances[metric])
+            for position, metric in enumerate(metrics) if metric in tolerances}
+
+
+def key_hashes(results, key_columns):
+    """
+    Returns a uint64 array hashing the key columns of each row, equal for rows with equal keys. All zeros if there
+    are no key columns.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    if not key_columns:
+        return np.zeros(len(results), dtype='uint64')
+    # Group by keys are mostly distinct, so hash the values directly rather than factorizing them first
+    return pd.util.hash_pandas_object(results[key_columns], index=False, categorize=False).to_numpy()
+
+
+def _row_keys(results, key_columns):
+    """
+    Helper returning (hash, occurrence) arrays identifying each row by its key columns. Rows with the same key (e.g.
+    every row when there are no key columns) are told apart by the order they occur in.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    hashes = key_hashes(results, key_columns)
+    if key_columns and not pd.Series(hashes).duplicated().any():
+        return hashes, np.zeros(len(results), dtype='int64')
+    return hashes, pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+
+
+def _as_float(values):
+    import numpy as np
+    return values.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _values_equal(left, right, tolerance=None):
+    """
+    Helper comparing two aligned columns element-wise. Nulls equal nulls; numbers are equal within `tolerance`,
+    (absolute, relative), if given.
+
+    Returns:
+    tuple: (equal boolean array, absolute difference array or None for non-numeric columns).
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    if tolerance is not None and pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+        left_values, right_values = _as_float(left), _as_float(right)
+        both_null = np.isnan(left_values) & np.isnan(right_values)
+        with np.errstate(invalid='ignore'): # inf - inf
+            difference = np.abs(left_values - right_values)
+        allowed = np.maximum(tolerance[0], tolerance[1] * np.maximum(np.abs(left_values), np.abs(right_values)))
+        equal = both_null | (left_values == right_values) | (difference <= allowed)
+        return equal, np.where(np.isnan(difference) & ~equal, np.inf, difference)
+
+    left_null, right_null = left.isna().to_numpy(), right.isna().to_numpy()
+    same = (left.reset_index(drop=True) == right.reset_index(drop=True)).fillna(False).to_numpy(dtype=bool)
+    return (left_null & right_null) | (same & ~left_null & ~right_null), None
+
+
+def diff_results(metricflow_results, looker_results, key_count, tolerances=None, default_tolerance=DEFAULT_TOLERANCE,
+                 top_n=DEFAULT_TOP_N):
+    """
+    Compares two query results with the same columns: `key_count` leading key (group by) columns, then value columns.
+    Rows are joined on their keys by hashing them, then the values of each joined row are compared, numbers within
+    a tolerance. All comparisons are vectorized.
+
+    Parameters:
+    metricflow_results (pandas.DataFrame): The first results.
+    looker_results (pandas.DataFrame): The second results, with the same columns in the same order.
+    key_count (int): The number of leading key columns.
+    tolerances (dict): Optional, {value column: (absolute, relative) tolerance}.
+    default_tolerance (tuple): Optional, the (absolute, relative) tolerance of value columns not in `tolerances`.
+    top_n (int): Optional, the number of largest deviations reported.
+
+    Returns:
+    dict: {'matched': rows whose values match, 'value_mismatches': joined rows whose values differ,
+           'metricflow_only': rows without a matching key in looker_results, 'looker_only': the reverse,
+           'metricflow_only_rows', 'looker_only_rows': the first `top_n` of those rows,
+           'deviations': DataFrame of the `top_n` largest value differences (key columns, 'column', 'metricflow',
+           'looker', 'abs_diff', 'rel_diff'), 'passed': True if every row matched}.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    columns = list(looker_results.columns)
+    metricflow_results = metricflow_results.set_axis(columns, axis=1)
+    key_columns, value_columns = columns[:key_count], columns[key_count:]
+
+    # JOIN THE ROWS ON THEIR KEYS
+    mf_hash, mf_occurrence = _row_keys(metricflow_results, key_columns)
+    lkr_hash, lkr_occurrence = _row_keys(looker_results, key_columns)
+    joined = pd.DataFrame({'hash': mf_hash, 'occurrence': mf_occurrence, 'mf_row': np.arange(len(mf_hash))}).merge(
+        pd.DataFrame({'hash': lkr_hash, 'occurrence': lkr_occurrence, 'lkr_row': np.arange(len(lkr_hash))}),
+        on=['hash', 'occurrence'], how='inner')
+    mf_rows, lkr_rows = joined['mf_row'].to_numpy(), joined['lkr_row'].to_numpy()
+
+    # Guard against hash collisions: joined rows must have equal keys
+    same_key = np.ones(len(joined), dtype=bool)
+    for column in key_columns:
+        same_key &= _values_equal(metricflow_results[column].iloc[mf_rows], looker_results[column].iloc[lkr_rows])[0]
+    mf_rows, lkr_rows = mf_rows[same_key], lkr_rows[same_key]
+
+    # COMPARE THE VALUES OF THE JOINED ROWS
+    row_equal = np.ones(len(mf_rows), dtype=bool)
+    deviations = []
+    for column in value_columns:
+        left, right = metricflow_results[column].iloc[mf_rows], looker_results[column].iloc[lkr_rows]
+        equal, difference = _values_equal(left, right, (tolerances or {}).get(column, default_tolerance))
+        row_equal &= equal
+
+        unequal = np.flatnonzero(~equal)
+        if len(unequal):
+            deviation = looker_results[key_columns].iloc[lkr_rows[unequal]].reset_index(drop=True)
+            deviation['column'] = column
+            deviation['metricflow'] = left.iloc[unequal].to_numpy()
+            deviation['looker'] = right.iloc[unequal].to_numpy()
+            deviation['abs_diff'] = difference[unequal] if difference is not None else np.inf
+            with np.errstate(divide='ignore', invalid='ignore'):
+                deviation['rel_diff'] = deviation['abs_diff'] / np.abs(_as_float(right.iloc[unequal])) \
+                    if difference is not None else np.inf
+            deviations.append(deviation.nlargest(top_n, 'abs_diff', keep='first'))
+
+    deviation_columns = key_columns + ['column', 'metricflow', 'looker', 'abs_diff', 'rel_diff']
+    deviations = pd.concat(deviations, ignore_index=True).nlargest(top_n, 'abs_diff', keep='first').reset_index(drop=True) \
+        if deviations else pd.DataFrame(columns=deviation_columns)
+
+    # ROWS WITHOUT A MATCHING KEY
+    mf_unjoined = np.ones(len(metricflow_results), dtype=bool)
+    mf_unjoined[mf_rows] = False
+    lkr_unjoined = np.ones(len(looker_results), dtype=bool)
+    lkr_unjoined[lkr_rows] = False
+
+    matched = int(row_equal.sum())
+
+    return {'matched': matched,
+            'value_mismatches': len(mf_rows) - matched,
+            'metricflow_only': int(mf_unjoined.sum()),
+            'looker_only': int(lkr_unjoined.sum()),
+            'metricflow_only_rows': metricflow_results[mf_unjoined].head(top_n),
+            'looker_only_rows': looker_results[lkr_unjoined].head(top_n),
+            'deviations': deviations,
+            'passed': matched == len(metricflow_results) == len(looker_results)}
+
+
+def log_diff(diff):
+    """
+    Logs the counts of a diff_results() comparison and its largest deviations.
+    """
+
+    logging.info(f"Number of matching rows: {diff['matched']}")
+    logging.info(f"Number of rows with different values: {diff['value_mismatches']}")
+    logging.info(f"Number of rows only in MetricFlow: {diff['metricflow_only']}")
+    logging.info(f"Number of rows only in Looker: {diff['looker_only']}")
+
+    if diff['passed']:
+        logging.info("PASS: query results match.")
+        return
+
+    from tabulate import tabulate
+
+    logging.warning("WARNING: query results do not match.")
+    for name, label in [('deviations', 'Largest {} deviations'),
+                        ('metricflow_only_rows', 'First {} rows only in MetricFlow'),
+                        ('looker_only_rows', 'First {} rows only in Looker')]:
+        if len(diff[name]):
+            logging.info(f"{label.format(len(diff[name]))}:\n" +
+                         tabulate(diff[name], headers='keys', tablefmt='pretty', showindex=False))
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import threading
+
+EXPLORE_CACHE_FILE = 'mf_compare_query_explore_fields.json'
+EXPLORE_CACHE_VERSION = 1 # Bump when the layout of the cache file changes
+EXPLORE_CACHE_TTL = 3600 # Seconds a cached field list is used for before the explore's metadata is fetched again
+
+_MEMORY_CACHE = {} # key -> (fetched_at, field names), fields fetched or read from disk by this process
+_LOCK = threading.Lock()
+
+
+def explore_key(base_url, looker_model, explore, dev_branch=None):
+    """
+    Returns the cache key of an explore's fields. The fields differ between Looker instances, models and dev branches.
+    """
+    return json.dumps([base_url or '', looker_model, explore, dev_branch or ''])
+
+
+def _read_entries(cache_dir):
+    if not cache_dir:
+        return {}
+    try:
+        with open(os.path.join(cache_dir, EXPLORE_CACHE_FILE), 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('entries', {}) if cache.get('version') == EXPLORE_CACHE_VERSION else {}
+
+
+def read_explore_fields(key, cache_dir='target', ttl=EXPLORE_CACHE_TTL):
+    """
+    Returns the cached field names of an explore if they were fetched less than `ttl` seconds ago, from memory or else
+    from the cache file in `cache_dir`.
+
+    Returns:
+    set: The explore's field names, or None if there is no fresh cache entry.
+    """
+
+    if ttl <= 0:
+        return None
+
+    with _LOCK:
+        fetched_at, fields = _MEMORY_CACHE.get(key, (0, None))
+        if fields is not None and time.time() - fetched_at < ttl:
+            return fields
+
+        entry = _read_entries(cache_dir).get(key)
+        if not entry or time.time() - entry['fetched_at'] >= ttl:
+            return None
+
+        fields = set(entry['fields'])
+        _MEMORY_CACHE[key] = (entry['fetched_at'], fields)
+        return fields
+
+
+def write_explore_fields(key, fields, cache_dir='target'):
+    """
+    Caches the field names of an explore in memory and, if `cache_dir` exists, in its cache file, keeping the other
+    entries.
+    """
+
+    fetched_at = time.time()
+
+    with _LOCK:
+        _MEMORY_CACHE[key] = (fetched_at, set(fields))
+
+        if not cache_dir or not os.path.isdir(cache_dir):
+            return
+
+        entries = _read_entries(cache_dir)
+        entries[key] = {'fetched_at': fetched_at, 'fields': sorted(fields)}
+
+        # Write to a temporary file and rename so a concurrent reader never sees a partial cache
+        cache_path = os.path.join(cache_dir, EXPLORE_CACHE_FILE)
+        with open(f"{cache_path}.{os.getpid()}.tmp", 'w') as f:
+            json.dump({'version': EXPLORE_CACHE_VERSION, 'entries': entries}, f)
+        os.replace(f"{cache_path}.{os.getpid()}.tmp", cache_path)
+
+
+def clear_memory_cache():
+    """
+    Forgets the field lists held in memory, so the next lookups read the cache file.
+    """
+    with _LOCK:
+        _MEMORY_CACHE.clear()
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import queue
+import threading
+import subprocess
+import traceback
+
+# A MetricFlow worker is a long-lived `python -m mf_compare_query.mf_worker` process that loads the semantic manifest
+# and opens the warehouse connection once, then answers queries read as JSON lines from stdin:
+#
+#     -> {"metrics": [...], "group_by": [...], "order_by": [...], "where": "...", "path": "...", "format": "arrow" | "pickle" | "csv"}
+#     <- {"ok": true} once the results are written to `path`, or {"ok": false, "error": "..."}
+#
+# "arrow" (an Arrow IPC/Feather file) and "pickle" (a pickled DataFrame) results keep their types, see
+# result_types.read_metricflow_results(). "csv" results can be read in chunks, see stream_diff.
+#
+# The worker first writes {"ready": true} (or {"ready": false, "error": "..."}) once the engine is loaded.
+
+
+class MetricFlowWorkerError(Exception):
+    """
+    A query failed in the worker, e.g. an unknown metric or a warehouse error.
+    """
+
+
+class MetricFlowWorkerUnavailable(MetricFlowWorkerError):
+    """
+    The worker could not load MetricFlow or has exited. Queries can still be run with `mf query`.
+    """
+
+
+def load_metricflow_engine():
+    """
+    Loads the MetricFlow engine of the dbt project in the working directory the way the `mf` CLI does, connecting to
+    the warehouse of the active dbt profile.
+    """
+
+    try: # dbt-metricflow >= 0.8
+        from dbt_metricflow.cli.cli_configuration import CLIConfiguration
+        configuration = CLIConfiguration()
+        configuration.setup()
+        return configuration.mf
+    except ImportError:
+        from dbt_metricflow.cli.cli_context import CLIContext
+        return CLIContext().mf
+
+
+def write_results(table, path, result_format):
+    """
+    Writes query results, a pandas DataFrame or a MetricFlow data table (with `column_names` and `rows`), to `path`
+    in `result_format`, 'arrow', 'pickle' or 'csv'.
+    """
+
+    import pandas as pd
+
+    if not isinstance(table, pd.DataFrame): # Newer MetricFlow versions return their own data table
+        table = pd.DataFrame(list(table.rows), columns=list(table.column_names))
+
+    if result_format == 'arrow':
+        table.reset_index(drop=True).to_feather(path)
+    elif result_format == 'csv': # Results compared in chunks, see stream_diff
+        table.to_csv(path, index=False)
+    else:
+        table.to_pickle(path)
+
+
+def metricflow_query(engine, request):
+    """
+    Runs a worker request with the MetricFlow engine and writes the results to request['path'].
+    """
+
+    from metricflow.engine.metricflow_engine import MetricFlowQueryRequest
+
+    query_request = MetricFlowQueryRequest.create_with_random_request_id(
+        metric_names=request['metrics'],
+        group_by_names=request.get('group_by') or None,
+        order_by_names=request.get('order_by') or None,
+        where_constraints=[request['where']] if request.get('where') else None,
+    )
+    result = engine.query(query_request)
+    write_results(result.result_df, request['path'], request.get('format', 'pickle'))
+
+
+def serve(query_function, requests=None, responses=None):
+    """
+    Answers worker requests read from `requests` with query_function(request) until `requests` is closed.
+    """
+
+    requests = requests or sys.stdin
+    responses = responses or sys.stdout
+
+    for line in requests:
+        try:
+            query_function(json.loads(line))
+            response = {'ok': True}
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        responses.write(json.dumps(response) + '\n')
+        responses.flush()
+
+
+def main():
+
+    # MetricFlow and dbt log to stdout, so keep the real stdout for responses and send everything else to stderr
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    try:
+        engine = load_metricflow_engine()
+    except Exception as e:
+        traceback.print_exc()
+        responses.write(json.dumps({'ready': False, 'error': f"{type(e).__name__}: {e}"}) + '\n')
+        responses.flush()
+        return
+
+    responses.write(json.dumps({'ready': True}) + '\n')
+    responses.flush()
+    serve(lambda request: metricflow_query(engine, request), responses=responses)
+
+
+class MetricFlowWorker:
+    """
+    Client of one MetricFlow worker process. The process starts loading MetricFlow as soon as the worker is created;
+    the first query waits for it to be ready. Queries to one worker are run one at a time.
+    """
+
+    def __init__(self, command=None, stderr=subprocess.DEVNULL):
+        """
+        Parameters:
+        command (list): Optional, the worker command. Defaults to `python -m mf_compare_query.mf_worker`.
+        stderr: Optional, where the worker's logs go.
+        """
+
+        self.command = command or [sys.executable, '-m', 'mf_compare_query.mf_worker']
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                                        text=True, bufsize=1)
+        self.ready = None # None until the worker has reported whether MetricFlow loaded
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _read_response(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise MetricFlowWorkerUnavailable(f"MetricFlow worker exited with code {self.process.wait()}.")
+        return json.loads(line)
+
+    def query(self, metrics, group_by=None, order_by=None, where=None, results_path=None, result_format='pickle'):
+        """
+        Runs a MetricFlow query in the worker, which writes the results to `results_path` in `result_format`
+        ('arrow', 'pickle' or 'csv').
+
+        Raises:
+        MetricFlowWorkerUnavailable: If MetricFlow could not be loaded in the worker or the worker has exited.
+        MetricFlowWorkerError: If the query failed.
+        """
+
+        request = {'metrics': metrics, 'group_by': group_by, 'order_by': order_by, 'where': where,
+                   'path': results_path, 'format': result_format}
+
+        with self._lock:
+            if self.ready is None:
+                status = self._read_response()
+                self.ready, self.error = status.get('ready', False), status.get('error')
+            if not self.ready:
+                raise MetricFlowWorkerUnavailable(f"MetricFlow could not be loaded in the worker: {self.error}")
+
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                raise MetricFlowWorkerUnavailable(f"MetricFlow worker exited with code {self.process.wait()}.")
+            response = self._read_response()
+
+        if not response['ok']:
+            raise MetricFlowWorkerError(response['error'])
+
+    def close(self):
+        """
+        Stops the worker process.
+        """
+
+        if self.process.poll() is None:
+            self.process.stdin.close() # The worker exits at the end of its input
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+
+class MetricFlowWorkerPool:
+    """
+    A fixed number of MetricFlow workers, so up to `size` queries run at the same time, each on a warm worker.
+
+        pool = MetricFlowWorkerPool(4)
+        pool.query(metrics=['revenue'], group_by=['metric_time'], results_path='results.pickle')
+        pool.close()
+    """
+
+    def __init__(self, size, command=None, stderr=subprocess.DEVNULL):
+
+        self.workers = [MetricFlowWorker(command=command, stderr=stderr) for _ in range(max(1, size))]
+        self.available = True # False once a worker could not load MetricFlow
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def query(self, metrics, group_by=None, order_by=None, where=None, results_path=None, result_format='pickle'):
+        """
+        Runs a query on the next idle worker, see MetricFlowWorker.query().
+        """
+
+        worker = self._idle.get()
+        try:
+            return worker.query(metrics, group_by=group_by, order_by=order_by, where=where, results_path=results_path,
+                                result_format=result_format)
+        except MetricFlowWorkerUnavailable:
+            self.available = False
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for worker in self.workers:
+            worker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+
+
+class PhaseTimer:
+    """
+    Records the start and end of the phases of a comparison, which may run concurrently, and the phases each one
+    waited on. The critical path is the chain of phases that determined the total wall time: starting from the phase
+    that finished last, each step goes back to the dependency that finished last.
+
+        timer = PhaseTimer()
+        results = timer.run('metricflow_query', ['dbt_parse'], query_metricflow, metrics=['revenue'])
+        timer.log_summary()
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = {} # name -> {'start', 'end', 'depends_on'}, times in seconds since the timer started
+        self._lock = threading.Lock()
+
+    def run(self, name, depends_on, function, *args, **kwargs):
+        """
+        Calls function(*args, **kwargs) as the phase `name`, which could only start once the `depends_on` phases had
+        finished. The phase is recorded even if the function raises (or calls sys.exit()).
+        """
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases[name] = {'start': start - self.started_at,
+                                     'end': end - self.started_at,
+                                     'depends_on': tuple(depends_on)}
+            logging.debug(f"Phase {name} took {end - start:.2f}s.")
+
+    def critical_path(self):
+        """
+        Returns the names of the phases on the critical path, in the order they ran.
+        """
+
+        with self._lock:
+            phases = dict(self.phases)
+
+        if not phases:
+            return []
+
+        path = [max(phases, key=lambda name: phases[name]['end'])]
+        while True:
+            dependencies = [name for name in phases[path[-1]]['depends_on'] if name in phases]
+            if not dependencies:
+                break
+            path.append(max(dependencies, key=lambda name: phases[name]['end']))
+
+        return path[::-1]
+
+    def log_summary(self):
+        """
+        Logs the duration of each phase, in the order they started, and the critical path.
+        """
+
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1]['start'])
+
+        for name, phase in phases:
+            logging.info(f"Phase {name}: {phase['end'] - phase['start']:.2f}s ({phase['start']:.2f}s - {phase['end']:.2f}s)")
+
+        logging.info(f"Critical path: {' -> '.join(self.critical_path())}, "
+                     f"total {time.perf_counter() - self.started_at:.2f}s.")
@@ -0,0 +1,184 @@
+import logging
+import importlib
+
+from . import result_types
+from .diff import diff_results, DEFAULT_TOLERANCE, DEFAULT_TOP_N
+
+WAREHOUSE_ENV_VAR = 'MF_COMPARE_QUERY_WAREHOUSE' # Used unless --warehouse is given
+
+# Characters of a time key compared at each grain, once cast to text, e.g. '2024-01' of '2024-01-01 00:00:00' by month
+# (Looker returns months as '2024-01' and years as 2024, MetricFlow the period's first timestamp)
+TIME_KEY_LENGTHS = {'year': 4, 'month': 7, 'week': 10, 'day': 10, 'hour': 13, 'minute': 16, 'second': 19}
+
+
+def connect_warehouse(warehouse):
+    """
+    Opens a DB-API 2.0 connection to the warehouse both semantic layers query.
+
+    Parameters:
+    warehouse (str): 'duckdb' (in memory) or 'duckdb:<database file>' for a local DuckDB stand-in, or
+                     'package.module:function' naming a function that takes no arguments and returns a connection,
+                     e.g. 'my_project.connections:snowflake'.
+
+    Returns:
+    A DB-API 2.0 connection.
+
+    Raises:
+    ValueError: If `warehouse` is not of either form or its function cannot be imported.
+    """
+
+    if warehouse == 'duckdb' or warehouse.startswith('duckdb:'):
+        import duckdb
+        return duckdb.connect(warehouse.partition(':')[2] or ':memory:')
+
+    module_name, _, function_name = warehouse.partition(':')
+    if not module_name or not function_name:
+        raise ValueError(f"Invalid warehouse `{warehouse}`, expected e.g. duckdb:warehouse.duckdb or package.module:function.")
+    try:
+        connect = getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"Warehouse connection function `{warehouse}` could not be imported: {e}")
+    return connect()
+
+
+def _key_expression(column, field, kind):
+    """
+    Helper returning the SQL comparing a key column of either semantic layer as text, time keys truncated to their grain.
+    """
+
+    if kind != 'datetime':
+        return f"CAST({column} AS VARCHAR)"
+
+    grain = field.split('__')[-1]
+    if grain == 'quarter':
+        raise ValueError(f"`{field}`: quarters are formatted differently by each semantic layer, so cannot be compared in the warehouse.")
+    return f"SUBSTRING(CAST({column} AS VARCHAR), 1, {TIME_KEY_LENGTHS.get(grain, TIME_KEY_LENGTHS['day'])})"
+
+
+def pushdown_sql(metricflow_sql, looker_sql, group_by, kinds, metric_count, tolerances=None, top_n=DEFAULT_TOP_N):
+    """
+    Returns one warehouse query comparing the results of two queries: a FULL OUTER JOIN on the group by keys, which
+    returns only the `top_n` rows differing most of each kind (value mismatches, rows only in MetricFlow, rows only in
+    Looker) and one matching row, each with the number of rows of its kind.
+
+    The queries' columns are matched by position: the group by keys, then the metrics. Keys are compared as text (see
+    TIME_KEY_LENGTHS), nulls equal, and metrics within their tolerance.
+
+    Parameters:
+    metricflow_sql, looker_sql (str): The SQL of each semantic layer's query.
+    group_by (list): The query's group by fields.
+    kinds (list): The column kinds, see result_types.query_column_kinds().
+    metric_count (int): The number of metrics.
+    tolerances (dict): Optional, {metric position: (absolute, relative) tolerance}. Defaults to DEFAULT_TOLERANCE.
+    top_n (int): Optional, the number of rows returned of each kind.
+
+    Returns:
+    str: The comparison query. Its columns are key_1..key_n, metricflow_value_1.., looker_value_1.., diff_status
+         ('matched', 'value_mismatch', 'metricflow_only' or 'looker_only') and status_rows.
+    """
+
+    keys = [f"key_{position}" for position in range(1, len(group_by) + 1)]
+    values = [f"value_{position}" for position in range(1, metric_count + 1)]
+    columns = ', '.join(keys + values)
+
+    def side(name):
+        key_expressions = [f"{_key_expression(key, field, kind)} AS {key}" for key, field, kind in zip(keys, group_by, kinds)]
+        return f"SELECT {', '.join(key_expressions + values + ['1 AS present'])} FROM {name}_query"
+
+    def values_equal(position, value):
+        absolute, relative = (tolerances or {}).get(position, DEFAULT_TOLERANCE)
+        metricflow, looker = f"metricflow.{value}", f"looker.{value}"
+        return (f"COALESCE({metricflow} IS NOT DISTINCT FROM {looker} OR ABS({metricflow} - {looker}) <= "
+                f"GREATEST({absolute!r}, {relative!r} * GREATEST(ABS({metricflow}), ABS({looker}))), FALSE)")
+
+    joined_keys = ' AND '.join(f"metricflow.{key} IS NOT DISTINCT FROM looker.{key}" for key in keys) or 'TRUE'
+    differences = [f"COALESCE(ABS(metricflow.{value} - looker.{value}), 0)" for value in values]
+    null_differences = ' OR '.join(f"(metricflow.{value} IS NULL) <> (looker.{value} IS NULL)" for value in values) or 'FALSE'
+
+    return f"""WITH metricflow_query ({columns}) AS (
+{metricflow_sql}
+), looker_query ({columns}) AS (
+{looker_sql}
+), metricflow AS (
+  {side('metricflow')}
+), looker AS (
+  {side('looker')}
+), compared AS (
+  SELECT
+    {', '.join([f"COALESCE(metricflow.{key}, looker.{key}) AS {key}" for key in keys] +
+               [f"metricflow.{value} AS metricflow_{value}, looker.{value} AS looker_{value}" for value in values])},
+    CASE
+      WHEN looker.present IS NULL THEN 'metricflow_only'
+      WHEN metricflow.present IS NULL THEN 'looker_only'
+      WHEN {' AND '.join(values_equal(position, value) for position, value in enumerate(values)) or 'TRUE'} THEN 'matched'
+      ELSE 'value_mismatch'
+    END AS diff_status,
+    CASE WHEN {null_differences} THEN 1 ELSE 0 END AS null_difference,
+    {f"GREATEST({', '.join(differences)})" if len(differences) > 1 else (differences or ['0'])[0]} AS difference
+  FROM metricflow
+  FULL OUTER JOIN looker ON {joined_keys}
+), ranked AS (
+  SELECT
+    compared.*,
+    ROW_NUMBER() OVER (PARTITION BY diff_status ORDER BY null_difference DESC, difference DESC) AS status_rank,
+    COUNT(*) OVER (PARTITION BY diff_status) AS status_rows
+  FROM compared
+)
+SELECT {', '.join(keys + [f"{side_name}_{value}" for side_name in ('metricflow', 'looker') for value in values] + ['diff_status', 'status_rows'])}
+FROM ranked
+WHERE status_rank <= CASE WHEN diff_status = 'matched' THEN 1 ELSE {int(top_n)} END"""
+
+
+def run_pushdown_diff(connection, metricflow_sql, looker_sql, group_by, kinds, columns, metric_count, tolerances=None,
+                      top_n=DEFAULT_TOP_N):
+    """
+    Compares two queries' results in the warehouse (see pushdown_sql()), so only the rows that differ most are fetched.
+
+    Parameters:
+    connection: A DB-API 2.0 connection, see connect_warehouse().
+    columns (list): The names of the results' columns, e.g. the Looker fields.
+    tolerances (dict): Optional, {column: (absolute, relative) tolerance}, see diff.column_tolerances().
+    Remaining parameters are those of pushdown_sql().
+
+    Returns:
+    dict: Like diff.diff_results(), with the counts of the whole results and the fetched rows.
+    """
+
+    import pandas as pd
+
+    key_count = len(group_by)
+    value_columns = columns[key_count:]
+    position_tolerances = {position: tolerances[column] for position, column in enumerate(value_columns)
+                           if column in (tolerances or {})}
+
+    sql = pushdown_sql(metricflow_sql, looker_sql, group_by, kinds, metric_count, tolerances=position_tolerances, top_n=top_n)
+    logging.debug(f"Warehouse comparison query:\n{sql}")
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql)
+        rows = pd.DataFrame(cursor.fetchall(), columns=[description[0].lower() for description in cursor.description])
+    finally:
+        cursor.close()
+
+    counts = dict(zip(rows['diff_status'], rows['status_rows'].astype(int)))
+
+    def side_results(side_name, status):
+        selected = rows[rows['diff_status'] == status]
+        results = pd.concat([selected[[f"key_{position}" for position in range(1, key_count + 1)]],
+                             selected[[f"{side_name}_value_{position}" for position in range(1, metric_count + 1)]]], axis=1)
+        return result_types.apply_column_kinds(results.set_axis(columns, axis=1).reset_index(drop=True), kinds)
+
+    # Rebuild the largest deviations from the fetched value mismatches
+    deviations = diff_results(side_results('metricflow', 'value_mismatch'), side_results('looker', 'value_mismatch'),
+                              key_count, tolerances=tolerances, top_n=top_n)['deviations']
+
+    matched = counts.get('matched', 0)
+    return {'matched': matched,
+            'value_mismatches': counts.get('value_mismatch', 0),
+            'metricflow_only': counts.get('metricflow_only', 0),
+            'looker_only': counts.get('looker_only', 0),
+            'metricflow_only_rows': side_results('metricflow', 'metricflow_only'),
+            'looker_only_rows': side_results('looker', 'looker_only'),
+            'deviations': deviations,
+            'passed': matched == sum(counts.values())}
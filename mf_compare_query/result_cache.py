@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+import threading
+
+from mf_translate.dbt_project import profiles_path, PROFILE_ENV_VARS
+
+RESULT_CACHE_DIR = 'mf_compare_query_results' # Created in the manifest directory
+RESULT_CACHE_INDEX = 'index.json'
+RESULT_CACHE_VERSION = 2 # Bump when the layout of the index or the cached results changes
+RESULT_CACHE_TTL = 3600 # Seconds cached results are used for before the query is run again
+RESULT_CACHE_MAX_SIZE = 256 # MB of results kept, the least recently used are evicted beyond it
+ORPHAN_AGE = 600 # Seconds after which a results file missing from the index is removed, see ResultCache.write()
+SIDES = ('metricflow', 'looker')
+
+_MANIFEST_HASHES = {} # Semantic manifest path -> ((size, mtime_ns), sha256), so an unchanged manifest is hashed once
+
+
+def semantic_manifest_hash(manifest_dir='target'):
+    """
+    Returns the sha256 of the semantic manifest in `manifest_dir`, or '' if there is none.
+    """
+
+    path = os.path.join(manifest_dir, 'semantic_manifest.json')
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return ''
+
+    stat_key = (stat.st_size, stat.st_mtime_ns)
+    cached = _MANIFEST_HASHES.get(path)
+    if cached and cached[0] == stat_key:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    _MANIFEST_HASHES[path] = (stat_key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def warehouse_target(project_dir='.'):
+    """
+    Returns a fingerprint of the warehouse MetricFlow queries: the dbt_project.yml (naming the profile), the
+    profiles.yml and the environment variables selecting the profile target. Changes when the target is switched.
+    """
+
+    digest = hashlib.sha256()
+    for path in (os.path.join(project_dir, 'dbt_project.yml'), profiles_path(project_dir)):
+        if path and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    for name in PROFILE_ENV_VARS:
+        digest.update(f"{name}={os.getenv(name, '')}\n".encode())
+    return digest.hexdigest()
+
+
+def metricflow_key(metrics, group_by=None, order_by=None, where=None, manifest_hash='', target=''):
+    """
+    Returns the cache key of a MetricFlow query's results: the query, with the where statement's whitespace collapsed,
+    the semantic manifest hash and the warehouse target. Field order is kept, as it orders the results' columns.
+    """
+    return json.dumps(['metricflow', list(metrics), list(group_by or []), list(order_by or []),
+                       ' '.join((where or '').split()), manifest_hash, target])
+
+
+def looker_key(base_url, looker_model, sql, dev_branch=None):
+    """
+    Returns the cache key of a Looker query's results: the SQL Looker generates for the query, which changes with the
+    LookML it is generated from, the instance and model, which select the connection, and the dev branch of the
+    session, so results are not shared between production and development workspaces.
+    """
+    return json.dumps(['looker', base_url or '', looker_model, dev_branch or '', sql])
+
+
+class ResultCache:
+    """
+    A cache of query results on disk, so re-running a comparison only queries the semantic layer whose query changed.
+    Results are pickled DataFrames in the RESULT_CACHE_DIR directory of `cache_dir`, listed in an index of when each
+    was cached and last used. Entries older than `ttl` seconds are not used, and the least recently used are evicted
+    once the results take more than `max_size` MB.
+    """
+
+    def __init__(self, cache_dir='target', ttl=RESULT_CACHE_TTL, max_size=RESULT_CACHE_MAX_SIZE, refresh=(),
+                 project_dir='.'):
+        """
+        Parameters:
+        cache_dir (str): The manifest directory, where the cache directory is created.
+        ttl (float): Optional, seconds results are used for. 0 disables the cache.
+        max_size (float): Optional, MB of results kept.
+        refresh (iterable): Optional, the SIDES whose cached results are not used. New MetricFlow results are still
+                            cached, whereas caching Looker results would cost a round trip for their SQL, so the cached
+                            Looker results are dropped instead, see clear().
+        project_dir (str): Optional, the dbt project directory, see warehouse_target().
+        """
+
+        self.manifest_dir = cache_dir
+        self.directory = os.path.join(cache_dir, RESULT_CACHE_DIR)
+        self.ttl = ttl
+        self.max_bytes = max_size * 1024 ** 2
+        self.refresh = set(refresh)
+        self.project_dir = project_dir
+        self._lock = threading.Lock()
+
+    def metricflow_key(self, metrics, group_by=None, order_by=None, where=None):
+        """
+        Returns the cache key of a MetricFlow query's results, for the current semantic manifest and warehouse target.
+        """
+        return metricflow_key(metrics, group_by, order_by, where, semantic_manifest_hash(self.manifest_dir),
+                              warehouse_target(self.project_dir))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()}.pickle")
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, RESULT_CACHE_INDEX), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index.get('entries', {}) if index.get('version') == RESULT_CACHE_VERSION else {}
+
+    def _write_index(self, entries):
+        # Write to a temporary file and rename so a concurrent reader never sees a partial index
+        index_path = os.path.join(self.directory, RESULT_CACHE_INDEX)
+        with open(f"{index_path}.{os.getpid()}.tmp", 'w') as f:
+            json.dump({'version': RESULT_CACHE_VERSION, 'entries': entries}, f)
+        os.replace(f"{index_path}.{os.getpid()}.tmp", index_path)
+
+    def uses(self, side):
+        """
+        Returns whether the results of `side` are read from the cache, i.e. it is enabled and `side` is not refreshed.
+        """
+        return self.ttl > 0 and side not in self.refresh
+
+    def clear(self, side):
+        """
+        Drops the cached results of `side`.
+        """
+
+        with self._lock:
+            entries = self._read_index()
+            for key in [key for key, entry in entries.items() if entry['side'] == side]:
+                del entries[key]
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            if os.path.isdir(self.directory):
+                self._write_index(entries)
+
+    def read(self, key, side):
+        """
+        Returns the cached results of `key` if they were cached less than `ttl` seconds ago and `side` is not being
+        refreshed, else None.
+        """
+
+        if not self.uses(side):
+            return None
+
+        with self._lock:
+            entries = self._read_index()
+            entry = entries.get(key)
+            if not entry or time.time() - entry['cached_at'] >= self.ttl:
+                return None
+
+            try:
+                with open(self._path(key), 'rb') as f:
+                    results = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+
+            entry['used_at'] = time.time()
+            self._write_index(entries)
+
+        logging.info(f"Using {side} results cached {time.time() - entry['cached_at']:.0f}s ago. "
+                     f"Rerun with --refresh-{'mf' if side == 'metricflow' else side} to query again.")
+        return results
+
+    def write(self, key, side, results):
+        """
+        Caches the results of `key`, then evicts expired entries and the least recently used beyond `max_size` MB.
+        Results larger than `max_size` are not cached.
+
+        The index is rewritten without a lock between processes, so an entry written by a concurrent run can be lost.
+        Results files missing from the index for over ORPHAN_AGE seconds (long enough for a concurrent write to have
+        listed its file) are removed at the same time.
+        """
+
+        if self.ttl <= 0:
+            return
+
+        data = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            logging.debug(f"The {side} results are larger than the result cache, so are not cached.")
+            return
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            with open(f"{path}.{os.getpid()}.tmp", 'wb') as f:
+                f.write(data)
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+            now = time.time()
+            entries = self._read_index()
+            entries[key] = {'side': side, 'cached_at': now, 'used_at': now, 'bytes': len(data)}
+
+            # Evict expired entries, then the least recently used until the rest fit
+            kept, kept_bytes = {}, 0
+            for entry_key, entry in sorted(entries.items(), key=lambda item: item[1]['used_at'], reverse=True):
+                if now - entry['cached_at'] < self.ttl and kept_bytes + entry['bytes'] <= self.max_bytes:
+                    kept[entry_key] = entry
+                    kept_bytes += entry['bytes']
+                else:
+                    try:
+                        os.remove(self._path(entry_key))
+                    except FileNotFoundError:
+                        pass
+
+            self._write_index(kept)
+
+            kept_files = {os.path.basename(self._path(entry_key)) for entry_key in kept} | {RESULT_CACHE_INDEX}
+            for file_name in os.listdir(self.directory):
+                path = os.path.join(self.directory, file_name)
+                try:
+                    if file_name not in kept_files and now - os.path.getmtime(path) > ORPHAN_AGE:
+                        os.remove(path)
+                except FileNotFoundError: # Removed by a concurrent run
+                    pass
@@ -0,0 +1,241 @@
+import re
+import csv
+
+TIME_GRAINS = {'day', 'week', 'month', 'quarter', 'year', 'hour', 'minute', 'second', 'millisecond'}
+INTEGER_AGGREGATIONS = {'count', 'count_distinct', 'sum_boolean'}
+
+# Column kind -> pandas dtype the results of both semantic layers are loaded as
+COLUMN_DTYPES = {'datetime': 'datetime64[ns]', 'integer': 'Int64', 'float': 'Float64', 'string': 'string'}
+
+_QUARTER = re.compile(r'^(\d{4})-?Q([1-4])$')
+
+
+def result_format():
+    """
+    Returns the typed format MetricFlow workers write results in: Arrow when pyarrow is installed, else a pickled
+    DataFrame (the worker is a child process of this one, using the same pandas).
+    """
+
+    try:
+        import pyarrow # noqa: F401
+        return 'arrow'
+    except ImportError:
+        return 'pickle'
+
+
+def group_by_kind(field, index):
+    """
+    Returns the column kind ('datetime' or 'string') of a MetricFlow group by field, from the type of its dimension.
+    E.g. 'metric_time__month' and 'order_id__ordered_at' -> 'datetime', 'order_id__status' and 'order_id' -> 'string'.
+    """
+
+    parts = field.split('__')
+
+    if len(parts) > 1:
+        model = index.model_for_dimension(parts[-2], parts[-1])
+        if model:
+            dimension = next(dim for dim in model['dimensions'] if dim['name'] == parts[-1])
+            return 'datetime' if dimension.get('type') == 'time' else 'string'
+        if parts[-1] in TIME_GRAINS: # A time dimension or metric_time at a grain
+            return 'datetime'
+
+    return 'datetime' if parts[-1] == 'metric_time' else 'string' # Otherwise an entity
+
+
+def metric_kind(metric_name, index):
+    """
+    Returns the column kind ('integer' or 'float') of a MetricFlow metric. Simple and cumulative metrics take the kind
+    of their measure's aggregation, e.g. count -> 'integer', sum -> 'float'; ratio and derived metrics are 'float'.
+    """
+
+    metric = index.metrics.get(metric_name) or {}
+    if metric.get('type') not in ('simple', 'cumulative'):
+        return 'float'
+
+    input_measures = (metric.get('type_params') or {}).get('input_measures') or []
+    measure = index.measures.get(input_measures[0]['name']) if len(input_measures) == 1 else None
+    return 'integer' if (measure or {}).get('agg') in INTEGER_AGGREGATIONS else 'float'
+
+
+def query_column_kinds(metrics, group_by, index):
+    """
+    Returns the column kinds of a query's results, in the order both semantic layers return them: the group by
+    fields, then the metrics.
+    """
+    return [group_by_kind(field, index) for field in group_by or []] + [metric_kind(metric, index) for metric in metrics]
+
+
+def _to_datetime(values):
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_localize(None) if values.dt.tz else values
+
+    # Dates repeat across rows, so only parse each distinct value once
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    if uniques.str.contains('Q', regex=False).any(): # Looker returns quarters as '2024-Q1'
+        uniques = uniques.str.replace(_QUARTER, lambda match: f"{match[1]}-{3 * int(match[2]) - 2:02d}", regex=True)
+    parsed = pd.to_datetime(uniques, errors='coerce', format='ISO8601', utc=True).dt.tz_localize(None)
+
+    parsed = pd.concat([parsed, pd.Series([pd.NaT], dtype=parsed.dtype)]).to_numpy() # Code -1 (null) -> NaT
+    return pd.Series(parsed[codes], index=values.index, dtype='datetime64[ns]')
+
+
+def _to_string(values):
+    import pandas as pd
+
+    if pd.api.types.is_float_dtype(values): # e.g. ids read as floats because of nulls: 3.0 -> '3'
+        whole = values.notna() & (values % 1 == 0)
+        text = values.astype('string')
+        text[whole] = values[whole].astype('int64').astype('string')
+        return text
+    return values.astype('string')
+
+
+def apply_column_kinds(results, kinds):
+    """
+    Casts each column of `results` to the dtype of its kind (see COLUMN_DTYPES), so values that only differ in their
+    representation (e.g. a date and its ISO string, or 3 and 3.0) compare equal. Values that cannot be cast become null.
+
+    Parameters:
+    results (pandas.DataFrame): The query results.
+    kinds (list): The column kinds, see query_column_kinds(). Results with a different number of columns are returned unchanged.
+
+    Returns:
+    pandas.DataFrame: The typed results.
+    """
+
+    import pandas as pd
+
+    if len(kinds) != results.shape[1]:
+        return results
+
+    typed = {}
+    for column, kind in zip(results.columns, kinds):
+        values = results[column]
+        if kind == 'datetime':
+            typed[column] = _to_datetime(values)
+        elif kind == 'string':
+            typed[column] = _to_string(values)
+        else:
+            numbers = pd.to_numeric(values, errors='coerce').astype(COLUMN_DTYPES['float'])
+            is_whole = (numbers.dropna() % 1 == 0).all()
+            typed[column] = numbers.astype(COLUMN_DTYPES['integer']) if kind == 'integer' and is_whole else numbers
+
+    return pd.DataFrame(typed, index=results.index)
+
+
+def read_csv_results(source, kinds, skiprows=0):
+    """
+    Reads CSV query results with the columns of numeric kinds parsed as numbers and the others as text, so no types
+    are inferred from the values. Cast the results to their kinds with apply_column_kinds().
+
+    Parameters:
+    source (str or file): The CSV file.
+    kinds (list): The column kinds, see query_column_kinds().
+    skiprows (int): Optional, the number of header rows.
+
+    Returns:
+    pandas.DataFrame: The results, with columns numbered from 0.
+    """
+
+    import pandas as pd
+
+    dtypes = {position: 'float64' if kind in ('integer', 'float') else object for position, kind in enumerate(kinds)}
+
+    if hasattr(source, 'seek'):
+        start = source.tell()
+    try:
+        return pd.read_csv(source, header=None, skiprows=skiprows, dtype=dtypes or object, keep_default_na=False, na_values=[''])
+    except (ValueError, TypeError): # A non-numeric value in a numeric column, read as text and leave it to apply_column_kinds()
+        if hasattr(source, 'seek'):
+            source.seek(start)
+        return pd.read_csv(source, header=None, skiprows=skiprows, dtype=object, keep_default_na=False, na_values=[''])
+
+
+def _without_grain(column):
+    """
+    Helper returning a column name without its time grain suffix, e.g. 'metric_time__day' -> 'metric_time'.
+    """
+
+    name, _, grain = column.lower().rpartition('__')
+    return name if name and grain in TIME_GRAINS else column.lower()
+
+
+def csv_header_rows(results_path, expected_columns=None):
+    """
+    Returns 1 if the first row of a CSV results file names the `expected_columns`, else 0. Names are compared
+    case-insensitively and without time grains, as MetricFlow names a time dimension queried without a grain after
+    its default grain (e.g. 'metric_time' is written as 'metric_time__day').
+    """
+
+    with open(results_path, 'r', newline='') as f:
+        first_row = next(csv.reader(f), [])
+    return int(bool(expected_columns) and [_without_grain(value) for value in first_row] == [_without_grain(column) for column in expected_columns])
+
+
+def iter_csv_results(results_path, kinds, columns, skiprows=0, chunk_rows=100_000):
+    """
+    Reads CSV query results `chunk_rows` rows at a time, so results larger than memory can be compared.
+
+    Parameters:
+    results_path (str): The CSV file.
+    kinds (list): The column kinds, see query_column_kinds().
+    columns (list): The names of the columns.
+    skiprows (int): Optional, the number of header rows.
+    chunk_rows (int): Optional, the number of rows per chunk.
+
+    Yields:
+    pandas.DataFrame: The next rows, cast to their kinds with apply_column_kinds().
+    """
+
+    import pandas as pd
+
+    numeric_dtypes = {column: 'float64' if kind in ('integer', 'float') else object for column, kind in zip(columns, kinds)}
+    rows_read = 0
+
+    # Parse numbers as numbers, see read_csv_results(). After a non-numeric value, re-read the rest of the file as text
+    for dtypes in (numeric_dtypes, object):
+        rows_to_skip = rows_read
+        try:
+            with pd.read_csv(results_path, header=None, names=columns, skiprows=skiprows, dtype=dtypes,
+                             keep_default_na=False, na_values=[''], chunksize=chunk_rows) as reader:
+                for chunk in reader:
+                    if rows_to_skip >= len(chunk): # Already read as numbers
+                        rows_to_skip -= len(chunk)
+                        continue
+                    chunk, rows_to_skip = chunk.iloc[rows_to_skip:], 0
+                    rows_read += len(chunk)
+                    yield apply_column_kinds(chunk, kinds)
+            return
+        except (ValueError, TypeError):
+            if dtypes is object:
+                raise
+
+
+def read_metricflow_results(results_path, result_format, kinds=(), expected_columns=None):
+    """
+    Reads the results of a MetricFlow query.
+
+    Parameters:
+    results_path (str): The results file.
+    result_format (str): 'arrow' or 'pickle' (written by a worker, see mf_worker) or 'csv' (written by `mf query --csv`).
+    kinds (list): Optional, the column kinds, used to parse CSV results, see read_csv_results().
+    expected_columns (list): Optional, the MetricFlow column names. A CSV header row matching them is skipped.
+
+    Returns:
+    pandas.DataFrame: The results, with columns named column_1, column_2, etc.
+    """
+
+    import pandas as pd
+
+    if result_format == 'arrow':
+        results = pd.read_feather(results_path)
+    elif result_format == 'pickle':
+        results = pd.read_pickle(results_path)
+    else:
+        results = read_csv_results(results_path, kinds, skiprows=csv_header_rows(results_path, expected_columns))
+
+    results.columns = [f'column_{i+1}' for i in range(results.shape[1])]
+    return results
@@ -0,0 +1,296 @@
+import os
+import math
+import pickle
+import logging
+import tempfile
+
+from . import result_types
+from .diff import diff_results, key_hashes, DIFF_COUNTS, DEFAULT_TOP_N
+
+STREAM_CHUNK_ROWS = 100_000 # Rows read from a results file at a time
+STREAM_MEMORY_LIMIT = 512 # MB of results compared at a time unless --memory-limit is given
+STREAM_MAX_BUCKETS = 256 # Bounds the number of bucket files open at once while partitioning
+CSV_MEMORY_FACTOR = 5 # Bytes of memory comparing a byte of CSV results takes: the typed values plus the join
+
+
+class _OutOfOrder(Exception):
+    """
+    Results expected to be sorted by their keys are not, in the order pandas compares values.
+    """
+
+
+def bucket_count(results_bytes, memory_limit=STREAM_MEMORY_LIMIT):
+    """
+    Returns the number of buckets to partition CSV results of `results_bytes` bytes (both sides) into, so comparing
+    a bucket takes at most `memory_limit` MB (if the keys are spread evenly), between 1 and STREAM_MAX_BUCKETS.
+    """
+    return min(STREAM_MAX_BUCKETS, max(1, math.ceil(results_bytes * CSV_MEMORY_FACTOR / (memory_limit * 1024 ** 2))))
+
+
+def _empty_results(columns, kinds):
+    import pandas as pd
+    return pd.DataFrame({column: pd.Series(dtype=result_types.COLUMN_DTYPES[kind]) for column, kind in zip(columns, kinds)})
+
+
+def _head(frames, top_n, largest=None):
+    """
+    Helper returning the first (or `largest`) `top_n` rows of the non-empty frames, or the first frame if all are empty.
+    """
+
+    import pandas as pd
+
+    non_empty = [frame for frame in frames if len(frame)]
+    if not non_empty:
+        return frames[0]
+    combined = pd.concat(non_empty, ignore_index=True)
+    return combined.nlargest(top_n, largest, keep='first').reset_index(drop=True) if largest else combined.head(top_n)
+
+
+def _add_diff(total, diff, top_n):
+    """
+    Helper combining the diff_results() of two disjoint sets of keys.
+    """
+
+    if total is None:
+        return diff
+
+    combined = {count: total[count] + diff[count] for count in DIFF_COUNTS}
+    combined['deviations'] = _head([total['deviations'], diff['deviations']], top_n, largest='abs_diff')
+    combined['metricflow_only_rows'] = _head([total['metricflow_only_rows'], diff['metricflow_only_rows']], top_n)
+    combined['looker_only_rows'] = _head([total['looker_only_rows'], diff['looker_only_rows']], top_n)
+    combined['passed'] = total['passed'] and diff['passed']
+    return combined
+
+
+def partition_results(chunks, key_count, buckets, directory, prefix):
+    """
+    Spills results to `buckets` files in `directory`, each row to the bucket of its key's hash, so rows with equal
+    keys in both results land in buckets of the same number. The rows of a bucket keep their order.
+
+    Parameters:
+    chunks (iterable): The results, as typed DataFrames, see result_types.iter_csv_results().
+    key_count (int): The number of leading key (group by) columns.
+    buckets (int): The number of buckets.
+    directory (str): Where the bucket files are written.
+    prefix (str): The bucket files' name prefix.
+
+    Returns:
+    list: The paths of the bucket files, each holding a sequence of pickled DataFrames.
+    """
+
+    paths = [os.path.join(directory, f"{prefix}_{bucket:04d}.pickle") for bucket in range(buckets)]
+    files = [open(path, 'wb') for path in paths]
+
+    try:
+        for chunk in chunks:
+            bucket_of_rows = key_hashes(chunk, list(chunk.columns[:key_count])) % buckets
+            for bucket, rows in chunk.groupby(bucket_of_rows, sort=False):
+                pickle.dump(rows, files[bucket], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for file in files:
+            file.close()
+
+    return paths
+
+
+def _read_bucket(path, empty):
+    import pandas as pd
+
+    parts = []
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                parts.append(pickle.load(file))
+            except EOFError:
+                break
+    return pd.concat(parts, ignore_index=True) if parts else empty
+
+
+def partitioned_diff(metricflow_chunks, looker_chunks, key_count, buckets, empty, tolerances=None, top_n=DEFAULT_TOP_N,
+                     spill_dir=None):
+    """
+    Compares results too large for memory: both are hash-partitioned by key into `buckets` files on disk (see
+    partition_results()), then compared a bucket at a time with diff_results(), so at most one bucket of each side
+    is in memory.
+
+    Parameters:
+    metricflow_chunks, looker_chunks (iterable): The results, as typed DataFrames with the same columns.
+    key_count (int): The number of leading key (group by) columns.
+    buckets (int): The number of buckets, see bucket_count().
+    empty (pandas.DataFrame): Empty results with the columns and dtypes of the chunks.
+    tolerances (dict): Optional, see diff_results().
+    top_n (int): Optional, see diff_results().
+    spill_dir (str): Optional, the directory the bucket files are written to. Defaults to a temporary directory.
+
+    Returns:
+    dict: The combined diff_results() of the buckets.
+    """
+
+    with tempfile.TemporaryDirectory(prefix='mf_compare_query_spill_', dir=spill_dir) as directory:
+
+        metricflow_buckets = partition_results(metricflow_chunks, key_count, buckets, directory, 'metricflow')
+        looker_buckets = partition_results(looker_chunks, key_count, buckets, directory, 'looker')
+
+        total = None
+        for metricflow_bucket, looker_bucket in zip(metricflow_buckets, looker_buckets):
+            diff = diff_results(_read_bucket(metricflow_bucket, empty), _read_bucket(looker_bucket, empty), key_count,
+                                tolerances=tolerances, top_n=top_n)
+            total = _add_diff(total, diff, top_n)
+            os.remove(metricflow_bucket)
+            os.remove(looker_bucket)
+
+    return total
+
+
+def _compare_keys(keys, other):
+    """
+    Helper comparing key rows lexicographically: -1 where `keys` sorts before `other`, 0 where equal, 1 after.
+    `other` is aligned key rows (a DataFrame) or a single key row (a Series).
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    order = np.zeros(len(keys), dtype='int8')
+    for column in keys.columns:
+        values = keys[column].reset_index(drop=True)
+        other_values = other[column].reset_index(drop=True) if isinstance(other, pd.DataFrame) else other[column]
+        undecided = order == 0
+        order[undecided & (values < other_values).to_numpy(dtype=bool, na_value=False)] = -1
+        order[undecided & (values > other_values).to_numpy(dtype=bool, na_value=False)] = 1
+    return order
+
+
+def _sorted_chunks(chunks, key_count, side):
+    """
+    Helper yielding `chunks` while checking their keys ascend. Raises _OutOfOrder otherwise, e.g. when nulls or the
+    warehouse's collation sort differently than pandas.
+    """
+
+    import pandas as pd
+
+    previous = None
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        keys = chunk.iloc[:, :key_count]
+        if keys.isna().to_numpy().any():
+            raise _OutOfOrder(f"{side} results have null keys, which warehouses sort differently.")
+        checked = pd.concat([previous, keys], ignore_index=True) if previous is not None else keys
+        if (_compare_keys(checked.iloc[:-1], checked.iloc[1:]) > 0).any():
+            raise _OutOfOrder(f"{side} results are not sorted by their keys in the order pandas compares them.")
+        previous = keys.iloc[-1:]
+        yield chunk
+
+
+def sort_merge_diff(metricflow_chunks, looker_chunks, key_count, empty, tolerances=None, top_n=DEFAULT_TOP_N):
+    """
+    Compares results sorted by their keys (ascending) in one pass, holding about a chunk of each side in memory:
+    rows are read from whichever side is behind, and rows with keys before the last key read from both sides are
+    compared with diff_results() and dropped.
+
+    Parameters:
+    metricflow_chunks, looker_chunks (iterable): The sorted results, as typed DataFrames with the same columns.
+    key_count (int): The number of leading key (group by) columns, at least 1.
+    empty (pandas.DataFrame): Empty results with the columns and dtypes of the chunks.
+    tolerances (dict): Optional, see diff_results().
+    top_n (int): Optional, see diff_results().
+
+    Returns:
+    dict: The combined diff_results() of the chunks.
+
+    Raises:
+    _OutOfOrder: If either results are not sorted by their keys.
+    """
+
+    import pandas as pd
+
+    sides = [{'chunks': _sorted_chunks(metricflow_chunks, key_count, 'MetricFlow'), 'pending': empty, 'done': False},
+             {'chunks': _sorted_chunks(looker_chunks, key_count, 'Looker'), 'pending': empty, 'done': False}]
+
+    def read_chunk(side):
+        chunk = next(side['chunks'], None)
+        if chunk is None:
+            side['done'] = True
+        else:
+            side['pending'] = pd.concat([side['pending'], chunk], ignore_index=True) if len(side['pending']) else chunk
+
+    total = None
+    while True:
+
+        for side in sides:
+            if not side['done'] and not len(side['pending']):
+                read_chunk(side)
+
+        # Rows still to be read from either side have keys at or after the frontier, the lowest last key read
+        reading = [side for side in sides if not side['done']]
+        frontier = None
+        for side in reading:
+            last_key = side['pending'].iloc[-1, :key_count]
+            if frontier is None or _compare_keys(last_key.to_frame().T, frontier)[0] < 0:
+                frontier = last_key
+
+        # Compare the rows before the frontier
+        if frontier is None:
+            resolved = [side['pending'] for side in sides]
+        else:
+            before = [_compare_keys(side['pending'].iloc[:, :key_count], frontier) < 0 for side in sides]
+            resolved = [side['pending'][mask] for side, mask in zip(sides, before)]
+            for side, mask in zip(sides, before):
+                side['pending'] = side['pending'][~mask].reset_index(drop=True)
+
+        if len(resolved[0]) or len(resolved[1]):
+            total = _add_diff(total, diff_results(resolved[0], resolved[1], key_count, tolerances=tolerances,
+                                                  top_n=top_n), top_n)
+
+        if frontier is None:
+            return total or diff_results(empty, empty, key_count, tolerances=tolerances, top_n=top_n)
+
+        # Read on from the sides that are behind
+        for side in reading:
+            if _compare_keys(side['pending'].iloc[-1:, :key_count], frontier)[0] == 0:
+                read_chunk(side)
+
+
+def stream_diff(metricflow_path, looker_path, kinds, columns, key_count, metricflow_skiprows=0, looker_skiprows=1,
+                tolerances=None, top_n=DEFAULT_TOP_N, memory_limit=STREAM_MEMORY_LIMIT, chunk_rows=STREAM_CHUNK_ROWS,
+                sorted_by_keys=False):
+    """
+    Compares CSV query results without loading either into memory: with a streaming sort-merge if both are sorted by
+    their keys, else by hash-partitioning them to disk (see partitioned_diff()). The sort-merge falls back to
+    partitioning if the results turn out not to be sorted the way pandas compares keys.
+
+    Parameters:
+    metricflow_path, looker_path (str): The CSV results.
+    kinds (list): The column kinds, see result_types.query_column_kinds().
+    columns (list): The column names.
+    key_count (int): The number of leading key (group by) columns.
+    metricflow_skiprows, looker_skiprows (int): Optional, the number of header rows of each file.
+    tolerances (dict): Optional, see diff_results().
+    top_n (int): Optional, see diff_results().
+    memory_limit (float): Optional, the MB of results compared at a time when partitioning.
+    chunk_rows (int): Optional, the number of rows read at a time.
+    sorted_by_keys (bool): Optional, both results were queried sorted by their keys, ascending.
+
+    Returns:
+    dict: The diff_results() of the whole results.
+    """
+
+    def chunks(path, skiprows):
+        return result_types.iter_csv_results(path, kinds, columns, skiprows=skiprows, chunk_rows=chunk_rows)
+
+    empty = _empty_results(columns, kinds)
+
+    if sorted_by_keys and key_count:
+        try:
+            logging.info("Comparing the sorted results with a streaming sort-merge.")
+            return sort_merge_diff(chunks(metricflow_path, metricflow_skiprows), chunks(looker_path, looker_skiprows),
+                                   key_count, empty, tolerances=tolerances, top_n=top_n)
+        except _OutOfOrder as e:
+            logging.info(f"{e} Comparing the results by hash-partitioning them instead.")
+
+    buckets = bucket_count(os.path.getsize(metricflow_path) + os.path.getsize(looker_path), memory_limit)
+    logging.info(f"Comparing the results in {buckets} hash-partitioned buckets.")
+    return partitioned_diff(chunks(metricflow_path, metricflow_skiprows), chunks(looker_path, looker_skiprows),
+                            key_count, buckets, empty, tolerances=tolerances, top_n=top_n,
+                            spill_dir=os.path.dirname(os.path.abspath(metricflow_path)))
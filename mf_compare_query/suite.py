@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import concurrent.futures
+
+from . import to_looker, parse_project
+from .phases import PhaseTimer
+from .diff import diff_results, log_diff, column_tolerances, DIFF_COUNTS
+from .explore_cache import EXPLORE_CACHE_TTL
+from .mf_worker import MetricFlowWorkerPool
+
+SUITE_CONCURRENCY = 4 # Queries compared at the same time unless --concurrency is given
+SPEC_KEYS = {'name', 'metrics', 'group_by', 'where', 'looker_filters', 'explore', 'tolerances'}
+
+
+def _as_list(value):
+    if value is None or isinstance(value, list):
+        return value
+    return str(value).split(',') # Also accept the comma-separated form of the command line
+
+
+def load_suite(path):
+    """
+    Loads the query specs of a comparison suite from a YAML file of the form:
+
+        defaults:            # Optional, applied to every query
+          explore: orders
+        queries:
+          - name: revenue_by_status
+            metrics: [revenue]
+            group_by: [order_id__status]
+            where: "{{ Dimension('order_id__status') }} = 'completed'"
+            looker_filters: {'orders.status': 'completed'}
+            tolerances: {revenue: 0.01}   # Optional, see diff.column_tolerances()
+
+    Parameters:
+    path (str): Path of the suite file.
+
+    Returns:
+    list: Query specs, dicts with the keys SPEC_KEYS. Queries without a name are named after their position.
+    """
+
+    from ruamel.yaml import YAML
+
+    try:
+        with open(path, 'r') as file:
+            suite = YAML(typ='safe').load(file) or {}
+    except (OSError, ValueError) as e:
+        logging.error(f"Suite file `{path}` could not be read: {e}")
+        sys.exit(1)
+
+    defaults = suite.get('defaults') or {}
+    specs = []
+
+    for position, query in enumerate(suite.get('queries') or [], start=1):
+
+        spec = {key: None for key in SPEC_KEYS}
+        spec.update(defaults)
+        spec.update(query or {})
+
+        unknown_keys = set(spec) - SPEC_KEYS
+        if unknown_keys:
+            logging.error(f"Query {position} in `{path}` has unknown keys: {', '.join(sorted(unknown_keys))}.")
+            sys.exit(1)
+        if not spec['metrics'] or not spec['explore']:
+            logging.error(f"Query {position} in `{path}` must define `metrics` and `explore`.")
+            sys.exit(1)
+
+        spec['name'] = str(spec['name'] or f"query_{position}")
+        spec['metrics'] = _as_list(spec['metrics'])
+        spec['group_by'] = _as_list(spec['group_by'])
+        specs.append(spec)
+
+    if not specs:
+        logging.error(f"Suite file `{path}` has no queries.")
+        sys.exit(1)
+
+    return specs
+
+
+def parse_shard(shard):
+    """
+    Parses a `--shard` argument of the form 'i/n' into (i, n), 1 <= i <= n.
+    """
+
+    try:
+        index, count = (int(part) for part in shard.split('/'))
+    except ValueError:
+        index, count = 0, 0
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard `{shard}`, expected i/n with 1 <= i <= n, e.g. --shard 2/4.")
+    return index, count
+
+
+def shard_specs(specs, index, count):
+    """
+    Returns the specs of shard `index` of `count`: every count-th spec starting from the index-th, so shards of a suite
+    sorted by cost are balanced and each spec is in exactly one shard.
+    """
+    return specs[index - 1::count]
+
+
+def _scratch_name(position, spec):
+    safe_name = ''.join(character if character.isalnum() or character in '-_' else '_' for character in spec['name'])
+    return f"{position:04d}_{safe_name}.csv"
+
+
+def run_query_spec(spec, connection, scratch_path, dev_branch=None):
+    """
+    Runs one query spec against MetricFlow and Looker and compares the results. Failures (which log an error and exit)
+    are reported as errors rather than ending the suite.
+
+    Parameters:
+    spec (dict): The query spec, see load_suite().
+    connection (tuple): (Looker SDK, Looker model name, {explore: field names}).
+    scratch_path (str): The file MetricFlow writes the results to, not shared with other queries.
+    dev_branch (str): Optional, the development git branch of the Looker session.
+
+    Returns:
+    dict: {'name', 'explore', 'result': 'pass' | 'fail' | 'error', 'mf_rows', 'looker_rows', the DIFF_COUNTS of
+           diff.diff_results(), 'seconds'}.
+    """
+
+    sdk, looker_model, fields_by_explore = connection
+    report = {'name': spec['name'], 'explore': spec['explore'], 'result': 'error', 'mf_rows': None,
+              'looker_rows': None, **{count: None for count in DIFF_COUNTS}, 'seconds': None}
+    start = time.perf_counter()
+
+    try:
+        mf_results = to_looker.query_metricflow(metrics=spec['metrics'], group_by=spec['group_by'],
+                                                where=spec['where'], results_path=scratch_path)
+        report['mf_rows'] = mf_results.shape[0]
+
+        lkr_results = to_looker.run_looker_query(sdk, looker_model, fields_by_explore[spec['explore']],
+                                                 explore=spec['explore'], metrics=spec['metrics'],
+                                                 group_by=spec['group_by'], filters=spec['looker_filters'],
+                                                 dev_branch=dev_branch)
+        report['looker_rows'] = lkr_results.shape[0]
+
+        mf_results.columns = lkr_results.columns # MF does not return column names so overwrite them with Looker's.
+        key_count = len(spec['group_by'] or [])
+        diff = diff_results(mf_results, lkr_results, key_count,
+                            tolerances=column_tolerances(spec['metrics'], list(lkr_results.columns), key_count,
+                                                         spec['tolerances']))
+        log_diff(diff)
+        report.update({count: diff[count] for count in DIFF_COUNTS})
+        report['result'] = 'pass' if diff['passed'] else 'fail'
+    except (Exception, SystemExit) as e:
+        logging.error(f"Query `{spec['name']}` could not be compared: {type(e).__name__} {e}")
+
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def connect_explores(explores, dev_branch=None, cache_dir='target', ttl=EXPLORE_CACHE_TTL):
+    """
+    Connects to Looker once and fetches the fields of each explore, see to_looker.fetch_explore_fields().
+
+    Returns:
+    tuple: (Looker SDK, Looker model name, {explore: field names}).
+    """
+
+    sdk, looker_model = to_looker.looker_session(dev_branch=dev_branch)
+    return sdk, looker_model, {explore: to_looker.fetch_explore_fields(sdk, looker_model, explore, dev_branch=dev_branch,
+                                                                      cache_dir=cache_dir, ttl=ttl)
+                               for explore in explores}
+
+
+def run_suite(specs, concurrency=SUITE_CONCURRENCY, dev_branch=None, manifest_dir='target', force_parse=False,
+              explore_cache_ttl=EXPLORE_CACHE_TTL, mf_workers=None):
+    """
+    Compares the queries of a suite in one process: the dbt project is parsed and Looker is connected to once, while
+    up to `concurrency` queries run at the same time, each writing MetricFlow results to its own scratch file.
+    MetricFlow queries run on a pool of persistent workers (see mf_worker) that load the semantic manifest and connect
+    to the warehouse once, rather than starting `mf query` for each query.
+
+    Parameters:
+    specs (list): Query specs, see load_suite().
+    concurrency (int): Optional, the number of queries compared at the same time.
+    dev_branch (str): Optional, the development git branch to use when querying Looker.
+    manifest_dir (str): Optional, the directory dbt writes the manifests to.
+    force_parse (bool): Optional, run `dbt parse` even if the project has not changed.
+    explore_cache_ttl (float): Optional, seconds the explores' fields are cached for in `manifest_dir`.
+    mf_workers (int): Optional, the number of MetricFlow workers. Defaults to `concurrency`, 0 runs `mf query` per query.
+
+    Returns:
+    list: A report per query, in the order of `specs`, see run_query_spec().
+    """
+
+    timer = PhaseTimer()
+    explores = sorted({spec['explore'] for spec in specs})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+
+        # CONNECT TO LOOKER WHILE PARSING THE DBT PROJECT
+        looker_connection = executor.submit(timer.run, 'looker_connect', [], connect_explores, explores,
+                                            dev_branch=dev_branch, cache_dir=manifest_dir, ttl=explore_cache_ttl)
+        timer.run('dbt_parse', [], parse_project, manifest_dir=manifest_dir, force_parse=force_parse)
+
+        # Workers load the freshly parsed semantic manifest while the Looker connection finishes
+        mf_worker_count = concurrency if mf_workers is None else mf_workers
+        workers = MetricFlowWorkerPool(min(mf_worker_count, len(specs))) if mf_worker_count > 0 else None
+        to_looker.set_metricflow_workers(workers)
+
+        try:
+            connection = looker_connection.result()
+
+            # COMPARE THE QUERIES
+            with tempfile.TemporaryDirectory(prefix='mf_compare_query_') as scratch_dir:
+                futures = [executor.submit(run_query_spec, spec, connection, os.path.join(scratch_dir, _scratch_name(position, spec)),
+                                           dev_branch=dev_branch)
+                           for position, spec in enumerate(specs)]
+                reports = timer.run('queries', ['dbt_parse', 'looker_connect'],
+                                    lambda: [future.result() for future in futures])
+        finally:
+            to_looker.set_metricflow_workers(None)
+            if workers:
+                workers.close()
+
+    timer.log_summary()
+    return reports
+
+
+def log_suite_report(reports, report_path=None):
+    """
+    Logs a table of the query reports and the pass/fail counts, and writes the reports as JSON to `report_path` if given.
+
+    Returns:
+    bool: True if every query passed.
+    """
+
+    from tabulate import tabulate
+
+    counts = {result: sum(report['result'] == result for report in reports) for result in ('pass', 'fail', 'error')}
+
+    logging.info("Suite results: -\n" + tabulate(reports, headers='keys', tablefmt='pretty'))
+    logging.info(f"{counts['pass']} of {len(reports)} queries passed, {counts['fail']} failed, {counts['error']} errors.")
+
+    if report_path:
+        with open(report_path, 'w') as file:
+            json.dump({'passed': counts['pass'] == len(reports), 'counts': counts, 'queries': reports}, file, indent=2)
+        logging.info(f"Suite report written to {report_path}.")
+
+    return counts['pass'] == len(reports)
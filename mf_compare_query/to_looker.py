@@ -1,32 +1,84 @@
 import os
+import re
 import sys
-import pandas as pd
 import logging
-from tabulate import tabulate
+import threading
 
 import subprocess
 
-import looker_sdk
-from looker_sdk import models40
-looker_logger = logging.getLogger('looker_sdk')
-looker_logger.setLevel(logging.WARNING)
 from io import StringIO
 
+from mf_translate.semantic_index import SemanticIndex
+from mf_translate.to_looker import time_dimension_to_lkml_field
+from . import result_types
+from .diff import diff_results, log_diff, DEFAULT_TOP_N
+from .mf_worker import MetricFlowWorkerError, MetricFlowWorkerUnavailable
+from .explore_cache import explore_key, read_explore_fields, write_explore_fields, EXPLORE_CACHE_TTL
+from .result_cache import looker_key
+
+MF_RESULTS_PATH = 'logs/mf_compare_query_results.csv' # Where `mf query` writes its results unless told otherwise
+
+METRICFLOW_WORKERS = None # MetricFlowWorkerPool queries are run on, see set_metricflow_workers(). `mf query` if None
+
+RESULT_CACHE = None # ResultCache query results are reused from, see set_result_cache(). Not cached if None
+
+LOOKER_SESSIONS = {} # Dev branch (None for production) -> (authenticated Looker SDK, Looker model name)
+_LOOKER_SESSION_LOCK = threading.Lock()
+
 SEMANTIC_MODELS = []
 METRICS = []
+SEMANTIC_INDEX = SemanticIndex() # Lookups over the above, see semantic_index()
 
-def set_semantic_manifest(metricflow_semantic_manifest):
+def set_semantic_manifest(metricflow_semantic_manifest, semantic_index=None):
     """
-    Sets the SEMANTIC_MODELS, METRICS and DBT_NODES globals from the MetricFlow semantic manifest and the DBT manifest.
+    Sets the SEMANTIC_MODELS, METRICS and SEMANTIC_INDEX globals from the MetricFlow semantic manifest.
 
     Parameters:
     metricflow_semantic_manifest (dict): The MetricFlow semantic manifest.
+    semantic_index (SemanticIndex): Optional, a prebuilt index over the manifest (e.g. from the manifest cache). Built if not provided.
     """
     global SEMANTIC_MODELS
     global METRICS
+    global SEMANTIC_INDEX
 
     SEMANTIC_MODELS = metricflow_semantic_manifest.get('semantic_models', [])
     METRICS = metricflow_semantic_manifest.get('metrics', [])
+    if semantic_index and semantic_index.is_built_from(SEMANTIC_MODELS, METRICS):
+        SEMANTIC_INDEX = semantic_index
+    else:
+        SEMANTIC_INDEX = SemanticIndex(SEMANTIC_MODELS, METRICS)
+
+
+def set_metricflow_workers(workers):
+    """
+    Sets the METRICFLOW_WORKERS global, the MetricFlowWorkerPool that query_metricflow() runs queries on instead of
+    starting `mf query` for each query. None to go back to `mf query`. The caller closes the pool.
+    """
+    global METRICFLOW_WORKERS
+
+    METRICFLOW_WORKERS = workers
+
+
+def set_result_cache(cache):
+    """
+    Sets the RESULT_CACHE global, the ResultCache that query_metricflow() and run_looker_query() reuse results from
+    rather than running an unchanged query again. None to always run queries.
+    """
+    global RESULT_CACHE
+
+    RESULT_CACHE = cache
+
+
+def semantic_index():
+    """
+    Returns the SemanticIndex for the current SEMANTIC_MODELS and METRICS globals, rebuilding it if the globals have been replaced since it was built.
+    """
+    global SEMANTIC_INDEX
+
+    if not SEMANTIC_INDEX.is_built_from(SEMANTIC_MODELS, METRICS):
+        SEMANTIC_INDEX = SemanticIndex(SEMANTIC_MODELS, METRICS)
+
+    return SEMANTIC_INDEX
 
 
 def metric_to_looker_measure(metric_name):
@@ -42,18 +94,12 @@ def metric_to_looker_measure(metric_name):
 
     parent_model = None
 
-    metrics_dict = {metric['name']: metric for metric in METRICS}
-
-    measures_dict = {}
-    for model in SEMANTIC_MODELS:
-        for measure in model["measures"]:
-            measures_dict[measure["name"]] = measure | {'parent_model': model['name']}
+    index = semantic_index()
 
-
-    metric = metrics_dict.get(metric_name)
+    metric = index.metrics.get(metric_name)
 
     for input_measure in metric["type_params"]["input_measures"]:
-        measure = measures_dict.get(input_measure["name"])
+        measure = index.measures.get(input_measure["name"])
         new_parent_model = measure["parent_model"]
         if parent_model:
             if parent_model != new_parent_model:
@@ -67,6 +113,7 @@ def metric_to_looker_measure(metric_name):
 def field_to_looker_dim(field):
     """
     Converts a MetricFlow field (dimension or entity) to a Looker dimension. For example 'order_id__order_status' becomes 'orders.order_status', 'order_id' becomes 'orders.order_id'.
+    Time dimensions become the field of their dimension group at the field's grain, e.g. 'order_id__ordered_at__month' becomes 'orders.ordered_at_month'.
 
     Parameters:
     field (str): The MetricFlow field name.
@@ -82,25 +129,18 @@ def field_to_looker_dim(field):
         dimension_name = field_parts[1]
 
         # Get model for entity, dimension pair
-        model_for_dimension = None
-        for model in SEMANTIC_MODELS:
-            for entity in model["entities"]:
-                if entity["name"] == entity_name and entity["type"] == 'primary':
-                    if 'dimensions' in model:
-                        if any(dim['name'] == dimension_name for dim in model['dimensions']):
-                            model_for_dimension = model
-                            break
+        model_for_dimension = semantic_index().model_for_dimension(entity_name, dimension_name)
+
+        dimension = next((dim for dim in model_for_dimension.get("dimensions") or [] if dim["name"] == dimension_name), {})
+        if dimension.get("type") == "time":
+            grain = field_parts[2] if len(field_parts) > 2 else None
+            return model_for_dimension["name"] + "." + time_dimension_to_lkml_field(model_for_dimension, dimension_name, grain)
 
         return model_for_dimension["name"] + "." + dimension_name
     else:
 
         # Get (any) model for the entity
-        model_for_entity = None
-        for model in SEMANTIC_MODELS:
-            for entity in model["entities"]:
-                if entity["name"] == entity_name and entity["type"] == 'primary':
-                    model_for_entity = model
-                    break
+        model_for_entity = semantic_index().model_for_entity(entity_name)
 
         return model_for_entity["name"] + "." + entity_name
 
@@ -120,6 +160,8 @@ def query_to_looker_query(looker_model, explore, metrics, group_by=None, order_b
     looker_sdk.models40.WriteQuery: The Looker query.
     """
 
+    from looker_sdk import models40 # pandas, tabulate and looker_sdk are imported on first use to keep start-up fast
+
     lkr_fields = []
 
     if group_by:
@@ -131,7 +173,7 @@ def query_to_looker_query(looker_model, explore, metrics, group_by=None, order_b
 
     if order_by:
         lkr_sorts = []
-        metric_names = [metric['name'] for metric in METRICS]
+        metric_names = semantic_index().metrics
         for field in order_by:
             prefix = '-' if field[0] == '-' else ''
             field = field.replace('-', '')
@@ -142,28 +184,36 @@ def query_to_looker_query(looker_model, explore, metrics, group_by=None, order_b
     else:
         lkr_sorts = None
 
-    return looker_sdk.models40.WriteQuery(model=looker_model,
-                                          view=explore,
-                                          fields=lkr_fields,
-                                          sorts=lkr_sorts,
-                                          limit=-1)
+    return models40.WriteQuery(model=looker_model,
+                               view=explore,
+                               fields=lkr_fields,
+                               sorts=lkr_sorts,
+                               limit=-1)
 
 
-def query_looker(explore, metrics, group_by=None, order_by=None, dev_branch=None, filters=None):
+def looker_session(dev_branch=None):
     """
-    Queries Looker for the specified metrics, group by and order by fields.
+    Returns an authenticated Looker SDK session, switched to the development git branch if specified. Sessions are kept
+    in LOOKER_SESSIONS and reused by later queries in the process; the SDK renews the access token when it expires.
 
     Parameters:
-    metrics (list): A list of metric names.
-    group_by (list): A list of dimensions to group by (optional).
-    order_by (list): A list of fields to order by (optional).
     dev_branch (str): The development git branch to use when querying Looker (optional).
-    filters (dict): A dictionary of Looker filters (optional). For example, {'orders.revenue': '>100', 'customers.region': 'US'}.
 
     Returns:
-    pandas.DataFrame: The query results.
+    tuple: (Looker SDK, Looker model name).
     """
 
+    with _LOOKER_SESSION_LOCK: # Concurrent queries share one login
+        if dev_branch not in LOOKER_SESSIONS:
+            LOOKER_SESSIONS[dev_branch] = _new_looker_session(dev_branch)
+        return LOOKER_SESSIONS[dev_branch]
+
+
+def _new_looker_session(dev_branch):
+
+    import looker_sdk
+    from looker_sdk import models40
+
     # Check if the Looker API credentials are defined
     if not os.getenv('LOOKERSDK_BASE_URL') and not os.getenv('LOOKERSDK_CLIENT_ID') and not os.getenv('LOOKERSDK_CLIENT_SECRET'):
         logging.error("Not all Looker API credentials are defined. Use the following commands to set the credentials:-")
@@ -174,6 +224,13 @@ def query_looker(explore, metrics, group_by=None, order_by=None, dev_branch=None
         sys.exit(1)
 
     sdk = looker_sdk.init40()
+    try:
+        sdk.auth.authenticate({})
+    except looker_sdk.error.SDKError as e:
+        logging.error(f"Looker authentication failed.\n"
+                      f"Looker error:---\n{getattr(e, 'message', 'No error message provided')}\n---"
+        )
+        sys.exit(1)
 
     # Update the Looker dev branch if specified
     if dev_branch:
@@ -201,33 +258,103 @@ def query_looker(explore, metrics, group_by=None, order_by=None, dev_branch=None
         logging.info("See https://cloud.google.com/looker/docs/lookml-project-files#model_files for more information on Looker models.")
         sys.exit(1)
 
-    # Define the Looker query
-    lkr_query = query_to_looker_query(looker_model, explore, metrics, group_by, order_by)
-    query_description = f"Querying Looker {lkr_query.view} explore fields: {', '.join(lkr_query.fields)}"
-    
-    if filters:
-        lkr_query.filters = filters
-        query_description += f", filters: {filters}"
+    return sdk, looker_model
 
-    logging.info(query_description)
-    logging.debug(f"Looker query: {lkr_query}")
 
-    # Check if query fields are valid
+def fetch_explore_fields(sdk, looker_model, explore, dev_branch=None, cache_dir='target', ttl=EXPLORE_CACHE_TTL):
+    """
+    Returns the names of an explore's dimensions and measures, to validate queries against. Field lists are cached in
+    memory and in `cache_dir` (see explore_cache), so the explore's metadata, which can take seconds to fetch for a large
+    explore, is only fetched again after `ttl` seconds.
+
+    Parameters:
+    sdk, looker_model: As returned by looker_session().
+    explore (str): The Looker explore name.
+    dev_branch (str): The development git branch of the session (optional). Part of the cache key.
+    cache_dir (str): The directory of the cache file (optional). Not written to if it does not exist.
+    ttl (float): Seconds a cached field list is used for (optional). 0 always fetches the metadata.
+
+    Returns:
+    set: The explore's field names.
+    """
+
+    import looker_sdk
+
+    try:
+        base_url = sdk.auth.settings.base_url
+    except AttributeError:
+        base_url = os.getenv('LOOKERSDK_BASE_URL')
+    key = explore_key(base_url, looker_model, explore, dev_branch)
+
+    valid_fields = read_explore_fields(key, cache_dir=cache_dir, ttl=ttl)
+    if valid_fields is not None:
+        logging.debug(f"Using cached fields of the `{explore}` explore.")
+        return valid_fields
+
     try:
-        explore_metadata = sdk.lookml_model_explore(lookml_model_name=looker_model, explore_name=explore)
+        explore_metadata = sdk.lookml_model_explore(lookml_model_name=looker_model, explore_name=explore, fields='fields')
         valid_fields = {field.name for field in explore_metadata.fields.dimensions + explore_metadata.fields.measures}
-        invalid_fields = []
-        for field in lkr_query.fields:
-            if field not in valid_fields:
-                invalid_fields.append(field)
-        if invalid_fields:
-            logging.error(f"Invalid Looker fields detected: {', '.join(invalid_fields)}")
-            sys.exit(1)
     except looker_sdk.error.SDKError as e:
         logging.info(f"Looker error:---\n{getattr(e, 'message', 'No error message provided')}\n---\n")
         logging.error(f"Failed to fetch `{explore}` explore's metadata from model `{looker_model}`.\n")
         sys.exit(1)
 
+    write_explore_fields(key, valid_fields, cache_dir=cache_dir)
+    return valid_fields
+
+
+def connect_looker(explore, dev_branch=None, cache_dir='target', ttl=EXPLORE_CACHE_TTL):
+    """
+    Connects to Looker and fetches the fields of the explore to compare against. Independent of the dbt project, so it
+    can run while the project is parsed.
+
+    Parameters:
+    explore (str): The Looker explore name.
+    dev_branch (str): The development git branch to use when querying Looker (optional).
+    cache_dir, ttl: Where and for how long the explore's fields are cached, see fetch_explore_fields().
+
+    Returns:
+    tuple: (Looker SDK, Looker model name, set of the explore's dimension and measure names).
+    """
+
+    sdk, looker_model = looker_session(dev_branch=dev_branch)
+    return sdk, looker_model, fetch_explore_fields(sdk, looker_model, explore, dev_branch=dev_branch,
+                                                   cache_dir=cache_dir, ttl=ttl)
+
+
+def run_looker_query(sdk, looker_model, valid_fields, explore, metrics, group_by=None, order_by=None, filters=None,
+                     dev_branch=None):
+    """
+    Queries Looker for the specified metrics, group by and order by fields using a connection from connect_looker().
+    Needs the semantic manifest to be set, see set_semantic_manifest().
+
+    Parameters:
+    sdk, looker_model, valid_fields: As returned by connect_looker().
+    dev_branch (str): The development git branch of the session (optional). Part of the result cache key.
+    Remaining parameters are those of query_looker().
+
+    Returns:
+    pandas.DataFrame: The query results.
+    """
+
+    import looker_sdk
+    from tabulate import tabulate
+
+    lkr_query = _checked_looker_query(looker_model, valid_fields, explore, metrics, group_by, order_by, filters)
+
+    # Reuse the results of the same SQL, which only changes with the query or the LookML it is generated from. The SQL
+    # costs a round trip to Looker, so is only fetched when the cache is used
+    cache = RESULT_CACHE if RESULT_CACHE and RESULT_CACHE.uses('looker') else None
+    if cache:
+        try:
+            cache_key = looker_key(sdk.auth.settings.base_url, looker_model, sdk.run_inline_query("sql", lkr_query),
+                                   dev_branch=dev_branch)
+        except looker_sdk.error.SDKError:
+            cache = None # Running the query reports the error
+        cached_results = cache.read(cache_key, 'looker') if cache else None
+        if cached_results is not None:
+            return cached_results
+
     # Run the Looker query
     try:
         response = sdk.run_inline_query("csv", lkr_query)
@@ -237,28 +364,182 @@ def query_looker(explore, metrics, group_by=None, order_by=None, dev_branch=None
         )
         sys.exit(1)
 
-    query_results_df = pd.read_csv(StringIO(response))
+    # Parse the results straight into the types of their fields in the semantic manifest, named by field
+    kinds = result_types.query_column_kinds(metrics, group_by, semantic_index())
+    query_results_df = result_types.read_csv_results(StringIO(response), kinds, skiprows=1) # Skip the field labels
+    query_results_df.columns = lkr_query.fields[:query_results_df.shape[1]]
+    query_results_df = result_types.apply_column_kinds(query_results_df, kinds)
 
     logging.debug("Looker query results: -")
     logging.debug(tabulate(query_results_df, headers='keys', tablefmt='pretty'))
 
+    if cache:
+        cache.write(cache_key, 'looker', query_results_df)
+
     return query_results_df
 
 
-def query_metricflow(metrics, group_by=None, order_by=None, where=None):
+def _checked_looker_query(looker_model, valid_fields, explore, metrics, group_by=None, order_by=None, filters=None):
+    """
+    Helper returning the Looker query of a MetricFlow query, after logging it and checking its fields exist.
+    """
+
+    # Define the Looker query
+    lkr_query = query_to_looker_query(looker_model, explore, metrics, group_by, order_by)
+    query_description = f"Querying Looker {lkr_query.view} explore fields: {', '.join(lkr_query.fields)}"
+    
+    if filters:
+        lkr_query.filters = filters
+        query_description += f", filters: {filters}"
+
+    logging.info(query_description)
+    logging.debug(f"Looker query: {lkr_query}")
+
+    # Check if query fields are valid
+    invalid_fields = [field for field in lkr_query.fields if field not in valid_fields]
+    if invalid_fields:
+        logging.error(f"Invalid Looker fields detected: {', '.join(invalid_fields)}")
+        logging.info("If the explore has changed in the last hour, rerun with `--explore-cache-ttl 0` to refresh its cached fields.")
+        sys.exit(1)
+
+    return lkr_query
+
+
+def looker_query_sql(sdk, looker_model, valid_fields, explore, metrics, group_by=None, order_by=None, filters=None):
+    """
+    Returns the SQL Looker generates for a query, without running it. See run_looker_query() for the parameters.
+
+    Returns:
+    tuple: (the query's SQL, the Looker fields it selects, in order).
+    """
+
+    import looker_sdk
+
+    lkr_query = _checked_looker_query(looker_model, valid_fields, explore, metrics, group_by, order_by, filters)
+
+    try:
+        sql = sdk.run_inline_query("sql", lkr_query)
+    except looker_sdk.error.SDKError as e:
+        logging.error(f"Looker could not generate the query's SQL.\n"
+                      f"Looker error:---\n{getattr(e, 'message', 'No error message provided')}\n---"
+        )
+        sys.exit(1)
+
+    return sql.strip().rstrip(';').strip(), list(lkr_query.fields)
+
+
+def download_looker_query(sdk, looker_model, valid_fields, explore, metrics, group_by=None, order_by=None, filters=None,
+                          results_path=None, chunk_bytes=1 << 20):
+    """
+    Runs a Looker query like run_looker_query() but streams the CSV results to `results_path` rather than holding
+    them in memory, for results too large to load at once. See stream_diff.
+
+    Parameters:
+    results_path (str): The file the CSV results are written to, with a header row of field labels.
+    chunk_bytes (int): Optional, the size of the blocks the response is written in.
+    Remaining parameters are those of run_looker_query().
+
+    Returns:
+    list: The Looker fields, the names of the results' columns.
+    """
+
+    import requests
+
+    lkr_query = _checked_looker_query(looker_model, valid_fields, explore, metrics, group_by, order_by, filters)
+
+    # The SDK reads whole responses into memory, so post the query with its session and authentication instead
+    session = getattr(getattr(sdk, 'transport', None), 'session', None) or requests.Session()
+    url = f"{sdk.auth.settings.base_url.rstrip('/')}/api/4.0/queries/run/csv"
+    headers = {'Content-Type': 'application/json', **sdk.auth.authenticate({})}
+
+    try:
+        with session.post(url, data=sdk.serialize(api_model=lkr_query), headers=headers, stream=True,
+                          timeout=sdk.auth.settings.timeout) as response:
+            response.raise_for_status()
+            with open(results_path, 'wb') as f:
+                for block in response.iter_content(chunk_size=chunk_bytes):
+                    f.write(block)
+    except requests.RequestException as e:
+        logging.error(f"Looker could not be queried.\n"
+                      f"Looker error:---\n{getattr(e.response, 'text', None) or e}\n---"
+        )
+        sys.exit(1)
+
+    return list(lkr_query.fields)
+
+
+def query_looker(explore, metrics, group_by=None, order_by=None, dev_branch=None, filters=None):
+    """
+    Queries Looker for the specified metrics, group by and order by fields.
+
+    Parameters:
+    explore (str): The Looker explore name.
+    metrics (list): A list of metric names.
+    group_by (list): A list of dimensions to group by (optional).
+    order_by (list): A list of fields to order by (optional).
+    dev_branch (str): The development git branch to use when querying Looker (optional).
+    filters (dict): A dictionary of Looker filters (optional). For example, {'orders.revenue': '>100', 'customers.region': 'US'}.
+
+    Returns:
+    pandas.DataFrame: The query results.
+    """
+
+    sdk, looker_model, valid_fields = connect_looker(explore, dev_branch=dev_branch)
+    return run_looker_query(sdk, looker_model, valid_fields, explore, metrics, group_by=group_by, order_by=order_by,
+                            filters=filters, dev_branch=dev_branch)
+
+
+def query_metricflow(metrics, group_by=None, order_by=None, where=None, results_path=MF_RESULTS_PATH):
     """
-    Queries MetricFlow for the specified metrics, group by and order by fields. Creates temporarily file `mf_compare_query_results.csv` to store the query results.
+    Queries MetricFlow for the specified metrics, group by and order by fields. Creates temporarily file `results_path` to store the query results.
 
     Parameters:
     metrics (list): A list of metric names.
     group_by (list): A list of dimensions to group by (optional).
     order_by (list): A list of fields to order by (optional).
     where (str): A SQL-like where statement provided as a string and wrapped in quotes (optional).
+    results_path (str): The file MetricFlow writes the results to (optional). Concurrent queries need separate files.
 
     Returns:
     pandas.DataFrame: The query results.
     """
 
+    from tabulate import tabulate
+
+    cache = RESULT_CACHE
+    if cache:
+        cache_key = cache.metricflow_key(metrics, group_by, order_by, where)
+        cached_results = cache.read(cache_key, 'metricflow')
+        if cached_results is not None:
+            return cached_results
+
+    result_format = run_metricflow_query(metrics, group_by=group_by, order_by=order_by, where=where,
+                                         results_path=results_path)
+
+    # Load the results into a DataFrame with column_1, column_2, etc column headers, typed from the semantic manifest
+    kinds = result_types.query_column_kinds(metrics, group_by, semantic_index())
+    try:
+        query_results_df = result_types.read_metricflow_results(results_path, result_format, kinds=kinds,
+                                                                expected_columns=(group_by or []) + metrics)
+    except FileNotFoundError as e:
+        logging.error(f"MetricFlow query returned no results.")
+        sys.exit(1)
+    query_results_df = result_types.apply_column_kinds(query_results_df, kinds)
+
+    logging.debug("MetricFlow query results: -")
+    logging.debug(tabulate(query_results_df, headers='keys', tablefmt='pretty'))
+
+    if cache:
+        cache.write(cache_key, 'metricflow', query_results_df)
+
+    return query_results_df
+
+
+def _metricflow_command(metrics, group_by=None, order_by=None, where=None):
+    """
+    Helper returning the `mf query` command of a query, after logging it.
+    """
+
     # Define the dbt command
     metrics_list = ','.join(metrics)
     mf_command = [
@@ -282,87 +563,122 @@ def query_metricflow(metrics, group_by=None, order_by=None, where=None):
         query_description += f", where: {where}"
 
     logging.info(query_description)
+    return mf_command
 
-    mf_command += ["--csv", "logs/mf_compare_query_results.csv"]
-    logging.debug(f"Running command: {mf_command}")
 
-    # Delete the results file if it already exists
-    if os.path.exists('logs/mf_compare_query_results.csv'):
-        os.remove('logs/mf_compare_query_results.csv')
+def parse_explain_output(output):
+    """
+    Returns the SQL printed by `mf query --explain`, without the CLI's messages, colours or a trailing semicolon.
+    """
+
+    output = re.sub(r'\x1b\[[0-9;]*m', '', output)
+    lines = output.splitlines()
+
+    # The SQL follows a "🔎 SQL (remove --explain to see data ...):" line, or else starts at the first statement
+    start = next((position + 1 for position, line in enumerate(lines) if 'SQL (remove --explain' in line), None)
+    if start is None:
+        start = next((position for position, line in enumerate(lines) if re.match(r'\s*(SELECT|WITH)\b', line, re.IGNORECASE)), len(lines))
+
+    return '\n'.join(lines[start:]).strip().rstrip(';').strip()
+
+
+def metricflow_query_sql(metrics, group_by=None, order_by=None, where=None):
+    """
+    Returns the SQL MetricFlow compiles a query to, with `mf query --explain`, without running it.
+
+    Parameters:
+    Those of query_metricflow().
+
+    Returns:
+    str: The query's SQL.
+    """
+
+    mf_command = _metricflow_command(metrics, group_by, order_by, where) + ["--explain"]
+    logging.debug(f"Running command: {mf_command}")
 
     result = subprocess.run(mf_command, capture_output=True, text=True)
-    if result.returncode != 0:
-        logging.error(f"MetricFlow could not be queried.\n"
+    sql = parse_explain_output(result.stdout) if result.returncode == 0 else ''
+    if not sql:
+        logging.error(f"MetricFlow could not compile the query.\n"
                       f"MetricFlow log:---\n{result.stdout.strip()}\n---"
         )
         sys.exit(1)
 
-    # Load the CSV file into a DataFrame
-    try:
-        query_results_df = pd.read_csv(f'logs/mf_compare_query_results.csv', header=None)
-    except FileNotFoundError as e:
-        logging.error(f"MetricFlow query returned no results.")
-        sys.exit(1)
-
-    # Add column_1, column_2, etc column headers
-    num_columns = query_results_df.shape[1]
-    query_results_df.columns = [f'column_{i+1}' for i in range(num_columns)]
-
-    logging.debug("MetricFlow query results: -")
-    logging.debug(tabulate(query_results_df, headers='keys', tablefmt='pretty'))
-
-    return query_results_df
+    return sql
 
 
-def do_query_results_match(metricflow_results, looker_results):
+def run_metricflow_query(metrics, group_by=None, order_by=None, where=None, results_path=MF_RESULTS_PATH,
+                         result_format=None):
     """
-    Compares two DataFrames by comparing all rows and prints the comparison results.
+    Runs a MetricFlow query, on a worker if set (see set_metricflow_workers()) or else with `mf query`, writing the
+    results to `results_path`.
 
     Parameters:
-    metricflow_results (pandas.DataFrame): The first DataFrame to compare.
-    looker_results (pandas.DataFrame): The second DataFrame. Columns order and names should match the first DataFrame.
+    result_format (str): Optional, the format workers write results in. Defaults to result_types.result_format().
+    Remaining parameters are those of query_metricflow().
 
     Returns:
-    bool: True if the DataFrames match, False otherwise.
+    str: The format of the results file, `result_format` or 'csv' if they were written by `mf query`.
     """
 
-    # Fill NaN values with a consistent placeholder
-    metricflow_results_filled = metricflow_results.fillna('<<NULL>>')
-    looker_results_filled = looker_results.fillna('<<NULL>>')
+    mf_command = _metricflow_command(metrics, group_by, order_by, where) + ["--csv", results_path]
+    logging.debug(f"Running command: {mf_command}")
+
+    # Delete the results file if it already exists
+    if os.path.exists(results_path):
+        os.remove(results_path)
+
+    workers = METRICFLOW_WORKERS
+    result_format = result_format or result_types.result_format()
+    written_format = None
+    if workers and workers.available:
+        try:
+            workers.query(metrics, group_by=group_by, order_by=order_by, where=where, results_path=results_path,
+                          result_format=result_format)
+            written_format = result_format
+        except MetricFlowWorkerUnavailable as e:
+            logging.warning(f"{e} Running `mf query` for each query instead.")
+        except MetricFlowWorkerError as e:
+            logging.error(f"MetricFlow could not be queried.\n"
+                          f"MetricFlow log:---\n{e}\n---"
+            )
+            sys.exit(1)
+
+    if written_format is None:
+        result = subprocess.run(mf_command, capture_output=True, text=True)
+        if result.returncode != 0:
+            logging.error(f"MetricFlow could not be queried.\n"
+                          f"MetricFlow log:---\n{result.stdout.strip()}\n---"
+            )
+            sys.exit(1)
+        written_format = 'csv'
 
-    # Convert DataFrames to sets of tuples representing each row
-    metricflow_set = set(map(tuple, metricflow_results_filled.to_numpy()))
-    looker_set = set(map(tuple, looker_results_filled.to_numpy()))
+    return written_format
 
-    # Find matching rows and rows unique to each DataFrame
-    matching_rows = metricflow_set & looker_set
-    metricflow_only = metricflow_set - looker_set
-    looker_only = looker_set - metricflow_set
 
-    # Log the counts
-    num_matching_rows = len(matching_rows)
-    num_metricflow_only_rows = len(metricflow_only)
-    num_looker_only_rows = len(looker_only)
+def do_query_results_match(metricflow_results, looker_results, key_count=None, tolerances=None, top_n=DEFAULT_TOP_N):
+    """
+    Compares two DataFrames row by row, joining them on their group by columns, and logs the comparison results. See
+    diff.diff_results().
 
-    logging.info(f"Number of matching rows: {num_matching_rows}")
-    logging.info(f"Number of rows only in MetricFlow: {num_metricflow_only_rows}")
-    logging.info(f"Number of rows only in Looker: {num_looker_only_rows}")
+    Parameters:
+    metricflow_results (pandas.DataFrame): The first DataFrame to compare.
+    looker_results (pandas.DataFrame): The second DataFrame. Columns order should match the first DataFrame.
+    key_count (int): The number of leading group by columns (optional). Defaults to the leading non-numeric columns.
+    tolerances (dict): The (absolute, relative) tolerance of each metric column (optional). Defaults to diff.DEFAULT_TOLERANCE.
+    top_n (int): The number of largest deviations logged (optional).
 
-    # Determine if the DataFrames match perfectly
-    if num_metricflow_only_rows == 0 and num_looker_only_rows == 0:
-        logging.info("PASS: query results match perfectly.")
-        return True
-    else:
-        logging.warning("WARNING: query results do not match exactly.")
+    Returns:
+    bool: True if the DataFrames match, False otherwise.
+    """
 
-        if num_metricflow_only_rows > 0:
-            logging.info("Rows only in MetricFlow:")
-            for row in metricflow_only:
-                logging.info(row)
+    import pandas as pd
 
-        if num_looker_only_rows > 0:
-            logging.info("Rows only in Looker:")
-            for row in looker_only:
-                logging.info(row)
+    if key_count is None:
+        key_count = 0
+        while key_count < looker_results.shape[1] and not pd.api.types.is_numeric_dtype(looker_results.iloc[:, key_count]):
+            key_count += 1
 
-        return False
\ No newline at end of file
+    diff = diff_results(metricflow_results, looker_results, key_count, tolerances=tolerances, top_n=top_n)
+    log_diff(diff)
+    return diff['passed']
@@ -1,16 +1,21 @@
 import argparse
 import sys
-import subprocess
+import os
+import time
+import multiprocessing
+import gc
 import json
-import lkml
 import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s  %(message)s',
-    datefmt='%H:%M:%S'
-)
 
-from . import to_looker
+import functools
+
+from . import to_looker, to_cube, to_ldsh
+from .dbt_project import parse_dbt_project, project_snapshot
+from .manifest_loader import peak_memory_mb
+from .manifest_cache import load_manifests
+from .incremental import plan_incremental_translation, save_state, output_files
+from .sql_expression import EXPRESSION_CACHE
+from .translator import Translator, TARGETS
 
 def load_json_file(file_path):
     try:
@@ -24,41 +29,304 @@ def load_json_file(file_path):
         sys.exit(1)
 
 
-def main():
+def parse_csv_str(value):
+    return value.split(',')
 
-    parser = argparse.ArgumentParser(description='Converts MetricFlow model definitions to other semantic layer dialects. Currently, only Looker LookML is supported.')
-    parser.add_argument('--model', type=str, required=True, help='Name of the MetricFlow semantic model to be translated.', metavar='STRING')
-    parser.add_argument('--to-looker-view', type=str, required=True, help='Name of the Looker view to be created.', metavar='STRING')
 
-    args = parser.parse_args()
+def set_manifests(semantic_manifest, dbt_manifest, semantic_index=None, targets=('looker',)):
+    """
+    Sets the manifests of the translator of each target. The translators share one SemanticIndex, so the manifests are
+    indexed once and each expression is parsed once for all targets (see sql_expression.translate_sql_expression()).
+    """
 
-    logging.info("Parsing dbt project...")
-    result = subprocess.run(['dbt', 'parse', '--no-partial-parse'], capture_output=True, text=True)
-    if result.returncode != 0:
-        logging.error(f"Project could not be parsed.\n"
-                      f"dbt log:---\n{result.stdout.strip()}\n---"
-        )
-        sys.exit(1)
-    logging.info("...finished parsing project.")
+    for target in targets:
+        translator = TARGETS[target][0]
+        translator.set_manifests(metricflow_semantic_manifest=semantic_manifest,
+                                 dbt_manifest=dbt_manifest,
+                                 semantic_index=semantic_index)
+        semantic_index = translator.semantic_index()
+
+
+def translate_model(model_name, targets=('looker',)):
+    """
+    Translates a MetricFlow semantic model to the text of a file per target: a LookML view, a Cube YAML cube and/or a Lightdash dbt YAML model, each named after the model. Manifests must already have been set with set_manifests().
+
+    Parameters:
+    model_name (str): The name of the MetricFlow semantic model to be translated.
+    targets (tuple): Optional, the target dialects, see TARGETS.
+
+    Returns:
+    tuple: (model_name, {target: file text} or None, error message or None, seconds taken).
+    """
+
+    start = time.perf_counter()
+    try:
+        model = TARGETS[targets[0]][0].semantic_index().models[model_name]
+        texts = {target: TARGETS[target][2](model) for target in targets}
+        return model_name, texts, None, time.perf_counter() - start
+    except (Exception, SystemExit) as e:
+        return model_name, None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+def translate_models_to_files(models, out_dir, jobs=1, targets=('looker',)):
+    """
+    Translates each MetricFlow semantic model to a file per target, logging the time taken per model. With a single target the files are written to `out_dir/<model><suffix>`, e.g. `out_dir/orders.view.lkml`; with several to `out_dir/<target>/<model><suffix>`. A model which fails to translate is logged and skipped so the remaining models are still written.
+
+    With `jobs` > 1 models are translated in a pool of forked worker processes. Workers inherit the manifests and index set by set_manifests() copy-on-write, so only model names and file text cross the process boundary. Files are written by the parent in model order, so the output is identical to a serial run.
+
+    Parameters:
+    models (list): The MetricFlow semantic models to be translated.
+    out_dir (str): The directory the files are written to.
+    jobs (int): Optional, the number of worker processes to translate models with.
+    targets (tuple): Optional, the target dialects, see TARGETS.
+
+    Returns:
+    list: The names of the models which failed to translate.
+    """
+
+    target_dirs = {target: out_dir if len(targets) == 1 else os.path.join(out_dir, target) for target in targets}
+    for target_dir in target_dirs.values():
+        os.makedirs(target_dir, exist_ok=True)
+    model_names = [model['name'] for model in models]
+    translate_function = functools.partial(translate_model, targets=tuple(targets))
+
+    if jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logging.warning("Parallel translation requires the `fork` start method which is not available on this platform, translating serially.")
+        jobs = 1
 
-    manifest = load_json_file('target/manifest.json')
-    semantic_manifest = load_json_file('target/semantic_manifest.json')
+    if jobs > 1:
+        for target in targets:
+            TARGETS[target][0].semantic_index() # Build the index before forking so each worker shares it rather than rebuilding it
+        gc.freeze()                             # Keep the garbage collector from touching (and so copying) the inherited manifest pages
+        try:
+            with multiprocessing.get_context('fork').Pool(processes=min(jobs, len(model_names) or 1)) as pool:
+                results = pool.imap(translate_function, model_names, chunksize=max(1, len(model_names) // (jobs * 4)))
+                failed_models = _write_results(results, target_dirs)
+        finally:
+            gc.unfreeze()
+    else:
+        failed_models = _write_results(map(translate_function, model_names), target_dirs)
+
+    return failed_models
+
+
+def _write_results(results, target_dirs):
+    """
+    Helper writing the results of translate_model() to the directory of each target.
+
+    Returns:
+    list: The names of the models which failed to translate.
+    """
+
+    failed_models = []
+
+    for model_name, texts, error, elapsed in results:
+
+        if error:
+            logging.error(f"Failed to translate {model_name} semantic model: {error}")
+            failed_models.append(model_name)
+            continue
+
+        paths = []
+        for target, text in texts.items():
+            paths.append(os.path.join(target_dirs[target], f"{model_name}{TARGETS[target][1]}"))
+            with open(paths[-1], 'w') as f:
+                f.write(text)
+        logging.info(f"Translated {model_name} semantic model to {', '.join(paths)} in {elapsed:.2f}s.")
+
+    return failed_models
+
+
+def translate(args, parse_args=('--no-partial-parse',), loaded=None):
+    """
+    Parses the dbt project if it has changed, loads the manifests and translates the models selected by the command line arguments.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    parse_args (tuple): Optional, additional arguments passed to `dbt parse`.
+    loaded (dict): Optional, the manifests kept in memory between translations, see manifest_cache.load_manifests().
+
+    Returns:
+    list: The names of the models which failed to translate.
+    """
+
+    parse_dbt_project(parse_args=parse_args, manifest_dir=args.manifest_dir, force_parse=args.force_parse)
+
+    semantic_manifest_path = os.path.join(args.manifest_dir, 'semantic_manifest.json')
+    load_stats = {}
+    semantic_manifest, manifest, semantic_index = load_manifests(args.manifest_dir, stats=load_stats, loaded=loaded)
+    if args.stats:
+        if load_stats['cache_hit']:
+            logging.info(f"Loaded manifests from the cache in {args.manifest_dir}/ in {load_stats['seconds']:.2f}s.")
+        elif 'manifest.json' not in load_stats['reloaded']:
+            logging.info(f"Reloaded {args.manifest_dir}/semantic_manifest.json in {load_stats['seconds']:.2f}s.")
+        else:
+            logging.info(f"Loaded {load_stats['nodes_kept']} of {load_stats['nodes_kept'] + load_stats['nodes_skipped']} dbt nodes "
+                         f"({load_stats['bytes_read'] / (1024 * 1024):.1f} MB read), manifests loaded and cached in {load_stats['seconds']:.2f}s.")
 
     model_dict = {model['name']: model for model in semantic_manifest['semantic_models']}
 
-    if args.to_looker_view:
+    set_manifests(semantic_manifest, manifest, semantic_index=semantic_index, targets=args.to)
+
+    failed_models = []
+
+    if args.model:
 
         semantic_model = model_dict.get(args.model)
         if not semantic_model:
-            logging.error(f"Model `{args.model}` not found in target/semantic_manifest.json.")
+            logging.error(f"Model `{args.model}` not found in {semantic_manifest_path}.")
             sys.exit(1)
 
-        to_looker.set_manifests(metricflow_semantic_manifest=semantic_manifest,
-                                dbt_manifest=manifest)
         lkml_view = to_looker.model_to_lkml_view(model=model_dict[args.model], view_name=args.to_looker_view)
+        import lkml # Imported on first use to keep start-up fast
         print(lkml.dump({'views': [lkml_view]}))
 
         logging.info(f"Translated {args.model} semantic model to LookML view {args.to_looker_view}.")
 
+    else:
+
+        if args.all_models:
+            models = list(model_dict.values())
+        else:
+            unknown_models = [name for name in args.models if name not in model_dict]
+            if unknown_models:
+                logging.error(f"Models `{', '.join(unknown_models)}` not found in {semantic_manifest_path}.")
+                sys.exit(1)
+            models = [model_dict[name] for name in args.models]
+
+        start = time.perf_counter()
+
+        if args.incremental:
+            models, reused_models, state = plan_incremental_translation(models, TARGETS[args.to[0]][0].semantic_index(),
+                                                                        args.out_dir, targets=args.to)
+            for model_name in reused_models:
+                logging.info(f"Reused {', '.join(output_files(model_name, args.to))} - no inputs changed.")
+
+        failed_models = translate_models_to_files(models, args.out_dir, jobs=args.jobs, targets=args.to)
+        logging.info(f"Translated {len(models) - len(failed_models)} of {len(models)} semantic models to {args.out_dir} in {time.perf_counter() - start:.2f}s.")
+
+        if args.incremental:
+            for model_name in failed_models:
+                for file_name in output_files(model_name, args.to):
+                    state.pop(file_name, None) # Retry failed models on the next run
+            save_state(state, args.out_dir)
+            logging.info(f"Rebuilt {len(models) - len(failed_models)} models, reused {len(reused_models)} models.")
+
+        cache_info = EXPRESSION_CACHE.info()
+        if args.stats and cache_info['hits'] + cache_info['misses']: # Counters are per process, so empty when translated by --jobs workers
+            logging.info(f"Expression cache: {cache_info['hits']} hits, {cache_info['misses']} misses, {cache_info['size']} of {cache_info['maxsize']} entries used.")
+
+    return failed_models
+
+
+def watch(args, poll_interval=0.5, settle_time=0.2):
+    """
+    Translates the selected models, then polls the dbt project for changes and on each change partially re-parses the project and rebuilds only the affected views (see incremental.py). The manifests are kept in memory between changes and only the manifest files dbt rewrote with new contents are reloaded. Parse and translation errors are logged and watching continues. Runs until interrupted.
+
+    Parameters:
+    args (argparse.Namespace): The parsed command line arguments.
+    poll_interval (float): Optional, seconds between checks for changed files.
+    settle_time (float): Optional, seconds to wait after a change for an editor to finish writing files.
+    """
+
+    snapshot = None
+    loaded = {}
+
+    while True:
+
+        current_snapshot = project_snapshot(manifest_dir=args.manifest_dir)
+
+        if current_snapshot != snapshot:
+            if snapshot is not None:
+                time.sleep(settle_time)
+                current_snapshot = project_snapshot(manifest_dir=args.manifest_dir)
+                changed_files = sorted(path for path in set(snapshot) | set(current_snapshot)
+                                       if snapshot.get(path) != current_snapshot.get(path))
+                logging.info(f"Detected changes to {', '.join(changed_files)}.")
+            snapshot = current_snapshot
+
+            start = time.perf_counter()
+            try:
+                translate(args, parse_args=(), loaded=loaded)
+                logging.info(f"Views up to date in {time.perf_counter() - start:.2f}s. Watching for changes, press Ctrl+C to stop...")
+            except SystemExit:
+                logging.warning("Translation failed. Watching for changes, press Ctrl+C to stop...")
+            except Exception as e:
+                logging.error(f"Translation failed: {e}")
+                logging.warning("Watching for changes, press Ctrl+C to stop...")
+
+        time.sleep(poll_interval)
+
+
+def configure_logging():
+    """
+    Configures logging for the command line. Not done at import time so that importing mf_translate as a library leaves the caller's logging untouched.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s  %(message)s',
+        datefmt='%H:%M:%S'
+    )
+
+
+def main():
+
+    configure_logging()
+
+    if sys.argv[1:2] == ['serve']:
+        from .server import serve_main # Only needed by the server
+        return serve_main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(epilog='Run `mf-translate serve --help` for the long-lived translation server.', description='Converts MetricFlow model definitions to other semantic layer dialects: Looker LookML, Cube and Lightdash.')
+    models_group = parser.add_mutually_exclusive_group(required=True)
+    models_group.add_argument('--model', type=str, help='Name of the MetricFlow semantic model to be translated.', metavar='STRING')
+    models_group.add_argument('--models', type=parse_csv_str, help='Comma-separated list of MetricFlow semantic models to be translated, e.g. --models orders,customers. Requires --out-dir.', metavar='SEQUENCE')
+    models_group.add_argument('--all-models', action='store_true', help='Translate every MetricFlow semantic model in the project. Requires --out-dir.')
+    parser.add_argument('--to', type=parse_csv_str, required=False, default=['looker'], help='Comma-separated list of dialects to translate to with --models/--all-models: looker, cube and/or lightdash. The manifests are loaded and each expression is parsed once for all of them. Defaults to looker.', metavar='SEQUENCE')
+    parser.add_argument('--to-looker-view', type=str, required=False, help='Name of the Looker view to be created. Required with --model.', metavar='STRING')
+    parser.add_argument('--out-dir', type=str, required=False, help='Directory to write one file per translated model and --to dialect to, e.g. <model>.view.lkml.', metavar='DIR')
+    parser.add_argument('--incremental', action='store_true', help='With --models/--all-models, only rebuild the files (for every --to dialect) of models whose semantic models, metrics, measures, dbt nodes or referenced models have changed since the previous run into --out-dir.')
+    parser.add_argument('--watch', action='store_true', help='With --models/--all-models, keep running and regenerate the affected files of every --to dialect in --out-dir whenever the dbt project changes. Implies --incremental.')
+    parser.add_argument('--jobs', type=int, required=False, default=1, help='Number of worker processes used to translate models with --models/--all-models. Defaults to 1.', metavar='N')
+    parser.add_argument('--force-parse', action='store_true', help='Run `dbt parse` even if the project has not changed since the manifests were generated.')
+    parser.add_argument('--stats', action='store_true', help='Log manifest loading statistics and the peak memory used.')
+    parser.add_argument('--manifest-dir', type=str, required=False, default='target', help='Directory dbt writes manifest.json and semantic_manifest.json to. Defaults to target.', metavar='DIR')
+
+    args = parser.parse_args()
+
+    if args.model and not args.to_looker_view:
+        parser.error("--to-looker-view is required when translating a single --model.")
+    if (args.models or args.all_models) and not args.out_dir:
+        parser.error("--out-dir is required with --models and --all-models.")
+    if args.incremental and (args.model or not args.out_dir):
+        parser.error("--incremental requires --models or --all-models and --out-dir.")
+    if args.watch and (args.model or not args.out_dir):
+        parser.error("--watch requires --models or --all-models and --out-dir.")
+    args.incremental = args.incremental or args.watch
+    args.to = list(dict.fromkeys(args.to))
+    unknown_targets = [target for target in args.to if target not in TARGETS]
+    if unknown_targets:
+        parser.error(f"Unsupported --to dialects: {', '.join(unknown_targets)}. Supported dialects are {', '.join(TARGETS)}.")
+    if args.to != ['looker'] and args.model:
+        parser.error("--to requires --models or --all-models.")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
+    if args.watch:
+        try:
+            watch(args)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
+        return
+
+    failed_models = translate(args)
+
+    if args.stats and peak_memory_mb() is not None:
+        logging.info(f"Peak memory (RSS): {peak_memory_mb():.1f} MB.")
+
+    if failed_models:
+        logging.error(f"Failed to translate: {', '.join(failed_models)}")
+        sys.exit(1)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
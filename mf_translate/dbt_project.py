@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import hashlib
+import subprocess
+import logging
+
+FINGERPRINT_FILE = 'mf_translate_fingerprint.json'
+PROJECT_FILE_EXTENSIONS = ('.sql', '.yml', '.yaml', '.md', '.py')
+IGNORED_DIRS = {'logs', '__pycache__', 'node_modules'}
+PROFILE_ENV_VARS = ['DBT_PROFILES_DIR', 'DBT_TARGET', 'DBT_PROFILE', 'DBT_TARGET_PATH']
+PROJECT_CONFIG_FILES = ['dbt_project.yml', 'packages.yml', 'dependencies.yml']
+# dbt_project.yml keys of the directories `dbt parse` reads, and dbt's defaults
+PROJECT_PATH_DEFAULTS = {
+    'model-paths': ['models'],
+    'macro-paths': ['macros'],
+    'seed-paths': ['seeds'],
+    'snapshot-paths': ['snapshots'],
+    'test-paths': ['tests'],
+    'analysis-paths': ['analyses'],
+    'packages-install-path': 'dbt_packages',
+}
+
+
+def profiles_path(project_dir='.'):
+    """
+    Helper returning the path of the profiles.yml dbt would use, following dbt's lookup order: DBT_PROFILES_DIR, the project directory, then ~/.dbt.
+    """
+
+    candidates = [os.getenv('DBT_PROFILES_DIR'), project_dir, os.path.expanduser('~/.dbt')]
+    for directory in candidates:
+        if directory and os.path.isfile(os.path.join(directory, 'profiles.yml')):
+            return os.path.join(directory, 'profiles.yml')
+    return None
+
+
+def project_config(project_dir='.'):
+    """
+    Helper returning the contents of the project's dbt_project.yml, or {} if it is missing or cannot be read.
+    """
+
+    from ruamel.yaml import YAML, YAMLError # Imported on first use to keep start-up fast
+
+    try:
+        with open(os.path.join(project_dir, 'dbt_project.yml')) as f:
+            config = YAML(typ='safe').load(f)
+    except (OSError, YAMLError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def target_path(project_dir='.'):
+    """
+    Returns the directory dbt writes its manifests to, and MetricFlow reads them from, when no --target-path is given:
+    DBT_TARGET_PATH, the project's target-path, then target.
+    """
+    return os.getenv('DBT_TARGET_PATH') or project_config(project_dir).get('target-path') or 'target'
+
+
+def project_input_dirs(project_dir='.'):
+    """
+    Returns the directories `dbt parse` reads files from, as configured in dbt_project.yml (or dbt's defaults): the
+    model, macro, seed, snapshot, test and analysis paths, and the directory packages are installed to.
+    """
+
+    config = project_config(project_dir)
+
+    dirs = []
+    for key, default in PROJECT_PATH_DEFAULTS.items():
+        paths = config.get(key, default)
+        for path in [paths] if isinstance(paths, str) else paths or []:
+            dirs.append(os.path.join(project_dir, str(path)))
+    return dirs
+
+
+def project_files(project_dir='.', manifest_dir='target'):
+    """
+    Returns the sorted paths of the files `dbt parse` reads: the .sql/.yml/.md/.py files of the project's input
+    directories (see project_input_dirs(), excluding the manifest directory, logs and hidden directories), the project
+    configuration files and the profiles.yml. Other directories of the project, e.g. virtual environments or a stale
+    target directory, are not read.
+    """
+
+    excluded_dirs = {os.path.abspath(manifest_dir)}
+
+    file_paths = set()
+    for input_dir in project_input_dirs(project_dir):
+        if os.path.abspath(input_dir) in excluded_dirs:
+            continue
+        for dir_path, dir_names, file_names in os.walk(input_dir):
+            dir_names[:] = [d for d in dir_names
+                            if not d.startswith('.') and d not in IGNORED_DIRS
+                            and os.path.abspath(os.path.join(dir_path, d)) not in excluded_dirs]
+            file_paths.update(os.path.join(dir_path, f) for f in file_names if f.endswith(PROJECT_FILE_EXTENSIONS))
+
+    file_paths.update(os.path.join(project_dir, f) for f in PROJECT_CONFIG_FILES
+                      if os.path.isfile(os.path.join(project_dir, f)))
+
+    profile = profiles_path(project_dir)
+    if profile:
+        file_paths.add(profile)
+
+    return sorted(file_paths)
+
+
+def project_snapshot(project_dir='.', manifest_dir='target'):
+    """
+    Returns {path: (mtime_ns, size)} for the files returned by project_files(). Cheaper than project_fingerprint() as no files are read, so suited to polling for changes.
+    """
+
+    snapshot = {}
+    for file_path in project_files(project_dir, manifest_dir):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError: # Deleted between listing and stat
+            continue
+        snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def project_fingerprint(project_dir='.', manifest_dir='target'):
+    """
+    Computes a fingerprint of the inputs to `dbt parse`: the model, macro and config files of the project (including dbt_project.yml, packages.yml and installed packages), the profiles.yml and the environment variables selecting the profile target.
+
+    Parameters:
+    project_dir (str): The dbt project directory.
+    manifest_dir (str): The directory dbt writes its manifests to. Excluded from the fingerprint.
+
+    Returns:
+    str: A hex digest which changes whenever any of the inputs change.
+    """
+
+    digest = hashlib.sha256()
+
+    for file_path in project_files(project_dir, manifest_dir):
+        digest.update(os.path.relpath(file_path, project_dir).encode())
+        with open(file_path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    for env_var in PROFILE_ENV_VARS:
+        digest.update(f"{env_var}={os.getenv(env_var, '')}".encode())
+
+    return digest.hexdigest()
+
+
+def read_fingerprint(manifest_dir='target'):
+    """
+    Returns the fingerprint stored alongside the manifests by the last successful parse, or None.
+    """
+
+    try:
+        with open(os.path.join(manifest_dir, FINGERPRINT_FILE)) as f:
+            return json.load(f).get('fingerprint')
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_fingerprint(fingerprint, manifest_dir='target'):
+    """
+    Stores a project fingerprint alongside the manifests.
+    """
+
+    with open(os.path.join(manifest_dir, FINGERPRINT_FILE), 'w') as f:
+        json.dump({'fingerprint': fingerprint}, f)
+
+
+def parse_dbt_project(parse_args=(), manifest_dir='target', force_parse=False):
+    """
+    Runs `dbt parse` unless the project fingerprint matches the one stored with the existing manifests in `manifest_dir`, in which case the manifests are reused. Exits if the project could not be parsed.
+
+    Parameters:
+    parse_args (tuple): Optional, additional arguments passed to `dbt parse`, e.g. ('--no-partial-parse',).
+    manifest_dir (str): Optional, the directory the manifests are read from and written to (dbt's --target-path).
+    force_parse (bool): Optional, parse even if the project has not changed.
+
+    Returns:
+    bool: True if dbt parse was run, False if it was skipped.
+    """
+
+    fingerprint = project_fingerprint(manifest_dir=manifest_dir)
+    manifests_exist = all(os.path.isfile(os.path.join(manifest_dir, f)) for f in ['manifest.json', 'semantic_manifest.json'])
+
+    if not force_parse and manifests_exist and read_fingerprint(manifest_dir) == fingerprint:
+        logging.info(f"Skipped parsing dbt project - no changes since the manifests in {manifest_dir}/ were generated.")
+        return False
+
+    logging.info("Parsing dbt project...")
+    result = subprocess.run(['dbt', 'parse', *parse_args, '--target-path', manifest_dir], capture_output=True, text=True)
+    if result.returncode != 0:
+        logging.error(f"Project could not be parsed.\n"
+                      f"dbt log:---\n{result.stdout.strip()}\n---"
+        )
+        sys.exit(1)
+    logging.info("...finished parsing project.")
+
+    write_fingerprint(fingerprint, manifest_dir)
+    return True
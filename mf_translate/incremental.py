@@ -0,0 +1,156 @@
+import os
+import json
+import hashlib
+import logging
+import functools
+
+from .sql_expression import dimension_refs, model_for_dimension_ref
+from .translator import TARGETS
+
+STATE_FILE = '.mf_translate_state.json'
+TRANSLATOR_FILES = ['to_looker.py', 'to_cube.py', 'to_ldsh.py', 'translator.py', 'semantic_index.py', 'sql_expression.py'] # Changes to the translator itself invalidate every view
+ENV_VARS = ['MF_TRANSLATE_TARGET_WAREHOUSE_TYPE', 'MF_TRANSLATE_CUBE_TIMEZONE_FOR_TIME_DIMENSIONS']
+
+
+def _fingerprint(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def _translator_fingerprint():
+    digest = hashlib.sha256()
+    for file_name in TRANSLATOR_FILES:
+        with open(os.path.join(os.path.dirname(__file__), file_name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _where_sql_templates(obj):
+    return [where_filter["where_sql_template"] for where_filter in ((obj or {}).get("filter") or {}).get("where_filters", [])]
+
+
+def view_inputs(model, index):
+    """
+    Returns fingerprints of every definition the LookML view for `model` is translated from: the semantic model, the
+    metrics it owns (and the numerator/denominator metrics of its ratios), their measures, the backing dbt node, and
+    the model each `{{ Dimension('entity__dimension') }}` reference resolves to along with that model's definition.
+    The latter means a view is rebuilt when a model its metric filters reference changes.
+
+    Parameters:
+    model (dict): The MetricFlow semantic model.
+    index (SemanticIndex): The index over the current manifests.
+
+    Returns:
+    dict: {input key: fingerprint}, e.g. {'semantic_model:orders': '3f2a...', 'metric:revenue': '9b1c...'}
+    """
+
+    inputs = {'translator': _translator_fingerprint(),
+              'env': _fingerprint({env_var: os.getenv(env_var) for env_var in ENV_VARS}),
+              f"semantic_model:{model['name']}": _fingerprint(model)}
+
+    node = index.nodes_by_relation.get(model['node_relation']['relation_name'])
+    inputs[f"dbt_node:{model['node_relation']['relation_name']}"] = _fingerprint(node)
+
+    expressions = [item.get("expr") or '' for item in model.get("entities", []) + model.get("dimensions", [])]
+
+    metrics = list(index.metrics_for_model(model['name']))
+    for metric in index.metrics_for_model(model['name']):
+        if metric["type"] == "ratio":
+            for param in [metric["type_params"]["numerator"], metric["type_params"]["denominator"]]:
+                expressions += _where_sql_templates(param)
+                if param["name"] in index.metrics:
+                    metrics.append(index.metrics[param["name"]])
+
+    for metric in metrics:
+        inputs[f"metric:{metric['name']}"] = _fingerprint(metric)
+        expressions += _where_sql_templates(metric)
+
+        measure_name = ((metric.get("type_params") or {}).get("measure") or {}).get("name")
+        if measure_name:
+            measure = index.measures.get(measure_name)
+            inputs[f"measure:{measure_name}"] = _fingerprint(measure)
+            if measure:
+                expressions.append(measure.get("expr") or '')
+
+    for expression in expressions:
+        for dim_ref in dimension_refs(expression):
+            try:
+                referenced_model, _ = model_for_dimension_ref(dim_ref, index)
+            except ValueError:
+                referenced_model = None
+            inputs[f"dimension_ref:{dim_ref}"] = referenced_model['name'] if referenced_model else None
+            if referenced_model:
+                inputs[f"semantic_model:{referenced_model['name']}"] = _fingerprint(referenced_model)
+
+    return inputs
+
+
+def load_state(out_dir):
+    """
+    Returns the {output file: inputs} state stored in `out_dir` by the previous incremental run, or {}.
+    """
+
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state, out_dir):
+    """
+    Stores the {output file: inputs} state in `out_dir`.
+    """
+
+    with open(os.path.join(out_dir, STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def output_files(model_name, targets=('looker',)):
+    """
+    Returns the paths, relative to the output directory, of the files translate_models_to_files() writes for a model:
+    `<model><suffix>` for a single target, e.g. 'orders.view.lkml', or `<target>/<model><suffix>` for several.
+    """
+
+    if len(targets) == 1:
+        return [f"{model_name}{TARGETS[targets[0]][1]}"]
+    return [os.path.join(target, f"{model_name}{TARGETS[target][1]}") for target in targets]
+
+
+def plan_incremental_translation(models, index, out_dir, targets=('looker',)):
+    """
+    Splits `models` into those whose files must be rebuilt and those whose existing files in `out_dir` can be reused
+    because none of their inputs (see view_inputs()) have changed since the previous run. The state records the inputs
+    of each output file, so a model is only reused if the files of every target were written from the same inputs.
+
+    Parameters:
+    models (list): The MetricFlow semantic models to be translated.
+    index (SemanticIndex): The index over the current manifests.
+    out_dir (str): The directory holding the files and state from the previous run.
+    targets (tuple): Optional, the target dialects, see translator.TARGETS.
+
+    Returns:
+    tuple: (models to rebuild, names of models reused, the {output file: inputs} state to save once the files are rebuilt)
+    """
+
+    previous_state = load_state(out_dir)
+    rebuild, reused, current_state = [], [], {}
+
+    for model in models:
+        inputs = view_inputs(model, index)
+        files = output_files(model['name'], targets)
+        for file_name in files:
+            current_state[file_name] = inputs
+
+        if all(previous_state.get(file_name) == inputs and os.path.isfile(os.path.join(out_dir, file_name))
+               for file_name in files):
+            reused.append(model['name'])
+            continue
+
+        previous_inputs = next((previous_state[file_name] for file_name in files if file_name in previous_state), None)
+        if previous_inputs:
+            changed = sorted(key for key in set(previous_inputs) | set(inputs) if previous_inputs.get(key) != inputs.get(key))
+            logging.debug(f"Rebuilding {', '.join(files)}, changed inputs: {', '.join(changed) or 'output file missing'}.")
+        rebuild.append(model)
+
+    return rebuild, reused, previous_state | current_state
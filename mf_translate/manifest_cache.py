@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import mmap
+import time
+import pickle
+import hashlib
+import logging
+
+from .manifest_loader import load_projected_dbt_manifest
+from .semantic_index import SemanticIndex
+
+CACHE_FILE = 'mf_translate_cache.pickle'
+CACHE_VERSION = 1 # Bump when the layout of the cached manifests or SemanticIndex changes
+MANIFEST_FILES = ['semantic_manifest.json', 'manifest.json']
+
+
+def _file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_keys(manifest_dir, hashes=None):
+    """
+    Helper returning {file name: {'size', 'mtime_ns', 'sha256'}} for the manifests in `manifest_dir`. Hashes are only
+    computed where a cached key with the same size but a different mtime needs confirming, or when writing the cache.
+    """
+
+    keys = {}
+    for file_name in MANIFEST_FILES:
+        stat = os.stat(os.path.join(manifest_dir, file_name))
+        keys[file_name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                           'sha256': (hashes or {}).get(file_name)}
+    return keys
+
+
+def _unchanged_files(cached_keys, manifest_dir):
+    """
+    Helper checking the cached manifest keys against the current manifests. A manifest whose size and mtime are
+    unchanged is assumed unchanged; if only its mtime differs (e.g. dbt rewrote an identical file) its hash decides.
+
+    Returns:
+    set: The names of the manifest files which are unchanged.
+    """
+
+    try:
+        current_keys = _manifest_keys(manifest_dir)
+    except FileNotFoundError:
+        return set()
+
+    unchanged_files = set()
+    for file_name, current in current_keys.items():
+        cached = cached_keys.get(file_name)
+        if not cached or cached['size'] != current['size']:
+            continue
+        if cached['mtime_ns'] != current['mtime_ns'] and \
+                cached['sha256'] != _file_hash(os.path.join(manifest_dir, file_name)):
+            continue
+        unchanged_files.add(file_name)
+
+    return unchanged_files
+
+
+def _is_cache_valid(cached_keys, manifest_dir):
+    """
+    Helper returning whether none of the manifests have changed since the cached keys were taken.
+    """
+    return _unchanged_files(cached_keys, manifest_dir) == set(MANIFEST_FILES)
+
+
+def read_cache(manifest_dir='target'):
+    """
+    Reads the manifests and SemanticIndex from the cache in `manifest_dir` if it is still valid for the manifests on disk.
+    The cache file is memory-mapped so the pickled payload is decoded in place rather than first copied into memory.
+
+    Returns:
+    tuple: (semantic_manifest, dbt_manifest, semantic_index), or None if there is no valid cache.
+    """
+
+    cache_path = os.path.join(manifest_dir, CACHE_FILE)
+    try:
+        with open(cache_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = mm.find(b'\n')
+            header = json.loads(mm[:header_end])
+            if header.get('version') != CACHE_VERSION or not _is_cache_valid(header['manifests'], manifest_dir):
+                return None
+            with memoryview(mm) as payload:
+                cached = pickle.loads(payload[header_end + 1:])
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, KeyError):
+        return None
+
+    return cached['semantic_manifest'], cached['dbt_manifest'], cached['semantic_index']
+
+
+def write_cache(semantic_manifest, dbt_manifest, semantic_index, manifest_dir='target', hashes=None):
+    """
+    Writes the manifests and SemanticIndex to the cache in `manifest_dir`, keyed by the size, mtime and hash of the
+    manifest files they were loaded from. The hashes are computed unless given.
+    """
+
+    hashes = hashes or {file_name: _file_hash(os.path.join(manifest_dir, file_name)) for file_name in MANIFEST_FILES}
+    header = {'version': CACHE_VERSION, 'manifests': _manifest_keys(manifest_dir, hashes)}
+    payload = {'semantic_manifest': semantic_manifest, 'dbt_manifest': dbt_manifest, 'semantic_index': semantic_index}
+
+    # Write to a temporary file and rename so a concurrent reader never sees a partial cache
+    cache_path = os.path.join(manifest_dir, CACHE_FILE)
+    with open(f"{cache_path}.{os.getpid()}.tmp", 'wb') as f:
+        f.write(json.dumps(header).encode() + b'\n')
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{cache_path}.{os.getpid()}.tmp", cache_path)
+
+
+def load_manifests(manifest_dir='target', stats=None, loaded=None):
+    """
+    Loads the MetricFlow semantic manifest, the projected DBT manifest (see manifest_loader) and a SemanticIndex over
+    both. They are read from the binary cache in `manifest_dir` when the manifests have not changed since it was
+    written, otherwise they are loaded from the JSON files and the cache is rewritten. Shared by mf-translate and
+    mf-compare-query.
+
+    Parameters:
+    manifest_dir (str): Optional, the directory holding semantic_manifest.json and manifest.json.
+    stats (dict): Optional, populated with `cache_hit`, `seconds`, the `reloaded` manifest files and, when the DBT
+                  manifest was loaded, the load_projected_dbt_manifest() statistics.
+    loaded (dict): Optional, kept by a long-running caller (e.g. watch mode) between calls. The manifests loaded by the
+                   previous call are reused while their files are unchanged, and only the changed files are reloaded.
+
+    Returns:
+    tuple: (semantic_manifest, dbt_manifest, semantic_index)
+    """
+
+    start = time.perf_counter()
+    stats = {} if stats is None else stats
+
+    unchanged_files = _unchanged_files(loaded['keys'], manifest_dir) if loaded else set()
+    if unchanged_files == set(MANIFEST_FILES):
+        stats.update({'cache_hit': True, 'reloaded': [], 'seconds': time.perf_counter() - start})
+        logging.debug(f"Reusing the manifests loaded from {manifest_dir}.")
+        return loaded['semantic_manifest'], loaded['dbt_manifest'], loaded['semantic_index']
+
+    if not loaded:
+        cached = read_cache(manifest_dir)
+        if cached:
+            if loaded is not None:
+                _remember(loaded, manifest_dir, *cached)
+            stats.update({'cache_hit': True, 'reloaded': [], 'seconds': time.perf_counter() - start})
+            logging.debug(f"Loaded manifests from {os.path.join(manifest_dir, CACHE_FILE)}.")
+            return cached
+
+    reloaded = []
+    if 'semantic_manifest.json' in unchanged_files:
+        semantic_manifest = loaded['semantic_manifest']
+    else:
+        reloaded.append('semantic_manifest.json')
+        semantic_manifest_path = os.path.join(manifest_dir, 'semantic_manifest.json')
+        try:
+            with open(semantic_manifest_path) as f:
+                semantic_manifest = json.load(f)
+        except FileNotFoundError:
+            logging.error(f"The file {semantic_manifest_path} does not exist.")
+            sys.exit(1)
+        except json.JSONDecodeError:
+            logging.error(f"The file {semantic_manifest_path} is not a valid JSON file.")
+            sys.exit(1)
+
+    # Only the dbt nodes backing semantic models are needed, so stream the (potentially very large) dbt manifest and keep just those
+    relation_names = {model['node_relation']['relation_name'] for model in semantic_manifest.get('semantic_models', [])}
+    if 'manifest.json' in unchanged_files and relation_names == loaded['relation_names']:
+        dbt_manifest = loaded['dbt_manifest']
+    else:
+        reloaded.append('manifest.json')
+        dbt_manifest = load_projected_dbt_manifest(os.path.join(manifest_dir, 'manifest.json'),
+                                                   relation_names=relation_names,
+                                                   stats=stats)
+
+    semantic_index = SemanticIndex(semantic_manifest.get('semantic_models', []),
+                                   semantic_manifest.get('metrics', []),
+                                   dbt_manifest.get('nodes', []))
+
+    hashes = {file_name: _file_hash(os.path.join(manifest_dir, file_name)) for file_name in MANIFEST_FILES}
+    if loaded is not None:
+        _remember(loaded, manifest_dir, semantic_manifest, dbt_manifest, semantic_index, hashes)
+    try:
+        write_cache(semantic_manifest, dbt_manifest, semantic_index, manifest_dir, hashes=hashes)
+    except OSError as e:
+        logging.warning(f"Could not write manifest cache to {manifest_dir}: {e}")
+
+    stats.update({'cache_hit': False, 'reloaded': reloaded, 'seconds': time.perf_counter() - start})
+    return semantic_manifest, dbt_manifest, semantic_index
+
+
+def _remember(loaded, manifest_dir, semantic_manifest, dbt_manifest, semantic_index, hashes=None):
+    """
+    Helper recording the loaded manifests, and the keys of the files they were loaded from, in `loaded`.
+    """
+
+    hashes = hashes or {file_name: _file_hash(os.path.join(manifest_dir, file_name)) for file_name in MANIFEST_FILES}
+    loaded.update({'keys': _manifest_keys(manifest_dir, hashes),
+                   'semantic_manifest': semantic_manifest,
+                   'dbt_manifest': dbt_manifest,
+                   'semantic_index': semantic_index,
+                   'relation_names': {model['node_relation']['relation_name']
+                                      for model in semantic_manifest.get('semantic_models', [])}})
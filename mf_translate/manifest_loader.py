@@ -0,0 +1,165 @@
+import sys
+import json
+import time
+import logging
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+CHUNK_SIZE = 1024 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+class _JsonStream:
+    """
+    Minimal incremental reader over a JSON document. Objects can be walked key by key, and each value is decoded with
+    json's C decoder from a buffer holding little more than that value, so memory use is bounded by the largest single
+    value decoded rather than the size of the file.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        if self.pos > CHUNK_SIZE:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(size or CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.bytes_read += len(chunk)
+        self.buffer += chunk
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise json.JSONDecodeError("Unexpected end of file", self.buffer, self.pos)
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def decode(self):
+        """
+        Decodes and returns the next JSON value, reading more of the file until the value is complete.
+        """
+        self.peek()
+        read_size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof: # A number at the end of the buffer may continue in the next chunk
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(read_size)
+            read_size *= 2 # Avoid re-decoding a large value once per chunk
+
+    def items(self):
+        """
+        Yields the (key, stream) pairs of the object starting at the current position. The consumer must either
+        decode() or skip() each value before advancing.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            yield key, self
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+    def skip(self):
+        """
+        Skips the next JSON value, walking objects entry by entry so that large unneeded sections are never held in
+        memory whole.
+        """
+        if self.peek() == '{':
+            for _, value in self.items():
+                value.skip()
+        else:
+            self.decode()
+
+
+def project_node(node):
+    """
+    Helper reducing a DBT manifest node to the fields used by the translators: `relation_name` and the names of its `columns`.
+    """
+    return {'relation_name': node.get('relation_name'),
+            'columns': {column_name: {} for column_name in node.get('columns') or {}}}
+
+
+def load_projected_dbt_manifest(file_path, relation_names=None, stats=None):
+    """
+    Streams a DBT manifest.json and returns a manifest containing only its `nodes`, each projected with project_node().
+    Other top-level sections are skipped without being loaded.
+
+    Parameters:
+    file_path (str): Path of the DBT manifest.json.
+    relation_names (set): Optional, only keep nodes with one of these relation names, e.g. those referenced by the
+                          semantic models' `node_relation`. All nodes are kept if not provided.
+    stats (dict): Optional, populated with `bytes_read` (counted in characters), `nodes_kept`, `nodes_skipped` and `seconds`.
+
+    Returns:
+    dict: {'nodes': {unique_id: projected node}}
+    """
+
+    start = time.perf_counter()
+    nodes = {}
+    nodes_skipped = 0
+
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            stream = _JsonStream(f)
+            for section, section_stream in stream.items():
+                if section != 'nodes':
+                    section_stream.skip()
+                    continue
+                for unique_id, node_stream in section_stream.items():
+                    node = node_stream.decode()
+                    if relation_names is None or node.get('relation_name') in relation_names:
+                        nodes[unique_id] = project_node(node)
+                    else:
+                        nodes_skipped += 1
+    except FileNotFoundError:
+        logging.error(f"The file {file_path} does not exist.")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        logging.error(f"The file {file_path} is not a valid JSON file.")
+        sys.exit(1)
+
+    if stats is not None:
+        stats.update({'bytes_read': stream.bytes_read, 'nodes_kept': len(nodes),
+                      'nodes_skipped': nodes_skipped, 'seconds': time.perf_counter() - start})
+
+    return {'nodes': nodes}
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident set size of the process in MB, or None where it cannot be measured.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024 # ru_maxrss is bytes on macOS, KB on Linux
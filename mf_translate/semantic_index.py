@@ -0,0 +1,213 @@
+import os
+import contextvars
+from types import MappingProxyType
+
+from .sql_expression import EXPRESSION_CACHE
+
+_ANY_NODES = object()
+
+ACTIVE_INDEX = contextvars.ContextVar('active_semantic_index', default=None) # Set by Translator methods
+ACTIVE_WAREHOUSE_TYPE = contextvars.ContextVar('active_warehouse_type', default=None) # Set by Translator methods
+
+WAREHOUSE_TYPES = ('bigquery', 'snowflake', 'redshift')
+
+
+def target_warehouse_type():
+    """
+    Returns the lower-cased warehouse type of the Translator whose method is running in the current thread, or else
+    of the MF_TRANSLATE_TARGET_WAREHOUSE_TYPE environment variable. Raises ValueError if neither is set or the type is
+    not one of WAREHOUSE_TYPES.
+    """
+
+    warehouse_type = ACTIVE_WAREHOUSE_TYPE.get() or os.getenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE")
+    if not warehouse_type:
+        raise ValueError("Warehouse type must be defined to translate ratio metrics. Pass `warehouse_type` to the Translator "
+                         "or use `export MF_TRANSLATE_TARGET_WAREHOUSE_TYPE=bigquery|snowflake|redshift`.")
+    if warehouse_type.lower() not in WAREHOUSE_TYPES:
+        raise ValueError(f"Unsupported warehouse type: {warehouse_type}. Supported values are bigquery, snowflake and redshift.")
+    return warehouse_type.lower()
+
+
+class SemanticIndex:
+    """
+    Read-only lookups over the MetricFlow semantic manifest and the DBT manifest. Built once by set_manifests() so
+    that translating an expression or metric resolves entities, dimensions, measures, metrics and dbt nodes with a
+    dict lookup rather than a scan of every semantic model.
+
+    Where several objects share a key the last one in the manifest wins, matching the behaviour of the original
+    linear scans.
+    """
+
+    __slots__ = ('_sources', 'models', 'primary_models', 'dimension_models', 'measures', 'metrics', 'nodes_by_relation',
+                 'metrics_by_model')
+
+    def __init__(self, semantic_models=None, metrics=None, dbt_nodes=None):
+        """
+        Parameters:
+        semantic_models (list): The `semantic_models` from the MetricFlow semantic manifest.
+        metrics (list): The `metrics` from the MetricFlow semantic manifest.
+        dbt_nodes (dict): The `nodes` from the DBT manifest.
+        """
+
+        primary_models = {}   # entity name -> model with that primary entity
+        dimension_models = {} # (entity name, dimension name) -> model with that primary entity and dimension
+        measures = {}         # measure name -> measure | {'parent_model': model name}
+
+        for model in semantic_models or []:
+
+            primary_entities = [entity["name"] for entity in model.get("entities") or [] if entity.get("type") == 'primary']
+            for entity_name in primary_entities:
+                primary_models[entity_name] = model
+                for dim in model.get("dimensions") or []:
+                    dimension_models[(entity_name, dim["name"])] = model
+
+            for measure in model.get("measures") or []:
+                measures[measure["name"]] = measure | {'parent_model': model['name']}
+
+        nodes_by_relation = {}
+        if dbt_nodes:
+            for node_data in dbt_nodes.values():
+                if node_data.get('relation_name'):
+                    nodes_by_relation[node_data['relation_name']] = node_data
+
+        metrics_dict = {metric["name"]: metric for metric in metrics or []}
+
+        metrics_by_model = {} # model name -> metrics whose translated measures belong to that model
+        for metric in metrics_dict.values():
+            owning_model = _owning_model(metric, metrics_dict, measures)
+            if owning_model:
+                metrics_by_model.setdefault(owning_model, []).append(metric)
+
+        self._sources = (semantic_models, metrics, dbt_nodes)
+        self.models = MappingProxyType({model['name']: model for model in semantic_models or []})
+        self.primary_models = MappingProxyType(primary_models)
+        self.dimension_models = MappingProxyType(dimension_models)
+        self.measures = MappingProxyType(measures)
+        self.metrics = MappingProxyType(metrics_dict)
+        self.nodes_by_relation = MappingProxyType(nodes_by_relation)
+        self.metrics_by_model = MappingProxyType({name: tuple(owned) for name, owned in metrics_by_model.items()})
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"SemanticIndex is immutable, `{name}` cannot be reassigned.")
+        super().__setattr__(name, value)
+
+    def __reduce__(self):
+        # Pickle the lookups themselves (rather than rebuilding them on load) so a cached index is ready to use
+        state = {name: dict(getattr(self, name)) for name in self.__slots__ if name != '_sources'}
+        return _restore_index, (self._sources, state)
+
+    def is_built_from(self, semantic_models, metrics, dbt_nodes=_ANY_NODES):
+        """
+        Returns True if the index was built from exactly these manifest objects. Used by the translators to detect
+        when the module globals have been replaced (e.g. via monkeypatch in tests) without calling set_manifests().
+        If `dbt_nodes` is not given only the semantic manifest is compared.
+        """
+        if dbt_nodes is _ANY_NODES:
+            return self._sources[0] is semantic_models and self._sources[1] is metrics
+        return all(built is current for built, current in zip(self._sources, (semantic_models, metrics, dbt_nodes)))
+
+    def model_for_entity(self, entity_name):
+        """
+        Returns the semantic model with `entity_name` as its primary entity, or None.
+        """
+        return self.primary_models.get(entity_name)
+
+    def model_for_dimension(self, entity_name, dimension_name):
+        """
+        Returns the semantic model with `entity_name` as its primary entity and a dimension named `dimension_name`, or None.
+        """
+        return self.dimension_models.get((entity_name, dimension_name))
+
+    def metrics_for_model(self, model_name):
+        """
+        Returns the metrics owned by the semantic model `model_name`, in manifest order. Only these metrics can produce
+        measures on the model's view/cube, so translating a model need not consider any other metric.
+        """
+        return self.metrics_by_model.get(model_name, ())
+
+    def node_for_model(self, model):
+        """
+        Returns the DBT node backing a semantic model, looked up by the model's `node_relation.relation_name`.
+        """
+        return self.nodes_by_relation[model['node_relation']['relation_name']]
+
+
+def _owning_model(metric, metrics_dict, measures):
+    """
+    Helper returning the name of the semantic model whose view a metric's measures are added to, or None if the metric
+    cannot be attributed to a single model.
+
+    Simple metrics belong to the model of their measure. Ratio metrics belong to the model shared by their numerator and
+    denominator metrics. Other metric types fall back to `type_params.input_measures`.
+    """
+
+    type_params = metric.get("type_params") or {}
+
+    if metric.get("type") == "simple" and type_params.get("measure"):
+        measure = measures.get(type_params["measure"]["name"])
+        return measure["parent_model"] if measure else None
+
+    if metric.get("type") == "ratio" and type_params.get("numerator") and type_params.get("denominator"):
+        owners = set()
+        for param in (type_params["numerator"], type_params["denominator"]):
+            input_metric = metrics_dict.get(param["name"])
+            if not input_metric or input_metric.get("type") == "ratio":
+                return None
+            owners.add(_owning_model(input_metric, metrics_dict, measures))
+        return owners.pop() if len(owners) == 1 else None
+
+    owners = {measures[m["name"]]["parent_model"] for m in type_params.get("input_measures") or [] if m["name"] in measures}
+    return owners.pop() if len(owners) == 1 else None
+
+
+def _restore_index(sources, state):
+    """
+    Helper recreating a pickled SemanticIndex without rebuilding its lookups.
+    """
+    index = object.__new__(SemanticIndex)
+    object.__setattr__(index, '_sources', sources)
+    for name, lookup in state.items():
+        object.__setattr__(index, name, MappingProxyType(lookup))
+    return index
+
+
+def set_module_manifests(module, dialect, metricflow_semantic_manifest, dbt_manifest, semantic_index=None):
+    """
+    Sets the SEMANTIC_MODELS, METRICS, DBT_NODES and SEMANTIC_INDEX globals of a translator module (to_looker, to_cube
+    or to_ldsh) from the MetricFlow semantic manifest and the DBT manifest, and drops the module's cached expression
+    translations. Shared by the set_manifests() of each module.
+
+    Parameters:
+    module (module): The translator module.
+    dialect (str): The module's dialect in the expression cache, e.g. 'looker'.
+    metricflow_semantic_manifest (dict): The MetricFlow semantic manifest.
+    dbt_manifest (dict): The DBT manifest.
+    semantic_index (SemanticIndex): Optional, a prebuilt index over the two manifests (e.g. from the manifest cache). Built if not provided.
+    """
+
+    module.SEMANTIC_MODELS = metricflow_semantic_manifest.get('semantic_models', [])
+    module.METRICS = metricflow_semantic_manifest.get('metrics', [])
+    module.DBT_NODES = dbt_manifest.get('nodes', [])
+    if semantic_index and semantic_index.is_built_from(module.SEMANTIC_MODELS, module.METRICS, module.DBT_NODES):
+        module.SEMANTIC_INDEX = semantic_index
+    else:
+        module.SEMANTIC_INDEX = SemanticIndex(module.SEMANTIC_MODELS, module.METRICS, module.DBT_NODES)
+    EXPRESSION_CACHE.clear(dialect)
+
+
+def module_semantic_index(module):
+    """
+    Returns the SemanticIndex for the SEMANTIC_MODELS, METRICS and DBT_NODES globals of a translator module, rebuilding
+    it if the globals have been replaced since it was built. Within a Translator method the translator's own index is
+    returned instead. Shared by the semantic_index() of each module.
+    """
+
+    active_index = ACTIVE_INDEX.get()
+    if active_index is not None:
+        return active_index
+
+    if not module.SEMANTIC_INDEX.is_built_from(module.SEMANTIC_MODELS, module.METRICS, module.DBT_NODES):
+        module.SEMANTIC_INDEX = SemanticIndex(module.SEMANTIC_MODELS, module.METRICS, module.DBT_NODES)
+
+    return module.SEMANTIC_INDEX
@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import stat
+import time
+import socket
+import logging
+import argparse
+import threading
+import collections
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .dbt_project import parse_dbt_project, project_snapshot
+from .manifest_cache import load_manifests, MANIFEST_FILES
+from .translator import Translator, TARGETS
+
+LATENCY_WINDOW = 1000 # Number of recent requests the latency percentiles are computed over
+
+
+class LatencyStats:
+    """
+    Thread-safe request counters and latencies (in milliseconds) for the translation server.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent_ms = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.recent_ms.append(elapsed_ms)
+
+    def summary(self):
+        """
+        Returns {'requests', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms'}. Percentiles are over the most recent requests.
+        """
+        with self._lock:
+            recent = sorted(self.recent_ms)
+            percentile = lambda p: round(recent[min(len(recent) - 1, int(p * len(recent)))], 3) if recent else None
+            return {'requests': self.requests,
+                    'errors': self.errors,
+                    'mean_ms': round(self.total_ms / self.requests, 3) if self.requests else None,
+                    'p50_ms': percentile(0.5),
+                    'p95_ms': percentile(0.95),
+                    'max_ms': round(self.max_ms, 3)}
+
+
+class TranslationService:
+    """
+    Keeps the manifests of a dbt project loaded in a Translator and translates models on request. reload_if_changed()
+    re-parses the project and reloads the manifests when the project files or the manifests change; requests in flight
+    keep using the Translator they started with.
+    """
+
+    def __init__(self, manifest_dir='target', translator=None):
+        """
+        Parameters:
+        manifest_dir (str): Optional, the directory dbt writes the manifests to.
+        translator (Translator): Optional, serve this translator instead of parsing and loading the project.
+        """
+
+        self.manifest_dir = manifest_dir
+        self.translator = translator
+        self.reloads = 0
+        self.loaded_at = time.time() if translator else None
+        self.stats = LatencyStats()
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+
+        if translator is None:
+            self.reload_if_changed()
+
+    def _watched_files(self):
+        snapshot = project_snapshot(manifest_dir=self.manifest_dir)
+        for file_name in MANIFEST_FILES: # Also reload when the manifests are regenerated by another process
+            path = os.path.join(self.manifest_dir, file_name)
+            if os.path.isfile(path):
+                snapshot[path] = (os.stat(path).st_mtime_ns, os.stat(path).st_size)
+        return snapshot
+
+    def reload_if_changed(self):
+        """
+        Parses the project if its fingerprint has changed and reloads the manifests if any watched file has changed
+        since the last load. A failed parse is logged and the previous manifests keep being served.
+
+        Returns:
+        bool: True if the manifests were reloaded.
+        """
+
+        with self._reload_lock:
+
+            snapshot = self._watched_files()
+            if snapshot == self._snapshot:
+                return False
+
+            start = time.perf_counter()
+            try:
+                parse_dbt_project(manifest_dir=self.manifest_dir)
+                semantic_manifest, dbt_manifest, semantic_index = load_manifests(self.manifest_dir)
+            except SystemExit:
+                if self.translator is None:
+                    raise
+                logging.warning("Failed to reload the dbt project, serving the previously loaded manifests.")
+                self._snapshot = snapshot # Retry once the project changes again
+                return False
+
+            self.translator = Translator(semantic_manifest, dbt_manifest, semantic_index=semantic_index)
+            self._snapshot = self._watched_files() # Parsing rewrites the manifests
+            self.loaded_at = time.time()
+            self.reloads += 1
+            logging.info(f"Loaded {len(self.translator.semantic_index.models)} semantic models in {time.perf_counter() - start:.2f}s.")
+            return True
+
+    def translate(self, request):
+        """
+        Handles a translate request.
+
+        Parameters:
+        request (dict): {'model': semantic model name, 'to': 'looker' | 'cube' | 'lightdash' (default looker), 'view_name': optional}
+
+        Returns:
+        tuple: (HTTP status, response dict). The response holds the translated `text`, or an `error`.
+        """
+
+        start = time.perf_counter()
+        translator = self.translator
+        status, response = 200, {}
+
+        if not isinstance(request, dict) or not isinstance(request.get('model'), str):
+            status, response = 400, {'error': "Request must be a JSON object with a `model` name."}
+        elif request.get('to', 'looker') not in TARGETS:
+            status, response = 400, {'error': f"Unsupported dialect `{request.get('to')}`. Supported dialects are {', '.join(TARGETS)}."}
+        elif request['model'] not in translator.semantic_index.models:
+            status, response = 404, {'error': f"Model `{request['model']}` not found."}
+        else:
+            try:
+                text = translator.model_to_text(request['model'], request.get('to', 'looker'), view_name=request.get('view_name'))
+                response = {'model': request['model'], 'to': request.get('to', 'looker'), 'text': text}
+            except (Exception, SystemExit) as e:
+                status, response = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        self.stats.record(elapsed_ms, error=status != 200)
+        response['ms'] = round(elapsed_ms, 3)
+        return status, response
+
+    def status(self):
+        """
+        Returns the server statistics: request counts and latencies, reload count and the number of models loaded.
+        """
+        return {'latency': self.stats.summary(),
+                'reloads': self.reloads,
+                'loaded_at': self.loaded_at,
+                'models': len(self.translator.semantic_index.models),
+                'expression_cache': self.translator.expression_cache.info()}
+
+
+class TranslationRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoints: POST /translate with a JSON request (see TranslationService.translate()), GET /stats.
+    """
+
+    protocol_version = 'HTTP/1.1' # Keep connections alive between requests
+
+    def setup(self):
+        super().setup()
+        if self.connection.family != socket.AF_UNIX: # Send responses immediately rather than waiting on delayed ACKs
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path != '/translate':
+            return self._respond(404, {'error': f"Unknown path {self.path}."})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'null')
+        except json.JSONDecodeError:
+            return self._respond(400, {'error': "Request body is not valid JSON."})
+        self._respond(*self.server.service.translate(request))
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._respond(404, {'error': f"Unknown path {self.path}."})
+        self._respond(200, self.server.service.status())
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, None # BaseHTTPRequestHandler expects a (host, port) address or a falsy one
+
+
+def _is_socket(path):
+    """
+    Helper returning whether `path` is a Unix socket. False if nothing exists at `path`.
+    """
+
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def make_server(service, socket_path=None, port=8765):
+    """
+    Creates an HTTP server for `service` listening on the Unix socket `socket_path`, or on localhost:`port`. A stale
+    socket at `socket_path` is replaced, but any other file there is left alone and the server is not started.
+    """
+
+    if socket_path:
+        if _is_socket(socket_path):
+            os.remove(socket_path) # A stale socket from a previous server
+        elif os.path.exists(socket_path):
+            logging.error(f"{socket_path} exists and is not a socket. Choose another --socket path.")
+            sys.exit(1)
+        server = UnixHTTPServer(socket_path, TranslationRequestHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), TranslationRequestHandler)
+        server.daemon_threads = True
+
+    server.service = service
+    return server
+
+
+def watch_for_changes(service, stop_event, poll_interval=1.0):
+    """
+    Calls service.reload_if_changed() every `poll_interval` seconds until `stop_event` is set.
+    """
+
+    while not stop_event.wait(poll_interval):
+        try:
+            service.reload_if_changed()
+        except Exception as e:
+            logging.warning(f"Failed to check the dbt project for changes: {e}")
+
+
+def serve_main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='mf-translate serve', description='Keeps the dbt project manifests loaded and translates semantic models on request over localhost HTTP or a Unix socket.')
+    listen_group = parser.add_mutually_exclusive_group()
+    listen_group.add_argument('--socket', type=str, help='Path of a Unix socket to listen on.', metavar='PATH')
+    listen_group.add_argument('--port', type=int, default=8765, help='Port to listen on at 127.0.0.1. Defaults to 8765.', metavar='N')
+    parser.add_argument('--manifest-dir', type=str, default='target', help='Directory dbt writes manifest.json and semantic_manifest.json to. Defaults to target.', metavar='DIR')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between checks for changes to the dbt project. Defaults to 1.', metavar='SECONDS')
+    args = parser.parse_args(argv)
+
+    service = TranslationService(manifest_dir=args.manifest_dir)
+    server = make_server(service, socket_path=args.socket, port=args.port)
+
+    stop_event = threading.Event()
+    watcher = threading.Thread(target=watch_for_changes, args=(service, stop_event, args.poll_interval), daemon=True)
+    watcher.start()
+
+    logging.info(f"Serving translations on {args.socket or f'http://127.0.0.1:{args.port}'}, press Ctrl+C to stop...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopped serving.")
+    finally:
+        stop_event.set()
+        server.server_close()
+        if args.socket and _is_socket(args.socket):
+            os.remove(args.socket)
@@ -0,0 +1,275 @@
+import re
+import threading
+import contextvars
+from collections import OrderedDict
+
+EXPRESSION_CACHE_SIZE = 4096 # Translated expressions kept across all dialects
+
+_IDENTIFIER = r'[^\W\d]\w*|"(?:[^"]|"")*"|`[^`]*`'
+
+# Single-pass lexer over MetricFlow SQL expressions. Alternatives are tried in order at each position, so jinja calls,
+# string literals and qualified identifiers are consumed whole and their contents are never mistaken for bare columns.
+TOKEN_PATTERN = re.compile(rf"""
+    (?P<call>\{{\{{\s*(?P<func>Dimension|TimeDimension|Entity)\s*\(
+        \s*(?P<quote>['"])(?P<ref>.*?)(?P=quote)\s*
+        (?:,\s*(?:\w+\s*=\s*)?['"](?P<grain>\w*)['"]\s*)?
+    \)\s*\}}\}})
+  | (?P<jinja>\{{\{{.*?\}}\}})
+  | (?P<literal>'(?:[^']|'')*')
+  | (?P<qualified>(?:{_IDENTIFIER})(?:\s*\.\s*(?:{_IDENTIFIER}))+)
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<number>\d[\w.]*)
+  | (?P<word>[^\W\d]\w*)
+""", re.VERBOSE | re.DOTALL)
+
+
+def dimension_ref_parts(dim_ref):
+    """
+    Splits a MetricFlow dimension reference into its entity and dimension names. For multi-hop references the entity
+    is the last one in the path. E.g. 'delivery__delivery_rating' -> ('delivery', 'delivery_rating'),
+    'order_id__customer_id__region' -> ('customer_id', 'region').
+    """
+
+    parts = dim_ref.split("__")
+    if len(parts) < 2:
+        raise ValueError(f"Dimension reference `{dim_ref}` is not of the form `entity__dimension`.")
+    return parts[-2], parts[-1]
+
+
+def model_for_dimension_ref(dim_ref, index):
+    """
+    Returns (semantic model, dimension name) for a MetricFlow dimension reference. The model is the one with the
+    entity as its primary entity and a dimension of that name, falling back to any model with the primary entity
+    (e.g. when the dimension is defined by a measure's model without a `dimensions` list).
+    """
+
+    entity_name, dimension_name = dimension_ref_parts(dim_ref)
+    model = index.model_for_dimension(entity_name, dimension_name) or index.model_for_entity(entity_name)
+    if not model:
+        raise ValueError(f"No semantic model has `{entity_name}` as its primary entity, referenced by `{dim_ref}`.")
+    return model, dimension_name
+
+
+def dimension_refs(expression):
+    """
+    Returns the references of the {{ Dimension(...) }} and {{ TimeDimension(...) }} calls in a MetricFlow SQL
+    expression, in order, lexed by TOKEN_PATTERN as parse_sql_expression() does (so either quote style is accepted).
+    References without an entity, such as metric_time, name no model so are skipped.
+    """
+    return [match.group('ref') for match in TOKEN_PATTERN.finditer(expression)
+            if match.lastgroup == 'call' and match.group('func') != 'Entity' and '__' in match.group('ref')]
+
+
+def parse_sql_expression(expression, from_model, index):
+    """
+    Parses a MetricFlow SQL expression into a dialect-neutral form in a single pass of TOKEN_PATTERN: a tuple of
+    verbatim text and resolved references, which render_sql_expression() renders for each target dialect without
+    lexing the expression or resolving its references again.
+
+    Parameters:
+    expression (str): The MetricFlow SQL expression to be parsed.
+    from_model (dict): The parent MetricFlow model for the expression.
+    index (SemanticIndex): Resolves dimension references and, where it holds dbt nodes, the columns of the model's table.
+
+    Returns:
+    tuple: Of str (verbatim text) and reference tuples:
+           ('column', name) for an unqualified column of the model's dbt node,
+           ('dimension', model, dimension name) for {{ Dimension(...) }},
+           ('time_dimension', model, dimension name, grain or None, token) for {{ TimeDimension(...) }},
+           ('entity', entity name, token) for {{ Entity(...) }}.
+           References without an entity, such as metric_time, are kept as verbatim text.
+    """
+
+    columns = index.node_for_model(from_model)['columns'] if index.nodes_by_relation else ()
+
+    segments = []
+    position = 0
+    expression = expression.strip()
+
+    for match in TOKEN_PATTERN.finditer(expression):
+
+        kind = match.lastgroup
+        token = match.group(0)
+
+        if kind == 'word' and token in columns:
+            reference = ('column', token)
+        elif kind == 'call' and match.group('func') == 'Entity':
+            reference = ('entity', match.group('ref'), token)
+        elif kind == 'call' and '__' not in match.group('ref'):
+            continue # No entity to resolve a model from, e.g. {{ TimeDimension('metric_time', 'day') }}, so kept verbatim
+        elif kind == 'call':
+            model, dimension_name = model_for_dimension_ref(match.group('ref'), index)
+            if match.group('func') == 'TimeDimension':
+                reference = ('time_dimension', model, dimension_name, match.group('grain') or None, token)
+            else:
+                reference = ('dimension', model, dimension_name)
+        else:
+            continue
+
+        text = expression[position:match.start()]
+        if text:
+            segments.append(text)
+        segments.append(reference)
+        position = match.end()
+
+    if position < len(expression):
+        segments.append(expression[position:])
+
+    return tuple(segments)
+
+
+def render_sql_expression(segments, from_model, column_template, field_template, translate_entities=False,
+                          time_dimension_field=None, single_line=False):
+    """
+    Renders an expression parsed by parse_sql_expression() in a target dialect.
+
+    Parameters:
+    segments (tuple): The parsed expression.
+    from_model (dict): The parent MetricFlow model for the expression.
+    column_template (str): Format for unqualified columns of the model's table, e.g. '${{TABLE}}.{}'.
+    field_template (str): Format for dimension/entity references, e.g. '${{{}}}'. Given 'dimension' for dimensions of
+                          `from_model`, otherwise 'model.dimension'.
+    translate_entities (bool): Optional, rewrite {{ Entity('entity') }} with `field_template`. Kept verbatim otherwise.
+    time_dimension_field (function): Optional, (model, dimension name, grain or None) -> field name used to rewrite
+                                     {{ TimeDimension(...) }}. Kept verbatim if not provided.
+    single_line (bool): Optional, replace newlines with spaces.
+
+    Returns:
+    str: The expression in the target dialect.
+    """
+
+    rendered = []
+
+    for segment in segments:
+
+        if isinstance(segment, str):
+            rendered.append(segment.replace('\n', ' ') if single_line else segment)
+            continue
+
+        kind = segment[0]
+
+        if kind == 'column':
+            rendered.append(column_template.format(segment[1]))
+            continue
+
+        if kind == 'entity':
+            rendered.append(field_template.format(segment[1]) if translate_entities else segment[2])
+            continue
+
+        if kind == 'time_dimension' and not time_dimension_field:
+            rendered.append(segment[4].replace('\n', ' ') if single_line else segment[4])
+            continue
+
+        model, dimension_name = segment[1], segment[2]
+        if kind == 'time_dimension':
+            dimension_name = time_dimension_field(model, dimension_name, segment[3])
+
+        if model['name'] == from_model['name']:
+            rendered.append(field_template.format(dimension_name))
+        else:
+            rendered.append(field_template.format(f"{model['name']}.{dimension_name}"))
+
+    return ''.join(rendered)
+
+
+def translate_sql_expression(expression, from_model, index, column_template, field_template, translate_entities=False,
+                             time_dimension_field=None, single_line=False):
+    """
+    Translates a MetricFlow SQL expression to a target dialect. Shared by sql_expression_to_lkml(),
+    sql_expression_to_cube() and sql_expression_to_ldsh(). The parsed expression is cached under the 'parsed'
+    dialect of the expression cache, so translating the same expression to several dialects only parses it once.
+
+    Parameters are those of parse_sql_expression() and render_sql_expression().
+
+    Returns:
+    str: The translated expression.
+    """
+
+    segments = expression_cache().translate('parsed', expression, from_model, index, parse_sql_expression)
+
+    return render_sql_expression(segments, from_model, column_template, field_template,
+                                 translate_entities=translate_entities,
+                                 time_dimension_field=time_dimension_field,
+                                 single_line=single_line)
+
+
+class ExpressionCache:
+    """
+    Bounded LRU cache of translated SQL expressions keyed by (dialect, expression, from-model). The same filters and
+    measure expressions are translated repeatedly (e.g. by each filtered variant of a measure and by both sides of a
+    ratio), so each is only lexed once per manifest.
+
+    A translation depends on the manifests, so each dialect's entries are tied to the SemanticIndex they were
+    translated with and dropped when a different index is seen, e.g. after set_manifests().
+    """
+
+    def __init__(self, maxsize=EXPRESSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._indexes = {} # dialect -> SemanticIndex its entries were translated with
+        self._lock = threading.Lock()
+
+    def translate(self, dialect, expression, from_model, index, translate_function):
+        """
+        Returns the cached translation of `expression`, or calls translate_function(expression, from_model, index) and
+        caches the result. Failed translations are not cached.
+        """
+
+        # The model's name and table determine how its dimensions and columns are rendered
+        key = (dialect, expression, from_model['name'], (from_model.get('node_relation') or {}).get('relation_name'))
+
+        with self._lock:
+            if self._indexes.get(dialect) is not index:
+                self._clear(dialect)
+                self._indexes[dialect] = index
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        translated = translate_function(expression, from_model, index)
+
+        with self._lock:
+            if self._indexes.get(dialect) is index:
+                self._entries[key] = translated
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return translated
+
+    def clear(self, dialect=None):
+        """
+        Drops the cached translations of `dialect`, or of every dialect if not given. The counters are kept.
+        """
+        with self._lock:
+            self._clear(dialect)
+
+    def _clear(self, dialect):
+        if dialect is None:
+            self._entries.clear()
+            self._indexes.clear()
+            return
+        for key in [key for key in self._entries if key[0] == dialect]:
+            del self._entries[key]
+        self._indexes.pop(dialect, None)
+
+    def info(self):
+        """
+        Returns the cache statistics: {'hits', 'misses', 'size', 'maxsize'}.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+EXPRESSION_CACHE = ExpressionCache()
+ACTIVE_EXPRESSION_CACHE = contextvars.ContextVar('active_expression_cache', default=None) # Set by Translator methods
+
+
+def expression_cache():
+    """
+    Returns the ExpressionCache of the Translator whose method is running in the current thread, or EXPRESSION_CACHE.
+    """
+    return ACTIVE_EXPRESSION_CACHE.get() or EXPRESSION_CACHE
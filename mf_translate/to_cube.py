@@ -1,26 +1,30 @@
+import sys
 import re
 import os
 import logging
 
+from .semantic_index import SemanticIndex, set_module_manifests, module_semantic_index, target_warehouse_type
+from .sql_expression import translate_sql_expression, expression_cache
+
 SEMANTIC_MODELS = [] # Used in sql_expression_to_cube()
 METRICS = []
 DBT_NODES = []
+SEMANTIC_INDEX = SemanticIndex() # Lookups over the above, see semantic_index()
 
-def set_manifests(metricflow_semantic_manifest, dbt_manifest):
-    """
-    Sets the SEMANTIC_MODELS, METRICS and DBT_NODES globals from the MetricFlow semantic manifest and the DBT manifest.
 
-    Parameters:
-    metricflow_semantic_manifest (dict): The MetricFlow semantic manifest.
-    dbt_manifest (dict): The DBT manifest.
+def set_manifests(metricflow_semantic_manifest, dbt_manifest, semantic_index=None):
     """
-    global SEMANTIC_MODELS
-    global METRICS
-    global DBT_NODES
+    Sets the module globals from the manifests, see semantic_index.set_module_manifests().
+    """
+    set_module_manifests(sys.modules[__name__], 'cube', metricflow_semantic_manifest, dbt_manifest,
+                         semantic_index=semantic_index)
 
-    SEMANTIC_MODELS = metricflow_semantic_manifest.get('semantic_models', [])
-    METRICS = metricflow_semantic_manifest.get('metrics', [])
-    DBT_NODES = dbt_manifest.get('nodes', [])
+
+def semantic_index():
+    """
+    Returns the SemanticIndex for the module globals, see semantic_index.module_semantic_index().
+    """
+    return module_semantic_index(sys.modules[__name__])
 
 
 def sql_expression_to_cube(expression, from_model):
@@ -35,49 +39,18 @@ def sql_expression_to_cube(expression, from_model):
     str: The Cube SQL expression.
     """
 
-    # Step 1: Replace unqualified table fields with {CUBE}.field
-    if DBT_NODES:
-
-        node_dict = { node_data['relation_name']: node_data for node_name, node_data in DBT_NODES.items() }
-        node_for_model = node_dict[from_model['node_relation']['relation_name']]
-        node_columns  = node_for_model['columns'].keys()
-
-        # Pattern to match unqualified fields (words) not in {{ Dimension('...') }}
-        unqualified_field_pattern = r"\b(?!\{\{ Dimension\(')\w+\b"
+    # Translations are cached per manifest (see sql_expression.ExpressionCache)
+    return expression_cache().translate('cube', expression, from_model, semantic_index(), _sql_expression_to_cube)
 
-        def translate_unqualified_field(match):
-            if match.group(0) in node_columns:
-                return f"{{CUBE}}.{match.group(0)}"
-            else:
-                return match.group(0)
 
-        expression = re.sub(unqualified_field_pattern, translate_unqualified_field, expression)
-
-
-    # Step 2: Replace {{ Dimension('entity__dimension') }} with {model.dimension}
-    dim_ref_pattern = r"\{\{\s*Dimension\s*\(\s*'([^']+?)'\s*\)\s*\}\}"
-
-    def translate_dim_ref(match):
-
-        dim_inner_ref = match.group(1)                # 'Dimension('delivery__delivery_rating')' -> 'delivery__delivery_rating'
-        entity_name = dim_inner_ref.split("__")[0]    # 'delivery__delivery_rating' -> 'delivery'
-        dimension_name = dim_inner_ref.split("__")[1] # 'delivery__delivery_rating' -> 'delivery_rating'
-
-         # Get model for entity
-         # TODO: Need to account for multiple models with the same entity identifier (see sql_expression_to_lkml() in to_looker.py)
-        model_for_entity = None
-        for model in SEMANTIC_MODELS:
-            for entity in model["entities"]:
-                if entity["name"] == entity_name and entity["type"] == 'primary':
-                    model_for_entity = model
-                    break
-
-        if model_for_entity['name'] == from_model['name']:
-            return "{" + dimension_name + "}"
-        else:
-            return "{" + f"{model_for_entity['name']}.{dimension_name}" + "}"
+def _sql_expression_to_cube(expression, from_model, index):
+    """
+    Helper translating an expression for sql_expression_to_cube() on a cache miss.
+    """
 
-    return re.sub(dim_ref_pattern, translate_dim_ref, expression.strip())
+    return translate_sql_expression(expression, from_model, index,
+                                    column_template="{{CUBE}}.{}",
+                                    field_template="{{{}}}")
 
 
 def entity_to_cube(entity, from_model):
@@ -125,7 +98,7 @@ def add_parentheses_to_sql(sql):
 
 def set_timezone_for_time_dimension(time_dimension_sql):
     """
-    Helper function for converting a time dimension SQL expression to a timezone-aware SQL expression. The timezone is set by the MF_TRANSLATE_CUBE_TIMEZONE_FOR_TIME_DIMENSIONS environment variable.
+    Helper function for converting a time dimension SQL expression to a timezone-aware SQL expression. The timezone is set by the MF_TRANSLATE_CUBE_TIMEZONE_FOR_TIME_DIMENSIONS environment variable, the SQL by the target warehouse type (see semantic_index.target_warehouse_type()).
 
     Cube requires a timestamp whereas DBT wants a datetime:
          - https://cube.dev/docs/guides/recipes/data-modeling/string-time-dimensions
@@ -136,11 +109,11 @@ def set_timezone_for_time_dimension(time_dimension_sql):
 
     if timezone:
 
-        target_warehouse_type = os.getenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE")
+        warehouse_type = target_warehouse_type()
 
-        if target_warehouse_type.lower() == "bigquery":
+        if warehouse_type == "bigquery":
             return f"TIMESTAMP({time_dimension_sql}, '{timezone}')"
-        elif target_warehouse_type.lower() == "snowflake":
+        elif warehouse_type == "snowflake":
             return f"CONVERT_TIMEZONE('{timezone}', {time_dimension_sql})"
 
     return add_parentheses_to_sql(time_dimension_sql)
@@ -196,12 +169,7 @@ def simple_metric_to_cube_measure(metric, from_model, additional_where_filters=[
     dict: The Cube measure.
     """
 
-    measures_dict = {}
-    for model in SEMANTIC_MODELS:
-        for measure in model["measures"]:
-            measures_dict[measure["name"]] = measure | {'parent_model': model['name']}
-
-    measure = measures_dict[metric["type_params"]["measure"]["name"]]
+    measure = semantic_index().measures[metric["type_params"]["measure"]["name"]]
 
     cube_measure = {}
     cube_measure["name"] = metric["name"]
@@ -264,7 +232,7 @@ def metric_to_cube_measures(metric, from_model):
     elif metric["type"] == "ratio":
 
         metric_where_filters = (metric.get("filter") or  {}).get("where_filters", [])
-        metrics_dict = {m["name"]: m for m in METRICS}
+        metrics_dict = semantic_index().metrics
 
         # NUMERATOR
         numerator_params = metric["type_params"]["numerator"]
@@ -339,7 +307,7 @@ def model_to_cube_cube(model):
         cube_dim = dimension_to_cube(dim, model)
         cube['dimensions'].append(cube_dim)
 
-    for metric in METRICS:
+    for metric in semantic_index().metrics_for_model(model['name']):
 
         cube_measures = metric_to_cube_measures(metric, model)
 
@@ -1,9 +1,30 @@
+import sys
 import re
 import logging
 
+from .semantic_index import SemanticIndex, set_module_manifests, module_semantic_index
+from .sql_expression import translate_sql_expression, expression_cache
+
 SEMANTIC_MODELS = [] # Used by simple_metric_to_ldsh_measure()
 METRICS = []         # ""      metric_to_ldsh_measures(), model_to_ldsh_view()
 DBT_NODES = []       # ""      sql_expression_to_ldsh()
+SEMANTIC_INDEX = SemanticIndex() # Lookups over the above, see semantic_index()
+
+
+def set_manifests(metricflow_semantic_manifest, dbt_manifest, semantic_index=None):
+    """
+    Sets the module globals from the manifests, see semantic_index.set_module_manifests().
+    """
+    set_module_manifests(sys.modules[__name__], 'lightdash', metricflow_semantic_manifest, dbt_manifest,
+                         semantic_index=semantic_index)
+
+
+def semantic_index():
+    """
+    Returns the SemanticIndex for the module globals, see semantic_index.module_semantic_index().
+    """
+    return module_semantic_index(sys.modules[__name__])
+
 
 def sql_expression_to_ldsh(expression, from_model):
     """
@@ -17,50 +38,18 @@ def sql_expression_to_ldsh(expression, from_model):
     str: The Lightdash SQL expression.
     """
 
-    # Step 1: Replace unqualified table fields with ${TABLE}.field
-    if DBT_NODES:
-
-        node_dict = { node_data['relation_name']: node_data for node_name, node_data in DBT_NODES.items() }
-        node_for_model = node_dict[from_model['node_relation']['relation_name']]
-        node_columns  = node_for_model['columns'].keys()
-
-        # Pattern to match unqualified fields (words) not in {{ Dimension('...') }}
-        unqualified_field_pattern = r"\b(?!\{\{ Dimension\(')\w+\b"
-
-        def translate_unqualified_field(match):
-            if match.group(0) in node_columns:
-                return f"${{TABLE}}.{match.group(0)}"
-            else:
-                return match.group(0)
-
-        expression = re.sub(unqualified_field_pattern, translate_unqualified_field, expression)
-
-
-    # Step 2: Replace {{ Dimension('entity__dimension') }} with ${model.dimension}
-    dim_ref_pattern = r"\{\{\s*Dimension\s*\(\s*'([^']+?)'\s*\)\s*\}\}"
+    # Translations are cached per manifest (see sql_expression.ExpressionCache)
+    return expression_cache().translate('lightdash', expression, from_model, semantic_index(), _sql_expression_to_ldsh)
 
-    def translate_dim_ref(match):
-
-        dim_inner_ref = match.group(1)                # 'Dimension('delivery__delivery_rating')' -> 'delivery__delivery_rating'
-        entity_name = dim_inner_ref.split("__")[0]    # 'delivery__delivery_rating' -> 'delivery'
-        dimension_name = dim_inner_ref.split("__")[1] # 'delivery__delivery_rating' -> 'delivery_rating'
-
-         # Get model for entity
-         # TODO: Need to account for multiple models with the same entity identifier (see sql_expression_to_lkml() in to_looker.py)
-        model_for_entity = None
-        for model in SEMANTIC_MODELS:
-            for entity in model["entities"]:
-                if entity["name"] == entity_name and entity["type"] == 'primary':
-                    model_for_entity = model
-                    break
-
-        if model_for_entity['name'] == from_model['name']:
-            return "${" + dimension_name + "}"
-        else:
-            return "${" + f"{model_for_entity['name']}.{dimension_name}" + "}"
 
+def _sql_expression_to_ldsh(expression, from_model, index):
+    """
+    Helper translating an expression for sql_expression_to_ldsh() on a cache miss.
+    """
 
-    return re.sub(dim_ref_pattern, translate_dim_ref, expression.strip())
+    return translate_sql_expression(expression, from_model, index,
+                                    column_template="${{TABLE}}.{}",
+                                    field_template="${{{}}}")
 
 
 def measure_to_ldsh_sql(measure, from_model, where_filters):
@@ -107,12 +96,7 @@ def simple_metric_to_ldsh_measure(metric, from_model, additional_where_filters=[
     dict: The Lightdash measure.
     """
 
-    measures_dict = {}
-    for model in SEMANTIC_MODELS:
-        for measure in model["measures"]:
-            measures_dict[measure["name"]] = measure | {'parent_model': model['name']}
-
-    measure = measures_dict[metric["type_params"]["measure"]["name"]]
+    measure = semantic_index().measures[metric["type_params"]["measure"]["name"]]
 
     metric_where_filters = (metric.get("filter") or  {}).get("where_filters", [])
 
@@ -161,7 +145,7 @@ def metric_to_ldsh_measures(metric, from_model):
     elif metric["type"] == "ratio":
 
         metric_where_filters = (metric.get("filter") or  {}).get("where_filters", [])
-        metrics_dict = {m["name"]: m for m in METRICS}
+        metrics_dict = semantic_index().metrics
 
         # NUMERATOR
         numerator_params = metric["type_params"]["numerator"]
@@ -216,6 +200,104 @@ def metric_to_ldsh_measures(metric, from_model):
         return [ldsh_numerator, ldsh_denominator, ldsh_ratio]
 
 
+def entity_to_ldsh_column(entity, from_model):
+    """
+    Translates a MetricFlow entity to a hidden Lightdash dimension on a dbt model column.
+
+    Parameters:
+    entity (dict): The MetricFlow entity to be translated.
+    from_model (dict): The parent MetricFlow model for the entity.
+
+    Returns:
+    dict: The dbt column with the Lightdash dimension in its `meta`.
+    """
+
+    ldsh_dim = {"type": "string", "hidden": True}
+
+    if entity.get("label"):
+        ldsh_dim["label"] = entity["label"]
+
+    if entity.get("description"):
+        ldsh_dim["description"] = entity["description"]
+
+    if entity.get("expr"):
+        ldsh_dim["sql"] = sql_expression_to_ldsh(entity["expr"], from_model)
+
+    return {"name": entity["name"], "meta": {"dimension": ldsh_dim}}
+
+
+def time_granularity_to_time_intervals(time_granularity):
+    """
+    Helper converting MetricFlow time granularity to list of Lightdash time intervals, e.g. 'month' becomes ['MONTH', 'QUARTER', 'YEAR'].
+    """
+
+    time_granularities = ["day", "week", "month", "quarter", "year"]
+    return [grain.upper() for grain in time_granularities[time_granularities.index(time_granularity):]]
+
+
+def dimension_to_ldsh_column(dim, from_model):
+    """
+    Translates a MetricFlow dimension to a Lightdash dimension on a dbt model column.
+
+    Parameters:
+    dim (dict): The MetricFlow dimension to be translated.
+    from_model (dict): The parent MetricFlow model for the dimension.
+
+    Returns:
+    dict: The dbt column with the Lightdash dimension in its `meta`.
+    """
+
+    ldsh_dim = {}
+
+    if dim.get("type") == "time":
+        ldsh_dim["type"] = "timestamp"
+        if (dim.get("type_params") or {}).get("time_granularity"):
+            ldsh_dim["time_intervals"] = time_granularity_to_time_intervals(dim["type_params"]["time_granularity"])
+    else:
+        ldsh_dim["type"] = "string"
+
+    if dim.get("label"):
+        ldsh_dim["label"] = dim["label"]
+
+    if dim.get("description"):
+        ldsh_dim["description"] = dim["description"]
+
+    if dim.get("expr"):
+        ldsh_dim["sql"] = sql_expression_to_ldsh(dim["expr"], from_model)
+
+    return {"name": dim["name"], "meta": {"dimension": ldsh_dim}}
+
+
+def model_to_ldsh_model(model):
+    """
+    Translates a MetricFlow model to a dbt model definition for Lightdash: entities and dimensions become column
+    dimensions and the model's metrics become model-level Lightdash metrics. Merge the result into the project's
+    existing schema .yml with merge_dbt_yaml().
+    """
+
+    ldsh_model = {
+        "name": model['name'],
+        "meta": {"metrics": {}},
+        "columns": []
+    }
+
+    for entity in model['entities']:
+        ldsh_model['columns'].append(entity_to_ldsh_column(entity, model))
+
+    for dim in model['dimensions']:
+        ldsh_model['columns'].append(dimension_to_ldsh_column(dim, model))
+
+    for metric in semantic_index().metrics_for_model(model['name']):
+
+        for ldsh_measure in metric_to_ldsh_measures(metric, model):
+            if ldsh_measure.pop('parent_view') == model['name']:
+                if ldsh_measure.get('hidden') == 'yes':
+                    ldsh_measure['hidden'] = True # Lightdash expects a boolean
+                ldsh_model['meta']['metrics'][ldsh_measure.pop('name')] = ldsh_measure
+
+    return ldsh_model
+
+
 
 # ------------------------------------------------------------------------------------------------------------
 # The following code is used to merge DBT schema.yml files. This is a helpful utility for working with Lightdash
@@ -223,7 +305,6 @@ def metric_to_ldsh_measures(metric, from_model):
 # the translated dimension/metrics definitions and the existing model definitions are stored in separate files.
 # The solution is to merge the generated output with the existing .yml files using the merge_dbt_yaml() function below.
 
-from ruamel.yaml import YAML
 import copy
 
 def merge_dicts(d1, d2):
@@ -270,6 +351,8 @@ def merge_dbt_yaml(source_yaml_str, update_yaml_str):
         update_yaml_str (str): YAML string containing data to merge into the source data.
     """
 
+    from ruamel.yaml import YAML # Imported on first use to keep start-up fast
+
     yaml = YAML()
     yaml.preserve_quotes = True
     yaml.indent(mapping=2, sequence=4, offset=2)
@@ -1,27 +1,28 @@
 import sys
 import re
 import logging
-import os
+
+from .semantic_index import SemanticIndex, set_module_manifests, module_semantic_index, target_warehouse_type
+from .sql_expression import translate_sql_expression, expression_cache
 
 SEMANTIC_MODELS = [] # Used by sql_expression_to_lkml(), simple_metric_to_lkml_measure()
 METRICS = []         # ""      metric_to_lkml_measures(), model_to_lkml_view()
 DBT_NODES = []       # ""      sql_expression_to_lkml()
+SEMANTIC_INDEX = SemanticIndex() # Lookups over the above, see semantic_index()
 
-def set_manifests(metricflow_semantic_manifest, dbt_manifest):
+def set_manifests(metricflow_semantic_manifest, dbt_manifest, semantic_index=None):
     """
-    Sets the SEMANTIC_MODELS, METRICS and DBT_NODES globals from the MetricFlow semantic manifest and the DBT manifest.
-
-    Parameters:
-    metricflow_semantic_manifest (dict): The MetricFlow semantic manifest.
-    dbt_manifest (dict): The DBT manifest.
+    Sets the module globals from the manifests, see semantic_index.set_module_manifests().
     """
-    global SEMANTIC_MODELS
-    global METRICS
-    global DBT_NODES
+    set_module_manifests(sys.modules[__name__], 'looker', metricflow_semantic_manifest, dbt_manifest,
+                         semantic_index=semantic_index)
 
-    SEMANTIC_MODELS = metricflow_semantic_manifest.get('semantic_models', [])
-    METRICS = metricflow_semantic_manifest.get('metrics', [])
-    DBT_NODES = dbt_manifest.get('nodes', [])
+
+def semantic_index():
+    """
+    Returns the SemanticIndex for the module globals, see semantic_index.module_semantic_index().
+    """
+    return module_semantic_index(sys.modules[__name__])
 
 
 def sql_expression_to_lkml(expression, from_model):
@@ -36,57 +37,33 @@ def sql_expression_to_lkml(expression, from_model):
     str: The LookML SQL expression.
     """
 
-    expression = expression.strip()
-    expression = expression.replace('\n', ' ')
-
-    # Step 1: Replace unqualified table fields with ${TABLE}.field
-    if DBT_NODES:
-
-        node_dict = { node_data['relation_name']: node_data for node_name, node_data in DBT_NODES.items() }
-        node_for_model = node_dict[from_model['node_relation']['relation_name']]
-        node_columns  = node_for_model['columns'].keys()
-
-        # Pattern to match words in a string but treat {{...}} strings as a single word
-        unqualified_field_pattern = r"{{.*?}}|\b\w+\b"
-        def translate_unqualified_field(match):
-            if match.group(0) in node_columns:
-                return f"${{TABLE}}.{match.group(0)}"
-            else:
-                return match.group(0)
-
-        expression = re.sub(unqualified_field_pattern, translate_unqualified_field, expression)
-
-    # Step 2: Replace {{ Dimension('entity__dimension') }} with ${model.dimension}
-    dim_ref_pattern = r"\{\{\s*Dimension\s*\(\s*'([^']+?)'\s*\)\s*\}\}"
+    # Translations are cached per manifest (see sql_expression.ExpressionCache)
+    return expression_cache().translate('looker', expression, from_model, semantic_index(), _sql_expression_to_lkml)
 
-    def translate_dim_ref(match):
 
-        dim_inner_ref = match.group(1)                # 'Dimension('delivery__delivery_rating')' -> 'delivery__delivery_rating'
-        entity_name = dim_inner_ref.split("__")[0]    # 'delivery__delivery_rating' -> 'delivery'
-        dimension_name = dim_inner_ref.split("__")[1] # 'delivery__delivery_rating' -> 'delivery_rating'
+def _sql_expression_to_lkml(expression, from_model, index):
+    """
+    Helper translating an expression for sql_expression_to_lkml() on a cache miss.
+    """
 
-         # Get model for entity, dimension pair
-        model_for_dimension = None
-        for model in SEMANTIC_MODELS:
-            for entity in model["entities"]:
-                if entity["name"] == entity_name and entity["type"] == 'primary':
-                    if 'dimensions' in model:
-                        if any(dim['name'] == dimension_name for dim in model['dimensions']):
-                            model_for_dimension = model
-                            break
+    return translate_sql_expression(expression, from_model, index,
+                                    column_template="${{TABLE}}.{}",
+                                    field_template="${{{}}}",
+                                    translate_entities=True,
+                                    time_dimension_field=time_dimension_to_lkml_field,
+                                    single_line=True)
 
-        if model_for_dimension['name'] == from_model['name']:
-            return "${" + dimension_name + "}"
-        else:
-            return "${" + f"{model_for_dimension['name']}.{dimension_name}" + "}"
 
-    expression = re.sub(dim_ref_pattern, translate_dim_ref, expression.strip())
+def time_dimension_to_lkml_field(model, dimension_name, grain=None):
+    """
+    Helper returning the field of a LookML dimension group for a MetricFlow time dimension at a grain. E.g. ('ordered_at', 'day') becomes 'ordered_at_date'. Without a grain the dimension's own time granularity is used.
+    """
 
-    # Step 3: Replace {{ Entity('entity') }} with ${entity}
-    entity_pattern = r"\{\{\s*Entity\s*\(\s*'([^']+?)'\s*\)\s*\}\}"
-    expression = re.sub(entity_pattern, r"${\1}", expression)
+    if not grain:
+        dim = next((dim for dim in model.get("dimensions") or [] if dim["name"] == dimension_name), {})
+        grain = (dim.get("type_params") or {}).get("time_granularity") or 'day'
 
-    return expression
+    return f"{dimension_name}_{time_granularity_to_timeframes(grain)[0]}"
 
 
 def entity_to_lkml(entity, from_model):
@@ -241,12 +218,7 @@ def simple_metric_to_lkml_measure(metric, from_model, additional_where_filters=[
     dict: The LookML measure.
     """
 
-    measures_dict = {}
-    for model in SEMANTIC_MODELS:
-        for measure in model["measures"]:
-            measures_dict[measure["name"]] = measure | {'parent_model': model['name']}
-
-    measure = measures_dict[metric["type_params"]["measure"]["name"]]
+    measure = semantic_index().measures[metric["type_params"]["measure"]["name"]]
 
     metric_where_filters = (metric.get("filter") or  {}).get("where_filters", [])
 
@@ -296,7 +268,7 @@ def metric_to_lkml_measures(metric, from_model):
     elif metric["type"] == "ratio":
 
         metric_where_filters = (metric.get("filter") or  {}).get("where_filters", [])
-        metrics_dict = {m["name"]: m for m in METRICS}
+        metrics_dict = semantic_index().metrics
 
         lkml_measures = []
 
@@ -351,19 +323,10 @@ def metric_to_lkml_measures(metric, from_model):
         if metric.get("description"):
             lkml_ratio["description"] = metric["description"]
 
-        target_warehouse_type = os.getenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE")
-        if not target_warehouse_type:
-            logging.error("Warehouse type must be defined to translate ratio metrics. Supported warehouse types are BigQuery, Snowflake and Redshift.")
-            logging.info("Use `export MF_TRANSLATE_TARGET_WAREHOUSE_TYPE=bigquery|snowflake|redshift` to set the target warehouse type.")
-            sys.exit(1)
-
-        if target_warehouse_type.lower() == "bigquery":
+        if target_warehouse_type() == "bigquery":
             lkml_ratio["sql"] = f"cast(${{{numerator_name}}} as float64) / nullif(${{{denominator_name}}}, 0)"
-        elif target_warehouse_type.lower() in ["snowflake", 'redshift']:
+        else: # snowflake or redshift
             lkml_ratio["sql"] = f"${{{numerator_name}}}::double / nullif(${{{denominator_name}}}, 0)"
-        else:
-            logging.error(f"Unsupported value for MF_TRANSLATE_TARGET_WAREHOUSE_TYPE: {target_warehouse_type}. Supported values are bigquery, snowflake and redshift.")
-            sys.exit(1)
 
         if custom_lkml_numerator["parent_view"] != custom_lkml_denominator["parent_view"]:
             logging.debug(f"Skipped ratio metric {lkml_ratio['name']} - numerator and denominator from different models not supported.")
@@ -400,7 +363,7 @@ def model_to_lkml_view(model, view_name=None):
         else:
             lkml_view['dimensions'].append(lkml_dim)
 
-    for metric in METRICS:
+    for metric in semantic_index().metrics_for_model(model['name']):
 
         lkml_measures = metric_to_lkml_measures(metric, model)
 
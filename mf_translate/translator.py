@@ -0,0 +1,172 @@
+import io
+
+from . import to_looker, to_cube, to_ldsh
+from .semantic_index import SemanticIndex, ACTIVE_INDEX, ACTIVE_WAREHOUSE_TYPE, WAREHOUSE_TYPES
+from .sql_expression import ExpressionCache, ACTIVE_EXPRESSION_CACHE
+
+
+def _dump_yaml(data):
+    from ruamel.yaml import YAML
+
+    yaml = YAML()
+    yaml.indent(mapping=2, sequence=4, offset=2)
+    yaml.width = 4096 # Prevent line wrapping of SQL expressions
+    stream = io.StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+def model_to_lkml_text(model, view_name=None):
+    """
+    Translates a MetricFlow model to the text of a LookML view file, the view named `view_name` or after the model.
+    """
+    import lkml # Imported on first use to keep start-up fast
+
+    return lkml.dump({'views': [to_looker.model_to_lkml_view(model=model, view_name=view_name or model['name'])]})
+
+
+def model_to_cube_text(model, view_name=None):
+    """
+    Translates a MetricFlow model to the text of a Cube YAML file, the cube named `view_name` or after the model.
+    """
+    cube = to_cube.model_to_cube_cube(model)
+    if view_name:
+        cube['name'] = view_name
+    return _dump_yaml({'cubes': [cube]})
+
+
+def model_to_ldsh_text(model, view_name=None):
+    """
+    Translates a MetricFlow model to the text of a dbt YAML file for Lightdash. The dbt model is always named after the
+    semantic model, so `view_name` is ignored.
+    """
+    return _dump_yaml({'version': 2, 'models': [to_ldsh.model_to_ldsh_model(model)]})
+
+
+# Target dialect -> (translator module, file suffix, function translating a MetricFlow semantic model to file text)
+TARGETS = {
+    'looker': (to_looker, '.view.lkml', model_to_lkml_text),
+    'cube': (to_cube, '.yml', model_to_cube_text),
+    'lightdash': (to_ldsh, '.yml', model_to_ldsh_text),
+}
+
+
+class Translator:
+    """
+    Translates the models and metrics of one dbt project. Holds its own SemanticIndex and expression cache rather than
+    using the module globals set by set_manifests(), so one process can translate many projects at once:
+
+        translator = Translator(semantic_manifest, dbt_manifest)
+        lkml_view = translator.model_to_lkml_view('orders')
+
+    The index is immutable and the expression cache is locked, so a Translator can be shared between threads. While a
+    method runs, the translator's index, cache and warehouse type are made current for the calling thread only (via
+    contextvars), so the to_looker, to_cube and to_ldsh functions it calls resolve lookups against this project.
+
+    Models and metrics may be passed to the methods as MetricFlow definitions or by name.
+    """
+
+    def __init__(self, semantic_manifest, dbt_manifest, semantic_index=None, warehouse_type=None):
+        """
+        Parameters:
+        semantic_manifest (dict): The MetricFlow semantic manifest.
+        dbt_manifest (dict): The DBT manifest, or the projected manifest from manifest_cache.load_manifests().
+        semantic_index (SemanticIndex): Optional, a prebuilt index over the two manifests (e.g. from the manifest cache). Built if not provided.
+        warehouse_type (str): Optional, the project's warehouse (bigquery, snowflake or redshift), which the SQL of ratio metrics
+                              and Cube time zones depends on. Defaults to the MF_TRANSLATE_TARGET_WAREHOUSE_TYPE environment variable.
+        """
+
+        if warehouse_type and warehouse_type.lower() not in WAREHOUSE_TYPES:
+            raise ValueError(f"Unsupported warehouse type: {warehouse_type}. Supported values are bigquery, snowflake and redshift.")
+        self.warehouse_type = warehouse_type and warehouse_type.lower()
+
+        semantic_models = semantic_manifest.get('semantic_models', [])
+        metrics = semantic_manifest.get('metrics', [])
+        dbt_nodes = dbt_manifest.get('nodes', [])
+
+        if semantic_index and semantic_index.is_built_from(semantic_models, metrics, dbt_nodes):
+            self.semantic_index = semantic_index
+        else:
+            self.semantic_index = SemanticIndex(semantic_models, metrics, dbt_nodes)
+        self.expression_cache = ExpressionCache()
+
+    def _call(self, function, *args, **kwargs):
+        """
+        Helper calling a translator module function with this translator's index and cache current in the calling thread.
+        """
+
+        index_token = ACTIVE_INDEX.set(self.semantic_index)
+        cache_token = ACTIVE_EXPRESSION_CACHE.set(self.expression_cache)
+        warehouse_token = ACTIVE_WAREHOUSE_TYPE.set(self.warehouse_type)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            ACTIVE_WAREHOUSE_TYPE.reset(warehouse_token)
+            ACTIVE_EXPRESSION_CACHE.reset(cache_token)
+            ACTIVE_INDEX.reset(index_token)
+
+    def _model(self, model):
+        return self.semantic_index.models[model] if isinstance(model, str) else model
+
+    def _metric(self, metric):
+        return self.semantic_index.metrics[metric] if isinstance(metric, str) else metric
+
+    def model_to_text(self, model, target, view_name=None):
+        """
+        Translates a MetricFlow model to the text of a file in a target dialect (see TARGETS), e.g. a LookML view.
+        """
+        return self._call(TARGETS[target][2], self._model(model), view_name=view_name)
+
+    def model_to_lkml_view(self, model, view_name=None):
+        """
+        Translates a MetricFlow model to a LookML view, see to_looker.model_to_lkml_view().
+        """
+        return self._call(to_looker.model_to_lkml_view, self._model(model), view_name=view_name)
+
+    def model_to_cube_cube(self, model):
+        """
+        Translates a MetricFlow model to a Cube cube, see to_cube.model_to_cube_cube().
+        """
+        return self._call(to_cube.model_to_cube_cube, self._model(model))
+
+    def model_to_ldsh_model(self, model):
+        """
+        Translates a MetricFlow model to a dbt model with Lightdash dimensions and metrics, see to_ldsh.model_to_ldsh_model().
+        """
+        return self._call(to_ldsh.model_to_ldsh_model, self._model(model))
+
+    def metric_to_lkml_measures(self, metric, model):
+        """
+        Translates a MetricFlow metric to LookML measures, see to_looker.metric_to_lkml_measures().
+        """
+        return self._call(to_looker.metric_to_lkml_measures, self._metric(metric), self._model(model))
+
+    def metric_to_cube_measures(self, metric, model):
+        """
+        Translates a MetricFlow metric to Cube measures, see to_cube.metric_to_cube_measures().
+        """
+        return self._call(to_cube.metric_to_cube_measures, self._metric(metric), self._model(model))
+
+    def metric_to_ldsh_measures(self, metric, model):
+        """
+        Translates a MetricFlow metric to Lightdash measures, see to_ldsh.metric_to_ldsh_measures().
+        """
+        return self._call(to_ldsh.metric_to_ldsh_measures, self._metric(metric), self._model(model))
+
+    def sql_expression_to_lkml(self, expression, model):
+        """
+        Translates a MetricFlow SQL expression to a LookML SQL expression, see to_looker.sql_expression_to_lkml().
+        """
+        return self._call(to_looker.sql_expression_to_lkml, expression, self._model(model))
+
+    def sql_expression_to_cube(self, expression, model):
+        """
+        Translates a MetricFlow SQL expression to a Cube SQL expression, see to_cube.sql_expression_to_cube().
+        """
+        return self._call(to_cube.sql_expression_to_cube, expression, self._model(model))
+
+    def sql_expression_to_ldsh(self, expression, model):
+        """
+        Translates a MetricFlow SQL expression to a Lightdash SQL expression, see to_ldsh.sql_expression_to_ldsh().
+        """
+        return self._call(to_ldsh.sql_expression_to_ldsh, expression, self._model(model))
@@ -4,13 +4,17 @@ setup(
     name='mf-translate',
     version='0.1',
     py_modules=['mf_translate', 'mf_compare_query'],
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=[
         'pandas>=1.5.0,<2.3.0',
         'tabulate>=0.9.0,<1.0.0',
         'looker-sdk>=23.0.0,<25.0.0',
         'lkml>=1.3.0,<1.4.0',
+        'ruamel.yaml>=0.17.0,<1.0.0',
     ],
+    extras_require={
+        'duckdb': ['duckdb>=0.9.0'],
+    },
     entry_points={
         'console_scripts': [
             'mf-translate=mf_translate:main',
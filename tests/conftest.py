@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 import looker_sdk
 import subprocess
 from pathlib import Path
+import mf_translate
+from mf_translate.translator import TARGETS
 
 
 @pytest.fixture(scope="session")
@@ -25,4 +27,105 @@ def setup_looker_sdk():
 
 @pytest.fixture
 def test_dir(request):
-    return Path(request.fspath).parent.resolve()
\ No newline at end of file
+    return Path(request.fspath).parent.resolve()
+
+
+def synthetic_manifests(num_models, metrics_per_model=5):
+    """
+    Builds a MetricFlow semantic manifest and matching DBT manifest for a synthetic project. Each model has a primary
+    entity, a foreign entity pointing at the previous model, a few dimensions and `metrics_per_model` simple metrics
+    plus one ratio metric. Every other simple metric is filtered on a dimension of the previous model so that
+    expression translation is exercised.
+
+    Parameters:
+    num_models (int): The number of semantic models to generate.
+    metrics_per_model (int): The number of simple metrics per model.
+
+    Returns:
+    tuple: (semantic_manifest, dbt_manifest) dicts.
+    """
+
+    semantic_models = []
+    metrics = []
+    nodes = {}
+
+    for i in range(num_models):
+
+        name = f"model_{i}"
+        relation_name = f"`db`.`schema`.`{name}`"
+        parent = f"model_{i - 1}" if i > 0 else None
+
+        entities = [{"name": f"{name}_id", "type": "primary"}]
+        if parent:
+            entities.append({"name": f"{parent}_id", "type": "foreign"})
+
+        semantic_models.append({
+            "name": name,
+            "node_relation": {"relation_name": relation_name},
+            "entities": entities,
+            "dimensions": [
+                {"name": f"{name}_status", "type": "categorical"},
+                {"name": f"{name}_created_at", "type": "time", "type_params": {"time_granularity": "day"}},
+            ],
+            "measures": [
+                {"name": f"{name}_measure_{j}", "agg": "sum", "expr": f"amount_{j} * 0.1"}
+                for j in range(metrics_per_model)
+            ],
+        })
+
+        nodes[f"model.project.{name}"] = {
+            "relation_name": relation_name,
+            "columns": {f"amount_{j}": {} for j in range(metrics_per_model)} | {f"{name}_status": {}},
+        }
+
+        for j in range(metrics_per_model):
+            metric = {
+                "name": f"{name}_metric_{j}",
+                "label": f"{name} metric {j}",
+                "description": "",
+                "type": "simple",
+                "type_params": {
+                    "measure": {"name": f"{name}_measure_{j}"},
+                    "input_measures": [{"name": f"{name}_measure_{j}"}],
+                },
+            }
+            if parent and j % 2:
+                metric["filter"] = {"where_filters": [
+                    {"where_sql_template": f"{{{{ Dimension('{parent}_id__{parent}_status') }}}} = 'complete'"}
+                ]}
+            metrics.append(metric)
+
+        metrics.append({
+            "name": f"{name}_ratio",
+            "label": f"{name} ratio",
+            "description": "",
+            "type": "ratio",
+            "type_params": {
+                "numerator": {"name": f"{name}_metric_0"},
+                "denominator": {"name": f"{name}_metric_{metrics_per_model - 1}"},
+                "input_measures": [{"name": f"{name}_measure_0"},
+                                   {"name": f"{name}_measure_{metrics_per_model - 1}"}],
+            },
+        })
+
+    return {"semantic_models": semantic_models, "metrics": metrics}, {"nodes": nodes}
+
+
+@pytest.fixture
+def synthetic_project(monkeypatch):
+    """
+    Returns a factory of synthetic projects, see synthetic_manifests(). Each project's manifests are set for
+    translation to `targets` (unless `set_manifests` is False) on a Snowflake warehouse. The manifests of every target
+    are reset in teardown, so a failing test does not leak them into later tests.
+    """
+
+    monkeypatch.setenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE", "snowflake")
+
+    def make(num_models, metrics_per_model=5, targets=('looker',), set_manifests=True):
+        semantic_manifest, dbt_manifest = synthetic_manifests(num_models, metrics_per_model=metrics_per_model)
+        if set_manifests:
+            mf_translate.set_manifests(semantic_manifest, dbt_manifest, targets=targets)
+        return semantic_manifest, dbt_manifest
+
+    yield make
+    mf_translate.set_manifests({}, {}, targets=tuple(TARGETS))
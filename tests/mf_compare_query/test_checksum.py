@@ -0,0 +1,100 @@
+import pandas as pd
+from mf_translate.semantic_index import SemanticIndex
+from mf_compare_query import checksum, to_looker
+
+semantic_models = [
+    {
+        "name": "orders",
+        "entities": [{"name": "order_id", "type": "primary"}],
+        "dimensions": [
+            {"name": "status", "type": "categorical"},
+            {"name": "ordered_at", "type": "time", "type_params": {"time_granularity": "day"}}
+        ],
+        "measures": [{"name": "order_total", "agg": "sum"}]
+    }
+]
+
+metrics = [{"name": "order_total", "type": "simple", "type_params": {"input_measures": [{"name": "order_total"}]}}]
+
+index = SemanticIndex(semantic_models, metrics)
+
+PERIODS = {'day': 'D', 'month': 'M', 'year': 'Y'}
+
+
+def daily_orders():
+    days = pd.date_range('2023-01-01', '2024-12-31', freq='D')
+    return pd.DataFrame({'ordered_at': days.repeat(2), 'status': ['completed', 'returned'] * len(days), 'total': 1.0})
+
+
+def fake_query_results(metricflow_orders, looker_orders, calls):
+    """
+    Aggregates each side's daily orders by the grain of the query's time dimension, filtered to the Looker filter's
+    date ranges, recording the grain and filter of each call.
+    """
+
+    def aggregate(orders, group_by, looker_filters):
+        grain = group_by[0].split('__')[-1]
+        if looker_filters:
+            in_ranges = pd.Series(False, index=orders.index)
+            for date_range in looker_filters['orders.ordered_at_date'].split(','):
+                start, end = (pd.Timestamp(date.replace('/', '-')) for date in date_range.split(' to '))
+                in_ranges |= (orders['ordered_at'] >= start) & (orders['ordered_at'] < end)
+            orders = orders[in_ranges]
+        periods = orders['ordered_at'].dt.to_period(PERIODS[grain]).dt.start_time
+        results = orders.groupby([periods, orders['status']])['total'].sum().reset_index()
+        results.columns = ['orders.ordered_at', 'orders.status', 'orders.order_total']
+        return results.astype({'orders.status': 'string', 'orders.order_total': 'Float64'})
+
+    def query_results(group_by, where, looker_filters):
+        calls.append((group_by[0], where, looker_filters))
+        return aggregate(metricflow_orders, group_by, looker_filters), aggregate(looker_orders, group_by, looker_filters)
+
+    return query_results
+
+
+def test_matching_results_only_compare_the_coarsest_grain(monkeypatch):
+
+    monkeypatch.setattr(to_looker, 'SEMANTIC_MODELS', semantic_models)
+    monkeypatch.setattr(to_looker, 'METRICS', metrics)
+    calls = []
+    orders = daily_orders()
+
+    assert checksum.compare_hierarchically(['order_total'], ['order_id__ordered_at__day', 'order_id__status'], index,
+                                           fake_query_results(orders, orders.copy(), calls))
+    assert [call[0] for call in calls] == ['order_id__ordered_at__year']
+
+
+def test_differences_are_drilled_into(monkeypatch):
+
+    monkeypatch.setattr(to_looker, 'SEMANTIC_MODELS', semantic_models)
+    monkeypatch.setattr(to_looker, 'METRICS', metrics)
+    calls = []
+    metricflow_orders = daily_orders()
+    looker_orders = metricflow_orders.copy()
+    looker_orders.loc[(looker_orders['ordered_at'] == '2024-03-05') & (looker_orders['status'] == 'returned'), 'total'] = 2.0
+
+    assert not checksum.compare_hierarchically(['order_total'], ['order_id__ordered_at__day', 'order_id__status'], index,
+                                               fake_query_results(metricflow_orders, looker_orders, calls),
+                                               where="{{ Dimension('order_id__status') }} != 'placed'")
+
+    assert [call[0] for call in calls] == ['order_id__ordered_at__year', 'order_id__ordered_at__month', 'order_id__ordered_at__day']
+    assert calls[1][2] == {'orders.ordered_at_date': '2024/01/01 to 2025/01/01'}
+    assert calls[2][2] == {'orders.ordered_at_date': '2024/03/01 to 2024/04/01'}
+    assert calls[2][1] == ("({{ Dimension('order_id__status') }} != 'placed') AND "
+                           "(({{ TimeDimension('order_id__ordered_at', 'day') }} >= '2024-03-01' AND "
+                           "{{ TimeDimension('order_id__ordered_at', 'day') }} < '2024-04-01'))")
+
+
+def test_queries_without_a_time_dimension_are_not_partitioned():
+
+    assert checksum.compare_hierarchically(['order_total'], ['order_id__status'], index, None) is None
+    assert checksum.compare_hierarchically(['order_total'], ['metric_time__day'], index, None) is None
+
+
+def test_levels_and_ranges():
+
+    assert checksum.time_group_by(['order_id__status', 'order_id__ordered_at'], index) == (1, 'order_id__ordered_at', 'day')
+    assert checksum.checksum_levels('day') == ['year', 'month']
+    assert checksum.checksum_levels('month', ['month', 'quarter', 'year']) == ['year', 'quarter']
+    assert checksum.partition_ranges(['2024-02-01', '2024-01-01', '2024-06-01'], 'month') == \
+        [(pd.Timestamp('2024-01-01'), pd.Timestamp('2024-03-01')), (pd.Timestamp('2024-06-01'), pd.Timestamp('2024-07-01'))]
@@ -0,0 +1,80 @@
+import time
+import argparse
+import threading
+import pytest
+import pandas as pd
+import mf_compare_query
+import mf_compare_query.to_looker as to_looker
+from mf_compare_query.phases import PhaseTimer
+
+
+def make_args(**overrides):
+    args = {'metrics': ['order_total'], 'group_by': None, 'where': None, 'to_looker_explore': 'orders',
+            'looker_filters': None, 'looker_dev_branch': None, 'force_parse': False, 'manifest_dir': 'target', 'explore_cache_ttl': 0,
+            'tolerances': None, 'top_n': 10, 'order_by': None, 'streaming': False, 'memory_limit': 512, 'spill_dir': None, 'pushdown': False, 'warehouse': None,
+            'checksum': False, 'checksum_grains': None}
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+@pytest.fixture
+def fake_phases(monkeypatch):
+    """
+    Replaces each phase with one that sleeps, recording which phases were running at the same time.
+    """
+
+    running = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def phase(name, seconds, result=None):
+        def run(*args, **kwargs):
+            with lock:
+                overlaps.extend((name, other) for other in running)
+                running.add(name)
+            time.sleep(seconds)
+            with lock:
+                running.discard(name)
+            return result
+        return run
+
+    results = pd.DataFrame({'orders.order_total': [10]})
+    monkeypatch.setattr(mf_compare_query, 'parse_project', phase('dbt_parse', 0.2))
+    monkeypatch.setattr(to_looker, 'connect_looker', phase('looker_connect', 0.1, ('sdk', 'model', {'orders.order_total'})))
+    monkeypatch.setattr(to_looker, 'query_metricflow', phase('metricflow_query', 0.3, results.copy()))
+    monkeypatch.setattr(to_looker, 'run_looker_query', phase('looker_query', 0.1, results.copy()))
+    return overlaps
+
+
+def test_independent_phases_run_concurrently(fake_phases):
+
+    timer = PhaseTimer()
+    start = time.perf_counter()
+
+    assert mf_compare_query.compare_query(make_args(), timer=timer)
+
+    assert ('dbt_parse', 'looker_connect') in fake_phases
+    assert {('metricflow_query', 'looker_query'), ('looker_query', 'metricflow_query')} & set(fake_phases)
+    assert time.perf_counter() - start < 0.2 + 0.3 + 0.15 # Rather than the 0.7s sum of the phases
+    assert timer.critical_path() == ['dbt_parse', 'metricflow_query', 'compare']
+
+
+def test_looker_connection_failure_exits(fake_phases, monkeypatch):
+
+    def connect_looker(*args, **kwargs):
+        raise SystemExit(1)
+    monkeypatch.setattr(to_looker, 'connect_looker', connect_looker)
+
+    with pytest.raises(SystemExit):
+        mf_compare_query.compare_query(make_args())
+
+
+def test_critical_path_follows_latest_dependency():
+
+    timer = PhaseTimer()
+    timer.phases = {'a': {'start': 0.0, 'end': 1.0, 'depends_on': ()},
+                    'b': {'start': 0.0, 'end': 2.0, 'depends_on': ()},
+                    'c': {'start': 2.0, 'end': 2.5, 'depends_on': ('a', 'b')},
+                    'd': {'start': 1.0, 'end': 2.2, 'depends_on': ('a',)}}
+
+    assert timer.critical_path() == ['b', 'c']
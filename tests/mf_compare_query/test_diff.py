@@ -0,0 +1,112 @@
+import pytest
+import pandas as pd
+from mf_compare_query import diff, to_looker
+
+
+def results(statuses, totals, counts):
+    return pd.DataFrame({'orders.status': pd.array(statuses, dtype='string'),
+                         'orders.total': pd.array(totals, dtype='Float64'),
+                         'orders.count': pd.array(counts, dtype='Int64')})
+
+
+def test_rows_are_joined_on_their_keys():
+
+    metricflow = results(['completed', 'returned', 'placed'], [10.0, 20.0, 30.0], [1, 2, 3])
+    looker = results(['placed', 'completed', 'returned'], [30.0, 10.0, 20.0], [3, 1, 2])
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1)
+
+    assert comparison['passed']
+    assert (comparison['matched'], comparison['value_mismatches'], comparison['metricflow_only'], comparison['looker_only']) == (3, 0, 0, 0)
+
+
+def test_float_noise_matches_within_the_default_tolerance():
+
+    metricflow = results(['completed'], [0.1 + 0.2], [1])
+    looker = results(['completed'], [0.3], [1])
+
+    assert diff.diff_results(metricflow, looker, key_count=1)['passed']
+
+
+def test_per_metric_tolerances():
+
+    metricflow = results(['completed', 'returned'], [100.0, 200.0], [10, 20])
+    looker = results(['completed', 'returned'], [100.5, 201.0], [10, 21])
+
+    tolerances = diff.column_tolerances(['total', 'count'], list(looker.columns), 1, {'total': {'rel': 0.005}})
+    assert tolerances == {'orders.total': (0.0, 0.005)}
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1, tolerances=tolerances)
+    assert comparison['matched'] == 1 # The returned row's count differs
+    assert comparison['deviations'][['orders.status', 'column', 'abs_diff']].values.tolist() == [['returned', 'orders.count', 1.0]]
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1, tolerances={'orders.total': (1.0, 0.0), 'orders.count': (1.0, 0.0)})
+    assert comparison['passed']
+
+
+def test_invalid_tolerances():
+
+    with pytest.raises(ValueError):
+        diff.parse_tolerance('a lot')
+    with pytest.raises(ValueError):
+        diff.parse_tolerance({'absolute': 1})
+    with pytest.raises(ValueError):
+        diff.column_tolerances(['total'], ['orders.total'], 0, {'revenue': 1})
+
+
+def test_nulls_equal_nulls_only():
+
+    metricflow = results([None, 'completed', 'returned'], [10.0, None, 20.0], [1, 2, None])
+    looker = results([None, 'completed', 'returned'], [10.0, None, 20.0], [1, 2, 0])
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1)
+
+    assert comparison['matched'] == 2
+    assert comparison['value_mismatches'] == 1
+    assert comparison['deviations']['orders.status'].tolist() == ['returned']
+
+
+def test_rows_missing_from_either_result():
+
+    metricflow = results(['completed', 'returned'], [10.0, 20.0], [1, 2])
+    looker = results(['completed', 'placed', 'shipped'], [10.0, 30.0, 40.0], [1, 3, 4])
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1)
+
+    assert not comparison['passed']
+    assert (comparison['matched'], comparison['metricflow_only'], comparison['looker_only']) == (1, 1, 2)
+    assert comparison['metricflow_only_rows']['orders.status'].tolist() == ['returned']
+    assert comparison['looker_only_rows']['orders.status'].tolist() == ['placed', 'shipped']
+
+
+def test_rows_without_keys_and_duplicate_keys():
+
+    metricflow = pd.DataFrame({'orders.total': pd.array([10.0], dtype='Float64')})
+    assert diff.diff_results(metricflow, metricflow.copy(), key_count=0)['passed']
+
+    # A duplicated key is matched once per occurrence
+    metricflow = results(['completed', 'completed'], [10.0, 10.0], [1, 1])
+    looker = results(['completed'], [10.0], [1])
+    comparison = diff.diff_results(metricflow, looker, key_count=1)
+    assert (comparison['matched'], comparison['metricflow_only'], comparison['looker_only']) == (1, 1, 0)
+
+
+def test_largest_deviations_first():
+
+    metricflow = results(list('abcde'), [1.0, 2.0, 3.0, 4.0, 5.0], [1, 1, 1, 1, 1])
+    looker = results(list('abcde'), [1.5, 12.0, 3.0, 7.0, 5.0], [1, 1, 1, 1, 1])
+
+    comparison = diff.diff_results(metricflow, looker, key_count=1, top_n=2)
+
+    assert comparison['value_mismatches'] == 3
+    assert comparison['deviations']['orders.status'].tolist() == ['b', 'd']
+    assert comparison['deviations']['abs_diff'].tolist() == [10.0, 3.0]
+
+
+def test_do_query_results_match_infers_the_key_columns():
+
+    metricflow = results(['completed', 'returned'], [10.0, 20.0], [1, 2])
+    looker = results(['returned', 'completed'], [20.0, 10.0], [2, 1])
+
+    assert to_looker.do_query_results_match(metricflow, looker)
+    assert not to_looker.do_query_results_match(metricflow, looker.assign(**{'orders.count': [2, 5]}))
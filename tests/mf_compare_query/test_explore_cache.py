@@ -0,0 +1,71 @@
+import json
+import types
+import pytest
+import looker_sdk
+import mf_compare_query.to_looker as to_looker
+from mf_compare_query import explore_cache
+
+
+class FakeSDK:
+
+    def __init__(self):
+        self.auth = types.SimpleNamespace(settings=types.SimpleNamespace(base_url='https://looker.example.com'),
+                                          authenticate=lambda transport_options: {})
+        self.metadata_calls = 0
+
+    def lookml_model_explore(self, lookml_model_name, explore_name, fields=None):
+        self.metadata_calls += 1
+        field = lambda name: types.SimpleNamespace(name=name)
+        return types.SimpleNamespace(fields=types.SimpleNamespace(dimensions=[field(f'{explore_name}.status')],
+                                                                  measures=[field(f'{explore_name}.order_total')]))
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(to_looker, 'LOOKER_SESSIONS', {})
+    explore_cache.clear_memory_cache()
+    yield
+    explore_cache.clear_memory_cache()
+
+
+def test_looker_session_is_reused(monkeypatch):
+
+    sdks = []
+    monkeypatch.setattr(looker_sdk, 'init40', lambda: sdks.append(FakeSDK()) or sdks[-1])
+    monkeypatch.setenv('LOOKERSDK_BASE_URL', 'https://looker.example.com')
+    monkeypatch.setenv('MF_TRANSLATE_LOOKER_MODEL', 'jaffle_shop')
+
+    assert to_looker.looker_session() == to_looker.looker_session() == (sdks[0], 'jaffle_shop')
+    assert len(sdks) == 1
+
+
+def test_explore_fields_are_cached_on_disk(tmp_path):
+
+    sdk = FakeSDK()
+    fields = to_looker.fetch_explore_fields(sdk, 'jaffle_shop', 'orders', cache_dir=str(tmp_path))
+
+    assert fields == {'orders.status', 'orders.order_total'}
+    assert to_looker.fetch_explore_fields(sdk, 'jaffle_shop', 'orders', cache_dir=str(tmp_path)) == fields
+    assert sdk.metadata_calls == 1
+
+    # A new process reads the cache file
+    explore_cache.clear_memory_cache()
+    assert to_looker.fetch_explore_fields(FakeSDK(), 'jaffle_shop', 'orders', cache_dir=str(tmp_path)) == fields
+
+    # The dev branch is part of the key, and a ttl of 0 disables the cache
+    to_looker.fetch_explore_fields(sdk, 'jaffle_shop', 'orders', dev_branch='dev-feature', cache_dir=str(tmp_path))
+    to_looker.fetch_explore_fields(sdk, 'jaffle_shop', 'orders', cache_dir=str(tmp_path), ttl=0)
+    assert sdk.metadata_calls == 3
+
+
+def test_expired_explore_fields_are_fetched_again(tmp_path):
+
+    key = explore_cache.explore_key('https://looker.example.com', 'jaffle_shop', 'orders')
+    with open(tmp_path / explore_cache.EXPLORE_CACHE_FILE, 'w') as f:
+        json.dump({'version': explore_cache.EXPLORE_CACHE_VERSION,
+                   'entries': {key: {'fetched_at': 0, 'fields': ['orders.stale']}}}, f)
+
+    sdk = FakeSDK()
+    assert to_looker.fetch_explore_fields(sdk, 'jaffle_shop', 'orders', cache_dir=str(tmp_path)) == \
+        {'orders.status', 'orders.order_total'}
+    assert sdk.metadata_calls == 1
@@ -0,0 +1,81 @@
+import sys
+import textwrap
+import pytest
+import mf_compare_query.to_looker as to_looker
+from mf_compare_query.mf_worker import MetricFlowWorker, MetricFlowWorkerPool, MetricFlowWorkerError, \
+    MetricFlowWorkerUnavailable
+from mf_compare_query.result_types import read_metricflow_results
+
+# Stands in for MetricFlow: answers each query with one row, a group by value and the worker's process id per metric
+FAKE_WORKER = textwrap.dedent("""
+    import os, json, types
+    from mf_compare_query.mf_worker import serve, write_results
+
+    def query(request):
+        if request['metrics'] == ['unknown']:
+            raise ValueError('Unknown metric')
+        table = types.SimpleNamespace(column_names=(request['group_by'] or []) + request['metrics'],
+                                      rows=[['1'] * len(request['group_by'] or []) + [os.getpid()] * len(request['metrics'])])
+        write_results(table, request['path'], request['format'])
+
+    print(json.dumps({'ready': True}), flush=True)
+    serve(query)
+""")
+
+UNAVAILABLE_WORKER = "import json; print(json.dumps({'ready': False, 'error': 'ImportError: dbt_metricflow'}))"
+
+
+@pytest.fixture
+def fake_pool():
+    pool = MetricFlowWorkerPool(2, command=[sys.executable, '-c', FAKE_WORKER])
+    yield pool
+    pool.close()
+
+
+def test_worker_answers_many_queries(tmp_path, fake_pool):
+
+    worker = fake_pool.workers[0]
+    for query in range(3):
+        worker.query(['revenue', 'orders'], results_path=str(tmp_path / 'results'), result_format='pickle')
+        results = read_metricflow_results(str(tmp_path / 'results'), 'pickle')
+        assert results.values.tolist() == [[worker.process.pid] * 2] # The same process each time
+
+    with pytest.raises(MetricFlowWorkerError, match='Unknown metric'):
+        worker.query(['unknown'], results_path=str(tmp_path / 'results'))
+
+
+def test_query_metricflow_uses_workers(tmp_path, fake_pool, monkeypatch):
+
+    monkeypatch.setattr(to_looker, 'METRICFLOW_WORKERS', fake_pool)
+    monkeypatch.setattr(to_looker.subprocess, 'run', lambda *args, **kwargs: pytest.fail("`mf query` was run"))
+
+    results = to_looker.query_metricflow(['revenue'], group_by=['order_id'], results_path=str(tmp_path / 'results'))
+
+    assert results.shape == (1, 2)
+    assert list(results.dtypes.astype(str)) == ['string', 'Float64'] # Typed as an entity and a metric
+    assert results['column_1'][0] == '1'
+
+    with pytest.raises(SystemExit):
+        to_looker.query_metricflow(['unknown'], results_path=str(tmp_path / 'results.csv'))
+
+
+def test_unavailable_workers_fall_back_to_mf_query(tmp_path, monkeypatch):
+
+    pool = MetricFlowWorkerPool(1, command=[sys.executable, '-c', UNAVAILABLE_WORKER])
+    monkeypatch.setattr(to_looker, 'METRICFLOW_WORKERS', pool)
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        with open(command[-1], 'w') as f:
+            f.write('1\n')
+        return type('Result', (), {'returncode': 0, 'stdout': ''})()
+    monkeypatch.setattr(to_looker.subprocess, 'run', run)
+
+    with pytest.raises(MetricFlowWorkerUnavailable):
+        pool.query(['revenue'], results_path=str(tmp_path / 'results.csv'))
+    assert not pool.available
+
+    assert to_looker.query_metricflow(['revenue'], results_path=str(tmp_path / 'results.csv')).shape == (1, 1)
+    assert commands[0][:2] == ['mf', 'query']
+    pool.close()
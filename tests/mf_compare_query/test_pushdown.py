@@ -0,0 +1,160 @@
+import sys
+import types
+import argparse
+import pytest
+import pandas as pd
+import mf_compare_query
+from mf_compare_query import pushdown, to_looker
+from mf_compare_query.diff import DIFF_COUNTS
+
+duckdb = pytest.importorskip('duckdb')
+
+GROUP_BY = ['order_id__ordered_at__month', 'order_id__status']
+KINDS = ['datetime', 'string', 'float']
+COLUMNS = ['orders.ordered_at_month', 'orders.status', 'orders.order_total']
+
+# MetricFlow returns the period's first timestamp, Looker the month as text
+METRICFLOW_SQL = """SELECT DATE_TRUNC('month', ordered_at) AS order_id__ordered_at__month, status AS order_id__status, SUM(total) AS order_total
+FROM orders GROUP BY 1, 2"""
+LOOKER_SQL = """SELECT strftime(ordered_at, '%Y-%m') AS "orders.ordered_at_month", status AS "orders.status", SUM(total) AS "orders.order_total"
+FROM {table} GROUP BY 1, 2 ORDER BY 1"""
+
+
+@pytest.fixture
+def connection():
+    """
+    Orders of each day of 2024 Q1, and a copy Looker queries that differs on 3 February and has no March orders.
+    """
+
+    connection = duckdb.connect()
+    connection.execute("""CREATE TABLE orders AS
+        SELECT DATE '2024-01-01' + CAST(i AS INTEGER) AS ordered_at, CASE WHEN i % 2 = 0 THEN 'completed' ELSE 'returned' END AS status,
+               i * 1.5 AS total
+        FROM range(0, 91) AS days(i)""")
+    connection.execute("""CREATE TABLE looker_orders AS
+        SELECT ordered_at, status, CASE WHEN ordered_at = DATE '2024-02-03' THEN total + 1 ELSE total END AS total
+        FROM orders WHERE ordered_at < DATE '2024-03-01'""")
+    yield connection
+    connection.close()
+
+
+def counts(diff):
+    return {count: diff[count] for count in DIFF_COUNTS}
+
+
+def test_matching_results(connection):
+
+    diff = pushdown.run_pushdown_diff(connection, METRICFLOW_SQL, LOOKER_SQL.format(table='orders'), GROUP_BY, KINDS,
+                                      COLUMNS, metric_count=1)
+
+    assert diff['passed']
+    assert counts(diff) == {'matched': 6, 'value_mismatches': 0, 'metricflow_only': 0, 'looker_only': 0}
+
+
+def test_differences_are_fetched(connection):
+
+    diff = pushdown.run_pushdown_diff(connection, METRICFLOW_SQL, LOOKER_SQL.format(table='looker_orders'), GROUP_BY,
+                                      KINDS, COLUMNS, metric_count=1, top_n=1)
+
+    assert not diff['passed']
+    assert counts(diff) == {'matched': 3, 'value_mismatches': 1, 'metricflow_only': 2, 'looker_only': 0}
+    assert diff['deviations'][['orders.status', 'column', 'metricflow', 'looker']].values.tolist() == \
+        [['returned', 'orders.order_total', 1012.5, 1013.5]]
+    assert diff['metricflow_only_rows']['orders.ordered_at_month'].tolist() == [pd.Timestamp('2024-03-01')]
+    assert diff['looker_only_rows'].empty
+
+
+def test_tolerances(connection):
+
+    diff = pushdown.run_pushdown_diff(connection, METRICFLOW_SQL, LOOKER_SQL.format(table='looker_orders'), GROUP_BY,
+                                      KINDS, COLUMNS, metric_count=1, tolerances={'orders.order_total': (1.0, 0.0)})
+
+    assert counts(diff) == {'matched': 4, 'value_mismatches': 0, 'metricflow_only': 2, 'looker_only': 0}
+
+
+def test_null_keys_and_values_match(connection):
+
+    sql = "SELECT NULL AS status, CAST(NULL AS DOUBLE) AS total UNION ALL SELECT 'completed', 1.5"
+    diff = pushdown.run_pushdown_diff(connection, sql, sql, ['order_id__status'], ['string', 'float'],
+                                      ['orders.status', 'orders.order_total'], metric_count=1)
+
+    assert diff['passed']
+    assert diff['matched'] == 2
+
+    looker_sql = "SELECT NULL AS status, 2.0 AS total UNION ALL SELECT 'completed', 1.5"
+    diff = pushdown.run_pushdown_diff(connection, sql, looker_sql, ['order_id__status'], ['string', 'float'],
+                                      ['orders.status', 'orders.order_total'], metric_count=1)
+
+    assert counts(diff) == {'matched': 1, 'value_mismatches': 1, 'metricflow_only': 0, 'looker_only': 0}
+
+
+def test_compare_query_pushdown(tmp_path, monkeypatch):
+
+    warehouse = tmp_path / 'warehouse.duckdb'
+    with duckdb.connect(str(warehouse)) as connection:
+        connection.execute("CREATE TABLE orders AS SELECT * FROM (VALUES ('completed', 1.5), ('returned', 2.0)) AS orders(status, total)")
+
+    semantic_models = [{"name": "orders", "entities": [{"name": "order_id", "type": "primary"}],
+                        "dimensions": [{"name": "status", "type": "categorical"}],
+                        "measures": [{"name": "order_total", "agg": "sum"}]}]
+    metrics = [{"name": "order_total", "type": "simple", "type_params": {"input_measures": [{"name": "order_total"}]}}]
+    monkeypatch.setattr(to_looker, 'SEMANTIC_MODELS', semantic_models)
+    monkeypatch.setattr(to_looker, 'METRICS', metrics)
+    monkeypatch.setattr(mf_compare_query, 'parse_project', lambda **kwargs: None)
+    monkeypatch.setattr(to_looker, 'connect_looker', lambda **kwargs: ('sdk', 'model', set()))
+    monkeypatch.setattr(to_looker, 'metricflow_query_sql',
+                        lambda **kwargs: "SELECT status, SUM(total) FROM orders GROUP BY 1")
+    monkeypatch.setattr(to_looker, 'looker_query_sql',
+                        lambda *args, **kwargs: ("SELECT status, SUM(total) + 1 FROM orders GROUP BY 1",
+                                                 ['orders.status', 'orders.order_total']))
+
+    args = argparse.Namespace(metrics=['order_total'], group_by=['order_id__status'], order_by=None, where=None,
+                              to_looker_explore='orders', looker_filters=None, looker_dev_branch=None,
+                              force_parse=False, manifest_dir='target', explore_cache_ttl=0, top_n=10,
+                              pushdown=True, warehouse=f"duckdb:{warehouse}")
+
+    assert not mf_compare_query.compare_query(argparse.Namespace(**vars(args), tolerances=None))
+    assert mf_compare_query.compare_query(argparse.Namespace(**vars(args), tolerances={'order_total': 1.0}))
+
+
+def test_quarters_cannot_be_compared():
+
+    with pytest.raises(ValueError, match='quarter'):
+        pushdown.pushdown_sql('SELECT 1', 'SELECT 1', ['order_id__ordered_at__quarter'], ['datetime', 'float'], 1)
+
+
+def test_connect_warehouse(monkeypatch):
+
+    connections = types.ModuleType('my_connections')
+    connections.warehouse = lambda: 'connection'
+    monkeypatch.setitem(sys.modules, 'my_connections', connections)
+
+    assert pushdown.connect_warehouse('my_connections:warehouse') == 'connection'
+    assert pushdown.connect_warehouse('duckdb').execute('SELECT 1').fetchall() == [(1,)]
+    with pytest.raises(ValueError):
+        pushdown.connect_warehouse('my_connections')
+    with pytest.raises(ValueError):
+        pushdown.connect_warehouse('my_connections:missing')
+
+
+def test_parse_explain_output():
+
+    output = ("\x1b[32m✔ Success 🦄 - query completed after 0.12 seconds\x1b[0m\n"
+              "🔎 SQL (remove --explain to see data or add --show-dataflow-plan to see the generated dataflow plan):\n"
+              "SELECT\n  SUM(order_total) AS order_total\nFROM orders;\n")
+
+    assert to_looker.parse_explain_output(output) == "SELECT\n  SUM(order_total) AS order_total\nFROM orders"
+    assert to_looker.parse_explain_output("Loading...\nWITH a AS (SELECT 1)\nSELECT * FROM a\n") == \
+        "WITH a AS (SELECT 1)\nSELECT * FROM a"
+
+
+def test_modes_are_mutually_exclusive(monkeypatch, capsys):
+
+    monkeypatch.setattr(sys, 'argv', ['mf-compare-query', '--metrics', 'order_total', '--to-looker-explore', 'orders',
+                                      '--pushdown', '--streaming'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        mf_compare_query.main()
+
+    assert exit_info.value.code == 2
+    assert 'not allowed with argument' in capsys.readouterr().err
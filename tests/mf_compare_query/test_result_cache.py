@@ -0,0 +1,218 @@
+import os
+import json
+import types
+import pickle
+import argparse
+import pytest
+import pandas as pd
+import mf_compare_query
+import mf_compare_query.to_looker as to_looker
+from mf_compare_query import result_cache
+from mf_compare_query.result_cache import ResultCache
+
+semantic_models = [
+    {
+        "name": "orders",
+        "entities": [{"name": "order_id", "type": "primary"}],
+        "dimensions": [{"name": "status", "type": "categorical"}],
+        "measures": [{"name": "order_total", "agg": "sum"}]
+    }
+]
+
+metrics = [{"name": "order_total", "type": "simple", "type_params": {"input_measures": [{"name": "order_total"}]}}]
+
+
+class FakeSDK:
+
+    def __init__(self, sql='SELECT status, SUM(total) FROM orders GROUP BY 1'):
+        self.auth = types.SimpleNamespace(settings=types.SimpleNamespace(base_url='https://looker.example.com'))
+        self.sql = sql
+        self.queries = 0
+        self.sql_queries = 0
+
+    def run_inline_query(self, result_format, body):
+        if result_format == 'sql':
+            self.sql_queries += 1
+            return self.sql
+        self.queries += 1
+        return 'Status,Order Total\ncompleted,1.5\n'
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    A result cache in a manifest directory of `tmp_path`, set for to_looker's queries.
+    """
+
+    manifest_dir = tmp_path / 'target'
+    manifest_dir.mkdir()
+    (manifest_dir / 'semantic_manifest.json').write_text(json.dumps({'semantic_models': semantic_models, 'metrics': metrics}))
+    monkeypatch.setattr(to_looker, 'SEMANTIC_MODELS', semantic_models)
+    monkeypatch.setattr(to_looker, 'METRICS', metrics)
+
+    cache = ResultCache(str(manifest_dir), project_dir=str(tmp_path))
+    monkeypatch.setattr(to_looker, 'RESULT_CACHE', cache)
+    return cache
+
+
+def fake_metricflow(monkeypatch):
+    """
+    Makes MetricFlow queries write fixed results, returning the list the queries are recorded in.
+    """
+
+    queries = []
+
+    def run_metricflow_query(metrics, group_by=None, order_by=None, where=None, results_path=None, result_format=None):
+        queries.append(where)
+        with open(results_path, 'w') as f:
+            f.write('order_id__status,order_total\ncompleted,1.5\n')
+        return 'csv'
+
+    monkeypatch.setattr(to_looker, 'run_metricflow_query', run_metricflow_query)
+    return queries
+
+
+def test_metricflow_results_are_reused(cache, tmp_path, monkeypatch):
+
+    queries = fake_metricflow(monkeypatch)
+    query = dict(metrics=['order_total'], group_by=['order_id__status'], results_path=str(tmp_path / 'results.csv'))
+
+    first = to_looker.query_metricflow(**query, where="{{ Dimension('order_id__status') }}  = 'completed'")
+    second = to_looker.query_metricflow(**query, where="{{ Dimension('order_id__status') }} = 'completed'")
+
+    assert len(queries) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+    # A changed semantic manifest or warehouse target is a different key
+    (tmp_path / 'target' / 'semantic_manifest.json').write_text('{}')
+    to_looker.query_metricflow(**query)
+    to_looker.query_metricflow(**query)
+    monkeypatch.setenv('DBT_TARGET', 'prod')
+    to_looker.query_metricflow(**query)
+    assert len(queries) == 3
+
+    # Refreshing runs the query again
+    cache.refresh = {'metricflow'}
+    to_looker.query_metricflow(**query)
+    assert len(queries) == 4
+
+
+def test_looker_results_are_keyed_by_their_sql(cache):
+
+    sdk = FakeSDK()
+    query = dict(explore='orders', metrics=['order_total'], group_by=['order_id__status'])
+    fields = {'orders.status', 'orders.order_total'}
+
+    first = to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query)
+    second = to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query)
+
+    assert sdk.queries == 1
+    pd.testing.assert_frame_equal(first, second)
+    assert list(second.columns) == ['orders.status', 'orders.order_total']
+
+    # Changed LookML generates different SQL
+    sdk.sql = 'SELECT status, SUM(total * 2) FROM orders GROUP BY 1'
+    to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query)
+    assert sdk.queries == 2
+
+    # As does a dev branch
+    to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query, dev_branch='dev-feature')
+    to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query, dev_branch='dev-feature')
+    assert sdk.queries == 3
+
+    # The SQL is not fetched unless the cached results can be used
+    sql_queries = sdk.sql_queries
+    cache.refresh = {'looker'}
+    to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query)
+    assert (sdk.queries, sdk.sql_queries) == (4, sql_queries)
+
+    to_looker.set_result_cache(None)
+    to_looker.run_looker_query(sdk, 'jaffle_shop', fields, **query)
+    assert (sdk.queries, sdk.sql_queries) == (5, sql_queries)
+
+
+def test_compare_query_keys_looker_results_by_dev_branch(cache, tmp_path, monkeypatch):
+
+    fake_metricflow(monkeypatch)
+    sdk = FakeSDK()
+    monkeypatch.setattr(mf_compare_query, 'parse_project', lambda **kwargs: None)
+    monkeypatch.setattr(to_looker, 'connect_looker',
+                        lambda **kwargs: (sdk, 'jaffle_shop', {'orders.status', 'orders.order_total'}))
+    (tmp_path / 'logs').mkdir()
+    monkeypatch.chdir(tmp_path) # MetricFlow results are written to logs/
+
+    def compare(dev_branch):
+        args = argparse.Namespace(metrics=['order_total'], group_by=['order_id__status'], order_by=None, where=None,
+                                  to_looker_explore='orders', looker_filters=None, looker_dev_branch=dev_branch,
+                                  force_parse=False, manifest_dir=cache.manifest_dir, explore_cache_ttl=0, top_n=10,
+                                  tolerances=None, pushdown=False, streaming=False, checksum=False)
+        return mf_compare_query.compare_query(args)
+
+    assert compare(None) and compare('dev-feature')
+    assert sdk.queries == 2 # The production results are not reused on the dev branch
+
+    assert compare('dev-feature') and compare(None)
+    assert sdk.queries == 2
+
+
+def test_expired_results_are_not_used(cache):
+
+    results = pd.DataFrame({'orders.order_total': [1.5]})
+    cache.write('key', 'looker', results)
+    assert cache.read('key', 'looker') is not None
+
+    index_path = os.path.join(cache.directory, result_cache.RESULT_CACHE_INDEX)
+    with open(index_path) as f:
+        index = json.load(f)
+    index['entries']['key']['cached_at'] = 0
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+
+    assert cache.read('key', 'looker') is None
+    assert ResultCache(cache.manifest_dir, ttl=0).read('key', 'looker') is None
+
+
+def test_least_recently_used_results_are_evicted(cache):
+
+    results = pd.DataFrame({'orders.order_total': range(10_000)})
+    cache.max_bytes = 2.5 * len(pickle.dumps(results))
+
+    cache.write('first', 'metricflow', results)
+    cache.write('second', 'metricflow', results)
+    cache.read('first', 'metricflow')
+    cache.write('third', 'metricflow', results)
+
+    assert cache.read('second', 'metricflow') is None
+    assert cache.read('first', 'metricflow') is not None and cache.read('third', 'metricflow') is not None
+    assert len([name for name in os.listdir(cache.directory) if name.endswith('.pickle')]) == 2
+
+
+def test_refreshed_side_is_cleared(cache):
+
+    results = pd.DataFrame({'orders.order_total': [1.5]})
+    cache.write('looker key', 'looker', results)
+    cache.write('metricflow key', 'metricflow', results)
+
+    cache.clear('looker')
+
+    assert cache.read('looker key', 'looker') is None
+    assert cache.read('metricflow key', 'metricflow') is not None
+    assert len([name for name in os.listdir(cache.directory) if name.endswith('.pickle')]) == 1
+
+
+def test_orphaned_results_are_removed(cache):
+
+    results = pd.DataFrame({'orders.order_total': [1.5]})
+    cache.write('first', 'metricflow', results)
+
+    # Results files a concurrent run wrote but whose index entry was lost
+    old_orphan, new_orphan = os.path.join(cache.directory, 'old.pickle'), os.path.join(cache.directory, 'new.pickle')
+    for path in (old_orphan, new_orphan):
+        with open(path, 'wb') as f:
+            pickle.dump(results, f)
+    os.utime(old_orphan, (0, 0))
+
+    cache.write('second', 'metricflow', results)
+
+    assert not os.path.exists(old_orphan) and os.path.exists(new_orphan)
+    assert cache.read('first', 'metricflow') is not None and cache.read('second', 'metricflow') is not None
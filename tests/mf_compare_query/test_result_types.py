@@ -0,0 +1,86 @@
+import pandas as pd
+from mf_translate.semantic_index import SemanticIndex
+from mf_compare_query import result_types
+
+semantic_models = [
+    {
+        "name": "orders",
+        "entities": [{"name": "order_id", "type": "primary"}],
+        "dimensions": [
+            {"name": "status", "type": "categorical"},
+            {"name": "ordered_at", "type": "time"}
+        ],
+        "measures": [
+            {"name": "order_count", "agg": "count"},
+            {"name": "order_total", "agg": "sum"}
+        ]
+    }
+]
+
+metrics = [
+    {"name": "order_count", "type": "simple", "type_params": {"input_measures": [{"name": "order_count"}]}},
+    {"name": "order_total", "type": "simple", "type_params": {"input_measures": [{"name": "order_total"}]}},
+    {"name": "average_order", "type": "ratio", "type_params": {"input_measures": [{"name": "order_total"}, {"name": "order_count"}]}}
+]
+
+index = SemanticIndex(semantic_models, metrics)
+
+
+def test_query_column_kinds():
+
+    group_by = ['order_id__status', 'order_id__ordered_at', 'order_id__ordered_at__month', 'metric_time__day', 'order_id']
+
+    assert result_types.query_column_kinds(['order_count', 'order_total', 'average_order'], group_by, index) == \
+        ['string', 'datetime', 'datetime', 'datetime', 'string', 'integer', 'float', 'float']
+
+
+def test_typed_results_compare_equal():
+
+    kinds = ['datetime', 'string', 'integer', 'float']
+    metricflow = pd.DataFrame({'a': pd.to_datetime(['2024-01-01', '2024-04-01']), 'b': [1.0, None], 'c': [3.0, 4.0], 'd': ['1.5', '2']})
+    looker = pd.DataFrame({'a': ['2024-01', '2024-Q2'], 'b': ['1', None], 'c': [3, 4], 'd': [1.5, 2]})
+
+    metricflow = result_types.apply_column_kinds(metricflow, kinds)
+    looker = result_types.apply_column_kinds(looker, kinds)
+
+    assert list(metricflow.dtypes.astype(str)) == ['datetime64[ns]', 'string', 'Int64', 'Float64']
+    assert list(looker.dtypes.astype(str)) == list(metricflow.dtypes.astype(str))
+    looker.columns = metricflow.columns
+    pd.testing.assert_frame_equal(metricflow, looker)
+
+
+def test_read_metricflow_csv_skips_header(tmp_path):
+
+    path = tmp_path / 'results.csv'
+    path.write_text("order_id__status,order_count\ncompleted,3\n,4\n")
+
+    results = result_types.read_metricflow_results(str(path), 'csv', kinds=['string', 'integer'],
+                                                   expected_columns=['order_id__status', 'order_count'])
+
+    assert list(results.columns) == ['column_1', 'column_2']
+    assert results.values.tolist()[0] == ['completed', 3.0] # Parsed by kind, then cast by apply_column_kinds()
+    assert pd.isna(results['column_1'][1])
+    assert list(result_types.apply_column_kinds(results, ['string', 'integer']).dtypes.astype(str)) == ['string', 'Int64']
+
+
+def test_csv_header_with_default_time_grain(tmp_path):
+
+    path = tmp_path / 'results.csv'
+    path.write_text("METRIC_TIME__DAY,order_id__ordered_at__month,order_count\n2024-01-01,2024-01-01,3\n")
+
+    assert result_types.csv_header_rows(str(path), ['metric_time', 'order_id__ordered_at__month', 'order_count']) == 1
+    assert result_types.csv_header_rows(str(path), ['metric_time', 'order_id__ordered_at', 'order_count']) == 1
+    assert result_types.csv_header_rows(str(path), ['metric_time', 'order_id__status', 'order_count']) == 0
+    assert result_types.csv_header_rows(str(tmp_path / 'results.csv'), None) == 0
+
+
+def test_iter_csv_results_rereads_non_numeric_values_as_text(tmp_path):
+
+    path = tmp_path / 'results.csv'
+    path.write_text('status,count\n' + ''.join(f"s{i},{i}\n" for i in range(10)) + 's10,n/a\ns11,11\n')
+
+    chunks = list(result_types.iter_csv_results(str(path), ['string', 'integer'], ['status', 'count'], skiprows=1, chunk_rows=4))
+    results = pd.concat(chunks, ignore_index=True)
+
+    assert results['status'].tolist() == [f"s{i}" for i in range(12)]
+    assert results['count'].tolist()[9:] == [9, pd.NA, 11]
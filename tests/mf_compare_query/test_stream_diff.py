@@ -0,0 +1,130 @@
+import pytest
+import pandas as pd
+from types import SimpleNamespace
+from mf_compare_query import stream_diff, to_looker
+from mf_compare_query.diff import DIFF_COUNTS
+
+KINDS = ['string', 'datetime', 'float', 'integer']
+COLUMNS = ['orders.status', 'orders.ordered_date', 'orders.total', 'orders.count']
+
+
+def write_results(path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def results(tmp_path):
+    """
+    MetricFlow and Looker results sorted by their keys, differing in one value and one row on each side.
+    """
+
+    metricflow = [(status, f"2024-01-{day:02d}", day * 1.5, day) for status in ('completed', 'placed', 'returned') for day in range(1, 29)]
+    looker = [row for row in metricflow if row[:2] != ('placed', '2024-01-07')] + [('shipped', '2024-01-01', 1.0, 1)]
+    looker[3] = looker[3][:2] + (100.0, looker[3][3])
+    return write_results(tmp_path / 'metricflow.csv', metricflow), write_results(tmp_path / 'looker.csv', looker)
+
+
+def counts(diff):
+    return {count: diff[count] for count in DIFF_COUNTS}
+
+
+@pytest.mark.parametrize('sorted_by_keys', [True, False])
+def test_streamed_results_are_compared(results, sorted_by_keys):
+
+    diff = stream_diff.stream_diff(*results, KINDS, COLUMNS, key_count=2, metricflow_skiprows=1, chunk_rows=10,
+                                   memory_limit=0.001, sorted_by_keys=sorted_by_keys)
+
+    assert counts(diff) == {'matched': 82, 'value_mismatches': 1, 'metricflow_only': 1, 'looker_only': 1}
+    assert not diff['passed']
+    assert diff['deviations'][['orders.status', 'column', 'looker']].values.tolist() == [['completed', 'orders.total', 100.0]]
+    assert diff['metricflow_only_rows']['orders.ordered_date'].tolist() == [pd.Timestamp('2024-01-07')]
+    assert diff['looker_only_rows']['orders.status'].tolist() == ['shipped']
+
+
+def test_matching_results_pass(results):
+
+    diff = stream_diff.stream_diff(results[0], results[0], KINDS, COLUMNS, key_count=2, metricflow_skiprows=1,
+                                   chunk_rows=7, sorted_by_keys=True)
+
+    assert diff['passed']
+    assert diff['matched'] == 84
+
+
+def test_unsorted_results_are_partitioned_instead(tmp_path, results, caplog):
+
+    rows = pd.read_csv(results[1]).sample(frac=1, random_state=0)
+    rows.to_csv(tmp_path / 'shuffled.csv', index=False)
+
+    with caplog.at_level('INFO'):
+        diff = stream_diff.stream_diff(results[0], str(tmp_path / 'shuffled.csv'), KINDS, COLUMNS, key_count=2,
+                                       metricflow_skiprows=1, chunk_rows=10, sorted_by_keys=True)
+
+    assert 'Looker results are not sorted' in caplog.text
+    assert counts(diff) == {'matched': 82, 'value_mismatches': 1, 'metricflow_only': 1, 'looker_only': 1}
+
+
+def test_duplicate_keys_across_chunks(tmp_path):
+
+    rows = [('completed', '2024-01-01', 1.0, 1)] * 5 + [('placed', '2024-01-01', 2.0, 2)]
+    metricflow = write_results(tmp_path / 'metricflow.csv', rows)
+    looker = write_results(tmp_path / 'looker.csv', rows[1:])
+
+    diff = stream_diff.stream_diff(metricflow, looker, KINDS, COLUMNS, key_count=2, metricflow_skiprows=1,
+                                   chunk_rows=2, sorted_by_keys=True)
+
+    assert counts(diff) == {'matched': 5, 'value_mismatches': 0, 'metricflow_only': 1, 'looker_only': 0}
+
+
+def test_empty_results(tmp_path):
+
+    metricflow = write_results(tmp_path / 'metricflow.csv', [])
+    looker = write_results(tmp_path / 'looker.csv', [('completed', '2024-01-01', 1.0, 1)])
+
+    for sorted_by_keys in (True, False):
+        diff = stream_diff.stream_diff(metricflow, looker, KINDS, COLUMNS, key_count=2, metricflow_skiprows=1,
+                                       sorted_by_keys=sorted_by_keys)
+        assert counts(diff) == {'matched': 0, 'value_mismatches': 0, 'metricflow_only': 0, 'looker_only': 1}
+
+
+def test_bucket_count():
+
+    assert stream_diff.bucket_count(0) == 1
+    assert stream_diff.bucket_count(1024 ** 3, memory_limit=512) == 10
+    assert stream_diff.bucket_count(1024 ** 4, memory_limit=512) == stream_diff.STREAM_MAX_BUCKETS
+
+
+def test_download_looker_query_streams_to_disk(tmp_path, monkeypatch):
+
+    posted = {}
+
+    class FakeResponse:
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return False
+        def raise_for_status(self):
+            pass
+        def iter_content(self, chunk_size):
+            yield b'Status,Total\n'
+            yield b'completed,1.5\n'
+
+    def post(url, **kwargs):
+        posted.update(kwargs, url=url)
+        return FakeResponse()
+
+    settings = SimpleNamespace(base_url='https://looker.example.com/', timeout=120)
+    sdk = SimpleNamespace(auth=SimpleNamespace(settings=settings, authenticate=lambda options: {'Authorization': 'token abc'}),
+                          transport=SimpleNamespace(session=SimpleNamespace(post=post)),
+                          serialize=lambda api_model: b'{}')
+    lkr_query = SimpleNamespace(view='orders', fields=['orders.status', 'orders.total'], filters=None)
+    monkeypatch.setattr(to_looker, 'query_to_looker_query', lambda *args: lkr_query)
+
+    columns = to_looker.download_looker_query(sdk, 'jaffle_shop', {'orders.status', 'orders.total'}, 'orders',
+                                              ['order_total'], group_by=['order_id__status'],
+                                              results_path=str(tmp_path / 'looker.csv'))
+
+    assert columns == ['orders.status', 'orders.total']
+    assert posted['url'] == 'https://looker.example.com/api/4.0/queries/run/csv'
+    assert posted['stream'] and posted['headers']['Authorization'] == 'token abc'
+    assert (tmp_path / 'looker.csv').read_text() == 'Status,Total\ncompleted,1.5\n'
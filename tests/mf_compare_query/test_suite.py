@@ -0,0 +1,102 @@
+import time
+import json
+import threading
+import pytest
+import pandas as pd
+import mf_compare_query.to_looker as to_looker
+from mf_compare_query import suite
+
+SUITE_YAML = """
+defaults:
+  explore: orders
+queries:
+  - name: revenue
+    metrics: [order_total]
+  - name: revenue by status
+    metrics: order_total,order_count
+    group_by: [order_id__status]
+    looker_filters: {'orders.status': 'completed'}
+  - metrics: [order_count]
+    explore: customers
+"""
+
+
+@pytest.fixture
+def suite_file(tmp_path):
+    path = tmp_path / 'suite.yml'
+    path.write_text(SUITE_YAML)
+    return str(path)
+
+
+def test_load_suite(suite_file):
+
+    specs = suite.load_suite(suite_file)
+
+    assert [spec['name'] for spec in specs] == ['revenue', 'revenue by status', 'query_3']
+    assert specs[1]['metrics'] == ['order_total', 'order_count']
+    assert specs[1]['looker_filters'] == {'orders.status': 'completed'}
+    assert [spec['explore'] for spec in specs] == ['orders', 'orders', 'customers']
+
+
+def test_load_suite_rejects_incomplete_queries(tmp_path):
+
+    path = tmp_path / 'suite.yml'
+    path.write_text("queries:\n  - metrics: [order_total]\n")
+
+    with pytest.raises(SystemExit):
+        suite.load_suite(str(path))
+
+
+def test_shards_cover_every_spec_once():
+
+    specs = list(range(10))
+    shards = [suite.shard_specs(specs, *suite.parse_shard(f"{index}/3")) for index in (1, 2, 3)]
+
+    assert sorted(sum(shards, [])) == specs
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    for shard in ['0/3', '4/3', '1', 'a/b']:
+        with pytest.raises(ValueError):
+            suite.parse_shard(shard)
+
+
+def test_run_suite(suite_file, monkeypatch):
+
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+    scratch_paths = []
+    parses = []
+
+    def query_metricflow(metrics, group_by=None, where=None, results_path=None):
+        with lock:
+            scratch_paths.append(results_path)
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if metrics == ['order_count']:
+            raise SystemExit(1) # e.g. MetricFlow could not be queried
+        return pd.DataFrame({'column_1': [1]})
+
+    def run_looker_query(sdk, looker_model, valid_fields, explore, metrics, group_by=None, filters=None, dev_branch=None):
+        assert valid_fields == {f'{explore}.field'}
+        return pd.DataFrame({'orders.order_total': [1 if filters is None else 2]})
+
+    monkeypatch.setattr(suite, 'parse_project', lambda **kwargs: parses.append(kwargs))
+    monkeypatch.setattr(to_looker, 'looker_session', lambda dev_branch=None: ('sdk', 'model'))
+    monkeypatch.setattr(to_looker, 'fetch_explore_fields', lambda sdk, looker_model, explore, **kwargs: {f'{explore}.field'})
+    monkeypatch.setattr(to_looker, 'query_metricflow', query_metricflow)
+    monkeypatch.setattr(to_looker, 'run_looker_query', run_looker_query)
+
+    reports = suite.run_suite(suite.load_suite(suite_file), concurrency=2, mf_workers=0)
+
+    assert [report['result'] for report in reports] == ['pass', 'fail', 'error']
+    assert len(parses) == 1
+    assert len(set(scratch_paths)) == 3
+    assert max_running[0] <= 2
+
+    report_path = suite_file + '.json'
+    assert not suite.log_suite_report(reports, report_path=report_path)
+    with open(report_path) as file:
+        assert json.load(file)['counts'] == {'pass': 1, 'fail': 1, 'error': 1}
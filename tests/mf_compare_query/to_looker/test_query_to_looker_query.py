@@ -370,4 +370,52 @@ def test_metrics_across_different_models(monkeypatch):
     assert lkr_query.model == 'jaffle_shop'
     assert lkr_query.view == 'orders'
     assert lkr_query.fields == ['orders.order_total', 'locations.location_count']
-    assert lkr_query.sorts == None
\ No newline at end of file
+    assert lkr_query.sorts == None
+
+def test_single_metric_with_group_by_time_dimension_grains(monkeypatch):
+
+    semantic_models = [
+        {
+            "name": "orders",
+            "entities": [
+                {
+                    "name": "order_id",
+                    "type": "primary"
+                }
+            ],
+            "dimensions": [
+                {
+                    "name": "ordered_at",
+                    "type": "time",
+                    "type_params": {
+                        "time_granularity": "day"
+                    }
+                }
+            ],
+            "measures": [
+                {
+                    "name": "order_total"
+                }
+            ]
+        }
+    ]
+    monkeypatch.setattr(to_looker, 'SEMANTIC_MODELS', semantic_models)
+
+    metrics = [
+        {
+            "name": "order_total",
+            "type_params": {
+                "input_measures": [
+                    {
+                        "name": "order_total",
+                    }
+                ]
+            }
+        }
+    ]
+    monkeypatch.setattr(to_looker, 'METRICS', metrics)
+
+    lkr_query = to_looker.query_to_looker_query(looker_model='jaffle_shop', explore='orders', metrics=['order_total'],
+                                                group_by=['order_id__ordered_at', 'order_id__ordered_at__month', 'order_id__ordered_at__year'])
+
+    assert lkr_query.fields == ['orders.ordered_at_date', 'orders.ordered_at_month', 'orders.ordered_at_year', 'orders.order_total']
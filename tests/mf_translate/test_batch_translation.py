@@ -0,0 +1,117 @@
+import argparse
+import lkml
+import mf_translate
+import mf_translate.to_looker as to_looker
+import mf_translate.to_cube as to_cube
+import mf_translate.to_ldsh as to_ldsh
+from ruamel.yaml import YAML
+
+
+def test_translate_models_to_files(synthetic_project, tmp_path):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=3, metrics_per_model=2)
+
+    failed_models = mf_translate.translate_models_to_files(semantic_manifest["semantic_models"], tmp_path / "views")
+
+    assert failed_models == []
+    assert sorted(path.name for path in (tmp_path / "views").iterdir()) == ["model_0.view.lkml",
+                                                                           "model_1.view.lkml",
+                                                                           "model_2.view.lkml"]
+    model_1_view = lkml.load((tmp_path / "views" / "model_1.view.lkml").read_text())
+    assert model_1_view["views"][0]["name"] == "model_1"
+
+
+def test_translate_models_to_files_continues_past_failures(synthetic_project, tmp_path):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=3, metrics_per_model=2, set_manifests=False)
+    del dbt_manifest["nodes"]["model.project.model_1"] # model_1's dbt node can no longer be found
+    mf_translate.set_manifests(semantic_manifest, dbt_manifest)
+
+    failed_models = mf_translate.translate_models_to_files(semantic_manifest["semantic_models"], tmp_path)
+
+    assert failed_models == ["model_1"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["model_0.view.lkml", "model_2.view.lkml"]
+
+
+def test_parallel_translation_matches_serial(synthetic_project, tmp_path):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=6, metrics_per_model=3)
+
+    assert mf_translate.translate_models_to_files(semantic_manifest["semantic_models"], tmp_path / "serial") == []
+    assert mf_translate.translate_models_to_files(semantic_manifest["semantic_models"], tmp_path / "parallel", jobs=3) == []
+
+    serial_files = sorted((tmp_path / "serial").iterdir())
+    parallel_files = sorted((tmp_path / "parallel").iterdir())
+    assert [path.name for path in serial_files] == [path.name for path in parallel_files]
+    assert all(s.read_bytes() == p.read_bytes() for s, p in zip(serial_files, parallel_files))
+
+
+def test_watch_retranslates_on_change(monkeypatch):
+
+    snapshots = iter([{"models/orders.yml": (1, 10)},
+                      {"models/orders.yml": (1, 10)},
+                      {"models/orders.yml": (2, 12)}, # Changed, re-read after settling
+                      {"models/orders.yml": (2, 12)},
+                      {"models/orders.yml": (3, 14)}, # Changed again
+                      {"models/orders.yml": (3, 14)},
+                      {"models/orders.yml": (3, 14)}])
+    monkeypatch.setattr(mf_translate, "project_snapshot", lambda manifest_dir: next(snapshots))
+    args = argparse.Namespace(manifest_dir="target")
+
+    translate_calls = []
+    def translate(args, parse_args, loaded):
+        translate_calls.append((parse_args, loaded))
+        if len(translate_calls) == 2:
+            raise SystemExit(1) # A failed parse should not stop watching
+        if len(translate_calls) == 3:
+            raise KeyError("model_1") # Nor should an unexpected error
+        loaded["semantic_manifest"] = {}
+    monkeypatch.setattr(mf_translate, "translate", translate)
+
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 7:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(mf_translate.time, "sleep", sleep)
+
+    try:
+        mf_translate.watch(args, poll_interval=0.5, settle_time=0.2)
+    except KeyboardInterrupt:
+        pass
+
+    # Initial translation, then a partial re-parse for each change, all keeping the loaded manifests
+    assert [parse_args for parse_args, _ in translate_calls] == [(), (), ()]
+    assert all(loaded is translate_calls[0][1] == {"semantic_manifest": {}} for _, loaded in translate_calls)
+    assert sleeps == [0.5, 0.5, 0.2, 0.5, 0.2, 0.5, 0.5]
+
+
+def test_translate_models_to_multiple_targets(synthetic_project, tmp_path):
+
+    targets = ("looker", "cube", "lightdash")
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=2, metrics_per_model=2, targets=targets)
+
+    assert to_cube.semantic_index() is to_looker.semantic_index() is to_ldsh.semantic_index()
+
+    failed_models = mf_translate.translate_models_to_files(semantic_manifest["semantic_models"], tmp_path, targets=targets)
+
+    assert failed_models == []
+    assert sorted(str(path.relative_to(tmp_path)) for path in tmp_path.glob("*/*")) == ["cube/model_0.yml",
+                                                                                         "cube/model_1.yml",
+                                                                                         "lightdash/model_0.yml",
+                                                                                         "lightdash/model_1.yml",
+                                                                                         "looker/model_0.view.lkml",
+                                                                                         "looker/model_1.view.lkml"]
+
+    yaml = YAML()
+    cube = yaml.load((tmp_path / "cube" / "model_1.yml").read_text())["cubes"][0]
+    assert cube["name"] == "model_1"
+    assert [measure["name"] for measure in cube["measures"]] == ["model_1_metric_0", "model_1_metric_1",
+                                                                  "model_1_ratio_numerator", "model_1_ratio_denominator",
+                                                                  "model_1_ratio"]
+
+    ldsh_model = yaml.load((tmp_path / "lightdash" / "model_1.yml").read_text())["models"][0]
+    assert ldsh_model["name"] == "model_1"
+    assert ldsh_model["meta"]["metrics"]["model_1_ratio_numerator"]["hidden"] is True
+    assert ldsh_model["meta"]["metrics"]["model_1_metric_1"]["sql"] == \
+        "case when (${model_0.model_0_status} = 'complete')\n            then (${TABLE}.amount_1 * 0.1)\n         end"
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import mf_translate.dbt_project as dbt_project
+
+
+def make_project(project_dir):
+
+    (project_dir / "models").mkdir()
+    (project_dir / "dbt_project.yml").write_text("name: jaffle_shop\n")
+    (project_dir / "models" / "orders.sql").write_text("select 1 as order_id\n")
+    (project_dir / "models" / "orders.yml").write_text("semantic_models: []\n")
+
+
+def fake_dbt_parse(calls):
+
+    def run(command, **kwargs):
+        calls.append(command)
+        target_path = command[command.index('--target-path') + 1]
+        for manifest in ['manifest.json', 'semantic_manifest.json']:
+            with open(f"{target_path}/{manifest}", 'w') as f:
+                f.write('{}')
+        return subprocess.CompletedProcess(command, 0, stdout='', stderr='')
+
+    return run
+
+
+def test_fingerprint_changes_with_project_files(monkeypatch, tmp_path):
+
+    make_project(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "target").mkdir()
+
+    fingerprint = dbt_project.project_fingerprint()
+    (tmp_path / "target" / "manifest.json").write_text('{"changed": true}')
+    (tmp_path / "notes.txt").write_text("not a dbt input")
+    assert dbt_project.project_fingerprint() == fingerprint
+
+    (tmp_path / "models" / "orders.yml").write_text("semantic_models: [{name: orders}]\n")
+    assert dbt_project.project_fingerprint() != fingerprint
+
+    fingerprint = dbt_project.project_fingerprint()
+    monkeypatch.setenv("DBT_TARGET", "prod")
+    assert dbt_project.project_fingerprint() != fingerprint
+
+
+def test_fingerprint_only_reads_dbt_inputs(monkeypatch, tmp_path):
+
+    make_project(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DBT_PROFILES_DIR", raising=False)
+    (tmp_path / "profiles.yml").write_text("jaffle_shop: {}\n")
+    (tmp_path / "venv" / "lib").mkdir(parents=True)
+    (tmp_path / "venv" / "lib" / "site.py").write_text("import os\n")
+    (tmp_path / "target" / "compiled").mkdir(parents=True)
+    (tmp_path / "target" / "compiled" / "orders.sql").write_text("select 1\n")
+
+    files = dbt_project.project_files(manifest_dir="other_target")
+    assert sorted(os.path.relpath(path) for path in files) == ["dbt_project.yml", "models/orders.sql", "models/orders.yml",
+                                                                 "profiles.yml"]
+
+    # Configured paths replace dbt's defaults
+    (tmp_path / "dbt_project.yml").write_text("name: jaffle_shop\nmodel-paths: [transform]\ntarget-path: build\n")
+    (tmp_path / "transform").mkdir()
+    (tmp_path / "transform" / "orders.sql").write_text("select 1 as order_id\n")
+    assert sorted(os.path.relpath(path) for path in dbt_project.project_files()) == ["dbt_project.yml", "profiles.yml",
+                                                                                             "transform/orders.sql"]
+
+    assert dbt_project.target_path() == "build"
+    monkeypatch.setenv("DBT_TARGET_PATH", "elsewhere")
+    assert dbt_project.target_path() == "elsewhere"
+
+
+def test_parse_skipped_when_project_unchanged(monkeypatch, tmp_path):
+
+    make_project(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "target").mkdir()
+
+    calls = []
+    monkeypatch.setattr(subprocess, "run", fake_dbt_parse(calls))
+
+    assert dbt_project.parse_dbt_project(parse_args=('--no-partial-parse',)) is True
+    assert calls == [['dbt', 'parse', '--no-partial-parse', '--target-path', 'target']]
+
+    assert dbt_project.parse_dbt_project() is False
+    assert dbt_project.parse_dbt_project(force_parse=True) is True
+
+    (tmp_path / "models" / "orders.sql").write_text("select 2 as order_id\n")
+    assert dbt_project.parse_dbt_project() is True
+    assert dbt_project.parse_dbt_project() is False
+    assert len(calls) == 3
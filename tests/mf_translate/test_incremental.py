@@ -0,0 +1,82 @@
+import mf_translate
+import mf_translate.to_looker as to_looker
+from mf_translate.incremental import plan_incremental_translation, save_state, view_inputs
+from mf_translate.semantic_index import SemanticIndex
+
+
+def run_incremental(semantic_manifest, dbt_manifest, out_dir):
+
+    to_looker.set_manifests(metricflow_semantic_manifest=semantic_manifest, dbt_manifest=dbt_manifest)
+    models, reused, state = plan_incremental_translation(semantic_manifest["semantic_models"], to_looker.semantic_index(), out_dir)
+    assert mf_translate.translate_models_to_files(models, out_dir) == []
+    save_state(state, out_dir)
+    return sorted(model["name"] for model in models), sorted(reused)
+
+
+def test_incremental_translation(monkeypatch, synthetic_project, tmp_path):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=4, metrics_per_model=2, set_manifests=False)
+
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == ["model_0", "model_1", "model_2", "model_3"]
+    assert reused == []
+
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == []
+    assert reused == ["model_0", "model_1", "model_2", "model_3"]
+
+    # model_2's metric_1 is filtered on a dimension of model_1, so changing model_1 also rebuilds model_2's view
+    semantic_manifest["semantic_models"][1]["dimensions"][0]["description"] = "Status of the model_1 row."
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == ["model_1", "model_2"]
+    assert reused == ["model_0", "model_3"]
+
+    # A dbt column change only affects the model it backs
+    dbt_manifest["nodes"]["model.project.model_3"]["columns"]["discount"] = {}
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == ["model_3"]
+
+    # Deleted output files are rebuilt
+    (tmp_path / "model_0.view.lkml").unlink()
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == ["model_0"]
+
+    monkeypatch.setenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE", "bigquery")
+    rebuilt, reused = run_incremental(semantic_manifest, dbt_manifest, tmp_path)
+    assert rebuilt == ["model_0", "model_1", "model_2", "model_3"]
+
+
+def test_incremental_translation_to_several_targets(synthetic_project, tmp_path):
+
+    targets = ("looker", "cube")
+    semantic_manifest, _ = synthetic_project(num_models=3, metrics_per_model=2, targets=targets)
+
+    def run():
+        models, reused, state = plan_incremental_translation(semantic_manifest["semantic_models"], to_looker.semantic_index(),
+                                                             tmp_path, targets=targets)
+        assert mf_translate.translate_models_to_files(models, tmp_path, targets=targets) == []
+        save_state(state, tmp_path)
+        return sorted(model["name"] for model in models), sorted(reused)
+
+    assert run() == (["model_0", "model_1", "model_2"], [])
+    assert run() == ([], ["model_0", "model_1", "model_2"])
+
+    # A missing file of either target rebuilds the model
+    (tmp_path / "cube" / "model_1.yml").unlink()
+    assert run() == (["model_1"], ["model_0", "model_2"])
+    assert (tmp_path / "cube" / "model_1.yml").exists()
+
+
+def test_double_quoted_refs_are_dependencies(synthetic_project):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=3, metrics_per_model=2, set_manifests=False)
+    metric = next(metric for metric in semantic_manifest["metrics"] if metric["name"] == "model_2_metric_1")
+    metric["filter"]["where_filters"][0]["where_sql_template"] = \
+        "{{ Dimension(\"model_1_id__model_1_status\") }} = 'complete' AND {{ TimeDimension('model_0_id__model_0_created_at', 'day') }} > '2024-01-01'"
+    index = SemanticIndex(semantic_manifest["semantic_models"], semantic_manifest["metrics"], dbt_manifest["nodes"])
+
+    inputs = view_inputs(semantic_manifest["semantic_models"][2], index)
+
+    assert inputs["dimension_ref:model_1_id__model_1_status"] == "model_1"
+    assert inputs["dimension_ref:model_0_id__model_0_created_at"] == "model_0"
+    assert "semantic_model:model_1" in inputs and "semantic_model:model_0" in inputs
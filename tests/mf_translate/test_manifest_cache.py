@@ -0,0 +1,89 @@
+import os
+import json
+import mf_translate.manifest_cache as manifest_cache
+import pytest
+import mf_translate.to_looker as to_looker
+
+
+@pytest.fixture
+def write_manifests(synthetic_project):
+    """
+    Returns a function writing the manifests of a synthetic project to a manifest directory.
+    """
+
+    def write(manifest_dir, num_models=3):
+        semantic_manifest, dbt_manifest = synthetic_project(num_models=num_models, metrics_per_model=2, set_manifests=False)
+        (manifest_dir / "semantic_manifest.json").write_text(json.dumps(semantic_manifest))
+        (manifest_dir / "manifest.json").write_text(json.dumps(dbt_manifest))
+        return semantic_manifest, dbt_manifest
+
+    return write
+
+
+def test_load_manifests_uses_cache(write_manifests, tmp_path):
+
+    semantic_manifest, dbt_manifest = write_manifests(tmp_path)
+
+    stats = {}
+    loaded = manifest_cache.load_manifests(tmp_path, stats=stats)
+    assert stats["cache_hit"] is False
+    assert (tmp_path / manifest_cache.CACHE_FILE).exists()
+
+    stats = {}
+    cached_semantic_manifest, cached_dbt_manifest, cached_index = manifest_cache.load_manifests(tmp_path, stats=stats)
+    assert stats["cache_hit"] is True
+    assert cached_semantic_manifest == semantic_manifest == loaded[0]
+    assert cached_dbt_manifest == loaded[1]
+    assert cached_index.metrics_for_model("model_1") == loaded[2].metrics_for_model("model_1")
+
+    to_looker.set_manifests(cached_semantic_manifest, cached_dbt_manifest, semantic_index=cached_index)
+    assert to_looker.semantic_index() is cached_index
+
+
+def test_cache_invalidated_when_manifest_changes(write_manifests, tmp_path):
+
+    write_manifests(tmp_path, num_models=3)
+    manifest_cache.load_manifests(tmp_path)
+
+    write_manifests(tmp_path, num_models=4)
+
+    stats = {}
+    semantic_manifest, _, _ = manifest_cache.load_manifests(tmp_path, stats=stats)
+    assert stats["cache_hit"] is False
+    assert len(semantic_manifest["semantic_models"]) == 4
+
+
+def test_cache_kept_when_manifest_rewritten_unchanged(write_manifests, tmp_path):
+
+    write_manifests(tmp_path)
+    manifest_cache.load_manifests(tmp_path)
+
+    manifest_path = tmp_path / "manifest.json"
+    os.utime(manifest_path, ns=(0, 0)) # Same contents, different mtime
+
+    stats = {}
+    manifest_cache.load_manifests(tmp_path, stats=stats)
+    assert stats["cache_hit"] is True
+
+
+def test_loaded_manifests_are_reused(write_manifests, tmp_path):
+
+    write_manifests(tmp_path)
+    loaded = {}
+    semantic_manifest, dbt_manifest, semantic_index = manifest_cache.load_manifests(tmp_path, loaded=loaded)
+
+    stats = {}
+    assert manifest_cache.load_manifests(tmp_path, stats=stats, loaded=loaded) == (semantic_manifest, dbt_manifest, semantic_index)
+    assert stats["cache_hit"] is True
+
+    # Only the DBT manifest changed, so the semantic manifest is reused and only the index rebuilt
+    dbt_manifest_json = json.loads((tmp_path / "manifest.json").read_text())
+    dbt_manifest_json["nodes"]["model.project.model_0"]["description"] = "Changed"
+    (tmp_path / "manifest.json").write_text(json.dumps(dbt_manifest_json))
+
+    stats = {}
+    reloaded = manifest_cache.load_manifests(tmp_path, stats=stats, loaded=loaded)
+    assert stats["reloaded"] == ["manifest.json"]
+    assert reloaded[0] is semantic_manifest
+    assert reloaded[2] is not semantic_index
+    assert loaded["dbt_manifest"] is reloaded[1]
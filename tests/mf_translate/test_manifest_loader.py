@@ -0,0 +1,93 @@
+import json
+import pytest
+import mf_translate.manifest_loader as manifest_loader
+
+manifest = {
+    "metadata": {
+        "dbt_version": "1.8.0"
+    },
+    "nodes": {
+        "model.jaffle_shop.orders": {
+            "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`",
+            "raw_code": "select * from {{ ref('stg_orders') }} -- \"quoted\" { braces }",
+            "columns": {
+                "order_id": {
+                    "name": "order_id",
+                    "description": "Primary key"
+                },
+                "order_total": {
+                    "name": "order_total",
+                    "data_type": None
+                }
+            }
+        },
+        "model.jaffle_shop.stg_orders": {
+            "relation_name": "`mf_translate_db`.`jaffle_shop`.`stg_orders`",
+            "columns": {}
+        },
+        "test.jaffle_shop.not_null": {
+            "relation_name": None,
+            "columns": {},
+            "config": {"severity": 1.5e3}
+        }
+    },
+    "macros": {
+        f"macro.jaffle_shop.macro_{i}": {"macro_sql": "{% macro x() %}" * 50, "arguments": [1, 2.5, True, None]} for i in range(50)
+    },
+    "parent_map": {
+        "model.jaffle_shop.orders": ["model.jaffle_shop.stg_orders"]
+    }
+}
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1024 * 1024])
+def test_load_projected_dbt_manifest(monkeypatch, tmp_path, chunk_size):
+
+    monkeypatch.setattr(manifest_loader, "CHUNK_SIZE", chunk_size)
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    stats = {}
+    projected = manifest_loader.load_projected_dbt_manifest(manifest_path, stats=stats)
+
+    assert projected == {
+        "nodes": {
+            "model.jaffle_shop.orders": {
+                "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`",
+                "columns": {"order_id": {}, "order_total": {}}
+            },
+            "model.jaffle_shop.stg_orders": {
+                "relation_name": "`mf_translate_db`.`jaffle_shop`.`stg_orders`",
+                "columns": {}
+            },
+            "test.jaffle_shop.not_null": {
+                "relation_name": None,
+                "columns": {}
+            }
+        }
+    }
+    assert stats["bytes_read"] == len(manifest_path.read_text())
+
+
+def test_load_projected_dbt_manifest_for_relation_names(tmp_path):
+
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest))
+
+    stats = {}
+    projected = manifest_loader.load_projected_dbt_manifest(manifest_path,
+                                                            relation_names={"`mf_translate_db`.`jaffle_shop`.`orders`"},
+                                                            stats=stats)
+
+    assert list(projected["nodes"]) == ["model.jaffle_shop.orders"]
+    assert stats["nodes_kept"] == 1
+    assert stats["nodes_skipped"] == 2
+
+
+def test_load_invalid_dbt_manifest(tmp_path):
+
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(manifest)[:-20])
+
+    with pytest.raises(SystemExit):
+        manifest_loader.load_projected_dbt_manifest(manifest_path)
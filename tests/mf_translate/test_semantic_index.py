@@ -0,0 +1,157 @@
+import pytest
+import mf_translate.to_looker as to_looker
+from mf_translate.semantic_index import SemanticIndex
+
+orders_model = {
+    "name": "orders",
+    "node_relation": {
+        "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`"
+    },
+    "entities": [
+        {
+            "name": "order_id",
+            "type": "primary"
+        },
+        {
+            "name": "customer_id",
+            "type": "foreign"
+        }
+    ],
+    "dimensions": [
+        {
+            "name": "status",
+            "type": "categorical"
+        }
+    ],
+    "measures": [
+        {
+            "name": "order_count",
+            "agg": "count"
+        }
+    ]
+}
+
+customers_model = {
+    "name": "customers",
+    "entities": [
+        {
+            "name": "customer_id",
+            "type": "primary"
+        }
+    ],
+    "dimensions": [
+        {
+            "name": "region",
+            "type": "categorical"
+        }
+    ],
+    "measures": []
+}
+
+order_count = {
+    "name": "order_count",
+    "type": "simple",
+    "type_params": {
+        "measure": {
+            "name": "order_count"
+        }
+    }
+}
+
+nodes = {
+    "model.jaffle_shop.orders": {
+        "columns": {
+            "order_id": {}
+        },
+        "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`"
+    }
+}
+
+
+def test_index_lookups():
+
+    index = SemanticIndex([orders_model, customers_model], [order_count], nodes)
+
+    assert index.model_for_entity("order_id") is orders_model
+    assert index.model_for_entity("customer_id") is customers_model
+    assert index.model_for_entity("unknown_id") is None
+
+    assert index.model_for_dimension("customer_id", "region") is customers_model
+    assert index.model_for_dimension("order_id", "region") is None
+
+    assert index.measures["order_count"]["parent_model"] == "orders"
+    assert index.metrics["order_count"] is order_count
+    assert index.node_for_model(orders_model) is nodes["model.jaffle_shop.orders"]
+
+
+def test_index_is_immutable():
+
+    index = SemanticIndex([orders_model], [order_count])
+
+    with pytest.raises(TypeError):
+        index.metrics["revenue"] = {}
+
+    with pytest.raises(AttributeError):
+        index.metrics = {}
+
+
+def test_set_manifests_builds_index_once():
+
+    to_looker.set_manifests(metricflow_semantic_manifest={"semantic_models": [orders_model, customers_model],
+                                                          "metrics": [order_count]},
+                            dbt_manifest={"nodes": nodes})
+
+    index = to_looker.SEMANTIC_INDEX
+    assert to_looker.semantic_index() is index
+    assert to_looker.sql_expression_to_lkml("{{ Dimension('customer_id__region') }}", orders_model) == "${customers.region}"
+    assert to_looker.semantic_index() is index
+
+    to_looker.set_manifests(metricflow_semantic_manifest={}, dbt_manifest={})
+
+
+def test_metrics_for_model():
+
+    customer_count = {
+        "name": "customer_count",
+        "type": "derived",
+        "type_params": {
+            "input_measures": [
+                {
+                    "name": "customer_count"
+                }
+            ]
+        }
+    }
+
+    order_ratio = {
+        "name": "order_ratio",
+        "type": "ratio",
+        "type_params": {
+            "numerator": {
+                "name": "order_count"
+            },
+            "denominator": {
+                "name": "order_count"
+            }
+        }
+    }
+
+    mixed_ratio = {
+        "name": "mixed_ratio",
+        "type": "ratio",
+        "type_params": {
+            "numerator": {
+                "name": "order_count"
+            },
+            "denominator": {
+                "name": "customer_count"
+            }
+        }
+    }
+
+    customers = customers_model | {"measures": [{"name": "customer_count", "agg": "count"}]}
+    index = SemanticIndex([orders_model, customers], [order_count, customer_count, order_ratio, mixed_ratio])
+
+    assert index.metrics_for_model("orders") == (order_count, order_ratio)
+    assert index.metrics_for_model("customers") == (customer_count,)
+    assert index.metrics_for_model("unknown") == ()
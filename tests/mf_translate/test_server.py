@@ -0,0 +1,111 @@
+import os
+import json
+import socket
+import threading
+import http.client
+import lkml
+import pytest
+from mf_translate import Translator
+import mf_translate.server as server
+
+
+@pytest.fixture
+def service(synthetic_project):
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=3, metrics_per_model=2, set_manifests=False)
+    return server.TranslationService(translator=Translator(semantic_manifest, dbt_manifest))
+
+
+def serve_in_thread(http_server):
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_translate_requests(service):
+
+    status, response = service.translate({"model": "model_1", "view_name": "model_1_base"})
+    assert status == 200
+    assert lkml.load(response["text"])["views"][0]["name"] == "model_1_base"
+
+    status, response = service.translate({"model": "model_1", "to": "cube"})
+    assert status == 200
+    assert response["text"].startswith("cubes:\n  - name: model_1\n")
+
+    assert service.translate({"model": "unknown"})[0] == 404
+    assert service.translate({"model": "model_1", "to": "tableau"})[0] == 400
+    assert service.translate(["model_1"])[0] == 400
+
+    latency = service.status()["latency"]
+    assert latency["requests"] == 5
+    assert latency["errors"] == 3
+    assert latency["max_ms"] >= latency["p50_ms"] > 0
+
+
+def test_http_server(service):
+
+    http_server = server.make_server(service, port=0)
+    serve_in_thread(http_server)
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", http_server.server_address[1], timeout=5)
+        for _ in range(2): # Requests share a kept-alive connection
+            connection.request("POST", "/translate", body=json.dumps({"model": "model_2"}))
+            response = connection.getresponse()
+            assert response.status == 200
+            assert json.loads(response.read())["text"].startswith("view: model_2 {")
+
+        connection.request("GET", "/stats")
+        assert json.loads(connection.getresponse().read())["latency"]["requests"] == 2
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def test_unix_socket_server(service, tmp_path):
+
+    socket_path = str(tmp_path / "mf_translate.sock")
+    http_server = server.make_server(service, socket_path=socket_path)
+    serve_in_thread(http_server)
+    try:
+        body = json.dumps({"model": "model_0", "to": "lightdash"}).encode()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(b"POST /translate HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                           + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            raw_response = b"".join(iter(lambda: client.recv(65536), b""))
+        headers, _, payload = raw_response.partition(b"\r\n\r\n")
+        assert headers.startswith(b"HTTP/1.1 200")
+        assert "name: model_0" in json.loads(payload)["text"]
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def test_socket_path_is_only_replaced_if_it_is_a_socket(service, tmp_path):
+
+    # A stale socket left by a previous server is replaced
+    socket_path = str(tmp_path / "mf_translate.sock")
+    server.make_server(service, socket_path=socket_path).socket.close()
+    assert os.path.exists(socket_path)
+    server.make_server(service, socket_path=socket_path).server_close()
+
+    # Any other file is kept
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text("{}")
+    with pytest.raises(SystemExit):
+        server.make_server(service, socket_path=str(manifest_path))
+    assert manifest_path.read_text() == "{}"
+
+
+def test_reload_when_project_changes(monkeypatch, synthetic_project, service):
+
+    snapshots = iter([{"models/orders.yml": (1, 10)}] * 3 + [{"models/orders.yml": (2, 12)}] * 2)
+    monkeypatch.setattr(server.TranslationService, "_watched_files", lambda self: next(snapshots))
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=5, metrics_per_model=1, set_manifests=False)
+    monkeypatch.setattr(server, "parse_dbt_project", lambda manifest_dir: True)
+    monkeypatch.setattr(server, "load_manifests", lambda manifest_dir: (semantic_manifest, dbt_manifest, None))
+
+    assert service.reload_if_changed() is True   # First check always loads
+    assert service.reload_if_changed() is False  # Unchanged
+    assert service.reload_if_changed() is True   # Changed
+    assert service.status()["models"] == 5
+    assert service.reloads == 2
@@ -0,0 +1,202 @@
+import pytest
+import mf_translate.to_looker as to_looker
+import mf_translate.to_cube as to_cube
+import mf_translate.to_ldsh as to_ldsh
+from mf_translate.semantic_index import SemanticIndex
+from mf_translate.sql_expression import dimension_ref_parts, ExpressionCache, EXPRESSION_CACHE
+
+orders_model = {
+    "name": "orders",
+    "node_relation": {
+        "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`"
+    },
+    "entities": [
+        {
+            "name": "order_id",
+            "type": "primary"
+        },
+        {
+            "name": "customer_id",
+            "type": "foreign"
+        }
+    ],
+    "dimensions": [
+        {
+            "name": "status",
+            "type": "categorical"
+        },
+        {
+            "name": "ordered_at",
+            "type": "time",
+            "type_params": {
+                "time_granularity": "week"
+            }
+        }
+    ]
+}
+
+customers_model = {
+    "name": "customers",
+    "node_relation": {
+        "relation_name": "`mf_translate_db`.`jaffle_shop`.`customers`"
+    },
+    "entities": [
+        {
+            "name": "customer_id",
+            "type": "primary"
+        },
+        {
+            "name": "region_id",
+            "type": "foreign"
+        }
+    ],
+    "dimensions": [
+        {
+            "name": "customer_type",
+            "type": "categorical"
+        }
+    ]
+}
+
+regions_model = {
+    "name": "regions",
+    "node_relation": {
+        "relation_name": "`mf_translate_db`.`jaffle_shop`.`regions`"
+    },
+    "entities": [
+        {
+            "name": "region_id",
+            "type": "primary"
+        }
+    ],
+    "dimensions": [
+        {
+            "name": "region_name",
+            "type": "categorical"
+        }
+    ]
+}
+
+dbt_manifest = {
+    "nodes": {
+        "model.jaffle_shop.orders": {
+            "relation_name": "`mf_translate_db`.`jaffle_shop`.`orders`",
+            "columns": {"order_id": {}, "status": {}, "revenue": {}, "customer_id": {}}
+        },
+        "model.jaffle_shop.customers": {
+            "relation_name": "`mf_translate_db`.`jaffle_shop`.`customers`",
+            "columns": {"customer_id": {}, "customer_type": {}}
+        },
+        "model.jaffle_shop.regions": {
+            "relation_name": "`mf_translate_db`.`jaffle_shop`.`regions`",
+            "columns": {"region_id": {}, "region_name": {}}
+        }
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def manifests():
+    semantic_manifest = {"semantic_models": [orders_model, customers_model, regions_model], "metrics": []}
+    semantic_index = SemanticIndex(semantic_manifest["semantic_models"], semantic_manifest["metrics"], dbt_manifest["nodes"])
+    for translator in [to_looker, to_cube, to_ldsh]: # Sharing the index shares parsed expressions between dialects
+        translator.set_manifests(metricflow_semantic_manifest=semantic_manifest, dbt_manifest=dbt_manifest,
+                                 semantic_index=semantic_index)
+    yield
+    for translator in [to_looker, to_cube, to_ldsh]:
+        translator.set_manifests(metricflow_semantic_manifest={}, dbt_manifest={})
+
+
+def test_literals_and_qualified_identifiers_are_not_columns():
+
+    expression = "case when orders.status = 'revenue' then \"revenue\" else revenue end"
+
+    assert to_looker.sql_expression_to_lkml(expression, orders_model) == \
+        "case when orders.status = 'revenue' then \"revenue\" else ${TABLE}.revenue end"
+    assert to_cube.sql_expression_to_cube(expression, orders_model) == \
+        "case when orders.status = 'revenue' then \"revenue\" else {CUBE}.revenue end"
+
+
+def test_dimension_ref_is_not_rewritten_as_column():
+
+    expression = "{{ Dimension('order_id__status') }} = status"
+
+    assert to_looker.sql_expression_to_lkml(expression, orders_model) == "${status} = ${TABLE}.status"
+    assert to_cube.sql_expression_to_cube(expression, orders_model) == "{status} = {CUBE}.status"
+    assert to_ldsh.sql_expression_to_ldsh(expression, orders_model) == "${status} = ${TABLE}.status"
+
+
+def test_dimension_and_entity_refs_from_other_models():
+
+    expression = "{{Dimension( 'customer_id__customer_type' )}} = 'returning'\n and {{ Entity('customer_id') }} is not null\n"
+
+    assert to_looker.sql_expression_to_lkml(expression, orders_model) == \
+        "${customers.customer_type} = 'returning'  and ${customer_id} is not null"
+    assert to_cube.sql_expression_to_cube(expression, orders_model) == \
+        "{customers.customer_type} = 'returning'\n and {{ Entity('customer_id') }} is not null"
+
+
+def test_multi_hop_dimension_ref():
+
+    assert dimension_ref_parts('order_id__customer_id__region_id__region_name') == ('region_id', 'region_name')
+    assert to_cube.sql_expression_to_cube("{{ Dimension('customer_id__region_id__region_name') }}", orders_model) == \
+        "{regions.region_name}"
+
+
+def test_time_dimension_ref():
+
+    assert to_looker.sql_expression_to_lkml("{{ TimeDimension('order_id__ordered_at', 'day') }}", customers_model) == \
+        "${orders.ordered_at_date}"
+    assert to_looker.sql_expression_to_lkml("{{ TimeDimension('order_id__ordered_at') }}", orders_model) == \
+        "${ordered_at_week}"
+    assert to_ldsh.sql_expression_to_ldsh("{{ TimeDimension('order_id__ordered_at', 'day') }}", orders_model) == \
+        "{{ TimeDimension('order_id__ordered_at', 'day') }}"
+
+
+def test_metric_time_refs_are_kept():
+
+    expression = "{{ TimeDimension('metric_time', 'day') }} >= '2024-01-01' and {{Dimension( \"metric_time\" )}} < revenue"
+
+    assert to_looker.sql_expression_to_lkml(expression, orders_model) == \
+        "{{ TimeDimension('metric_time', 'day') }} >= '2024-01-01' and {{Dimension( \"metric_time\" )}} < ${TABLE}.revenue"
+    assert to_cube.sql_expression_to_cube(expression, orders_model) == \
+        "{{ TimeDimension('metric_time', 'day') }} >= '2024-01-01' and {{Dimension( \"metric_time\" )}} < {CUBE}.revenue"
+
+
+def test_unknown_entity_raises():
+
+    with pytest.raises(ValueError):
+        to_looker.sql_expression_to_lkml("{{ Dimension('unknown__status') }}", orders_model)
+
+
+def test_expression_cache_hits_and_invalidation():
+
+    to_looker.sql_expression_to_lkml("revenue * 0.1", orders_model)
+    info = EXPRESSION_CACHE.info()
+
+    assert to_looker.sql_expression_to_lkml("revenue * 0.1", orders_model) == "${TABLE}.revenue * 0.1"
+    assert EXPRESSION_CACHE.info()['hits'] == info['hits'] + 1
+
+    # Another dialect is rendered from the cached parse of the expression
+    assert to_cube.sql_expression_to_cube("revenue * 0.1", orders_model) == "{CUBE}.revenue * 0.1"
+    assert EXPRESSION_CACHE.info()['misses'] == info['misses'] + 1
+    assert EXPRESSION_CACHE.info()['hits'] == info['hits'] + 2
+
+    # New manifests invalidate the cached translations
+    to_looker.set_manifests(metricflow_semantic_manifest={"semantic_models": [orders_model], "metrics": []},
+                            dbt_manifest={"nodes": {}})
+    assert to_looker.sql_expression_to_lkml("revenue * 0.1", orders_model) == "revenue * 0.1"
+
+
+def test_expression_cache_is_bounded():
+
+    cache = ExpressionCache(maxsize=2)
+    index = to_looker.semantic_index()
+    translate = lambda expression, from_model, index: expression.upper()
+
+    for expression in ["a", "b", "a", "c"]:
+        cache.translate('looker', expression, orders_model, index, translate)
+
+    assert cache.info() == {'hits': 1, 'misses': 3, 'size': 2, 'maxsize': 2}
+    cache.translate('looker', "a", orders_model, index, translate) # "b" was least recently used
+    assert cache.info()['hits'] == 2
@@ -0,0 +1,69 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+import mf_translate.to_looker as to_looker
+import pytest
+from mf_translate import Translator
+
+
+@pytest.fixture
+def two_projects(synthetic_project):
+
+    semantic_manifest_a, dbt_manifest_a = synthetic_project(num_models=4, metrics_per_model=3, set_manifests=False)
+    semantic_manifest_b, dbt_manifest_b = synthetic_project(num_models=4, metrics_per_model=2, set_manifests=False)
+    for node in dbt_manifest_b["nodes"].values():
+        node["columns"] = {} # Project B's columns are not rewritten to ${TABLE}.column
+
+    return Translator(semantic_manifest_a, dbt_manifest_a), Translator(semantic_manifest_b, dbt_manifest_b)
+
+
+def test_translators_are_independent(two_projects):
+
+    translator_a, translator_b = two_projects
+
+    view_a = translator_a.model_to_lkml_view("model_1")
+    view_b = translator_b.model_to_lkml_view("model_1")
+
+    assert [measure["name"] for measure in view_a["measures"]] == ["model_1_metric_0", "model_1_metric_1", "model_1_metric_2", "model_1_ratio"]
+    assert [measure["name"] for measure in view_b["measures"]] == ["model_1_metric_0", "model_1_metric_1", "model_1_ratio"]
+    assert translator_a.sql_expression_to_cube("amount_0 * 2", "model_1") == "{CUBE}.amount_0 * 2"
+    assert translator_b.sql_expression_to_cube("amount_0 * 2", "model_1") == "amount_0 * 2"
+
+    # The module globals are untouched
+    assert to_looker.SEMANTIC_MODELS == []
+    assert to_looker.semantic_index().models == {}
+
+
+def test_translators_are_thread_safe(two_projects):
+
+    translator_a, translator_b = two_projects
+
+    def translate_all(translator):
+        return [(translator.model_to_lkml_view(name), translator.model_to_cube_cube(name), translator.model_to_ldsh_model(name))
+                for name in translator.semantic_index.models]
+
+    expected = {id(translator_a): copy.deepcopy(translate_all(translator_a)),
+                id(translator_b): copy.deepcopy(translate_all(translator_b))}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [(translator, executor.submit(translate_all, translator)) for translator in [translator_a, translator_b] * 20]
+        for translator, future in futures:
+            assert future.result() == expected[id(translator)]
+
+
+def test_translators_have_their_own_warehouse_type(synthetic_project, monkeypatch):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=2, metrics_per_model=1, set_manifests=False)
+    monkeypatch.delenv("MF_TRANSLATE_TARGET_WAREHOUSE_TYPE")
+
+    bigquery = Translator(semantic_manifest, dbt_manifest, warehouse_type="BigQuery")
+    snowflake = Translator(semantic_manifest, dbt_manifest, warehouse_type="snowflake")
+
+    assert bigquery.metric_to_lkml_measures("model_1_ratio", "model_1")[-1]["sql"] == \
+        "cast(${model_1_metric_0} as float64) / nullif(${model_1_metric_0}, 0)"
+    assert snowflake.metric_to_lkml_measures("model_1_ratio", "model_1")[-1]["sql"] == \
+        "${model_1_metric_0}::double / nullif(${model_1_metric_0}, 0)"
+
+    with pytest.raises(ValueError, match="Warehouse type must be defined"):
+        Translator(semantic_manifest, dbt_manifest).metric_to_lkml_measures("model_1_ratio", "model_1")
+    with pytest.raises(ValueError, match="Unsupported warehouse type"):
+        Translator(semantic_manifest, dbt_manifest, warehouse_type="postgres")
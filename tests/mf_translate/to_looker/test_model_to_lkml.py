@@ -80,3 +80,56 @@ def test_basic_model_to_lkml_view(monkeypatch):
     assert any(dim['name'] == 'delivery_rating' for dim in lkml_view['dimensions'])
     assert any(dim_group['name'] == 'delivered_at' for dim_group in lkml_view['dimension_groups'])
     assert any(measure['name'] == 'delivery_count' for measure in lkml_view['measures'])
+
+
+def test_filtered_metric_with_time_dimension(monkeypatch):
+
+    deliveries_model = {
+        "name": "deliveries",
+        "defaults": {"agg_time_dimension": "delivered_at"},
+        "node_relation": {"alias": "deliveries", "schema_name": "jaffle_shop", "relation_name": "jaffle_shop.deliveries"},
+        "entities": [{"name": "delivery_id", "type": "primary"}],
+        "dimensions": [{"name": "delivered_at", "type": "time", "type_params": {"time_granularity": "day"}}],
+        "measures": [{"name": "delivery_count", "agg": "count", "expr": "delivery_id"}]
+    }
+
+    recent_delivery_count = {
+        "name": "recent_delivery_count",
+        "label": "Recent deliveries",
+        "description": "Deliveries since 2024",
+        "type": "simple",
+        "type_params": {"measure": {"name": "delivery_count"}},
+        "filter": {"where_filters": [{"where_sql_template": "{{ TimeDimension('delivery_id__delivered_at', 'month') }} >= '2024-01-01' and {{ TimeDimension('metric_time', 'day') }} < '2025-01-01'"}]}
+    }
+
+    monkeypatch.setattr(to_looker, "SEMANTIC_MODELS", [deliveries_model])
+    monkeypatch.setattr(to_looker, "METRICS", [recent_delivery_count])
+
+    lkml_view = to_looker.model_to_lkml_view(deliveries_model)
+
+    # The TimeDimension is rewritten to the field of its dimension group at the grain; metric_time is kept verbatim
+    measure = next(measure for measure in lkml_view["measures"] if measure["name"] == "recent_delivery_count")
+    assert measure["sql"] == ("case when (${delivered_at_month} >= '2024-01-01' and {{ TimeDimension('metric_time', 'day') }} < '2025-01-01')\n"
+                              "            then (delivery_id)\n"
+                              "         end")
+
+
+def test_model_to_lkml_view_only_translates_owned_metrics(monkeypatch, synthetic_project):
+
+    semantic_manifest, dbt_manifest = synthetic_project(num_models=20, metrics_per_model=4, set_manifests=False)
+    monkeypatch.setattr(to_looker, "SEMANTIC_MODELS", semantic_manifest["semantic_models"])
+    monkeypatch.setattr(to_looker, "METRICS", semantic_manifest["metrics"])
+    monkeypatch.setattr(to_looker, "DBT_NODES", dbt_manifest["nodes"])
+
+    translated = []
+    metric_to_lkml_measures = to_looker.metric_to_lkml_measures
+    monkeypatch.setattr(to_looker, "metric_to_lkml_measures",
+                        lambda metric, from_model: translated.append(metric["name"]) or metric_to_lkml_measures(metric, from_model))
+
+    lkml_views = [to_looker.model_to_lkml_view(model) for model in semantic_manifest["semantic_models"]]
+
+    # One translation per metric across the whole project, rather than one per (model, metric) pair
+    assert sorted(translated) == sorted(metric["name"] for metric in semantic_manifest["metrics"])
+    assert [measure["name"] for measure in lkml_views[3]["measures"]] == ["model_3_metric_0", "model_3_metric_1",
+                                                                           "model_3_metric_2", "model_3_metric_3",
+                                                                           "model_3_ratio"]
@@ -0,0 +1,46 @@
+import re
+import sys
+import statistics
+import subprocess
+import pytest
+
+# Cold-start budgets in seconds for importing each package, measured with `python -X importtime`. Several times the
+# time measured on a laptop, so that only a regression (e.g. a heavy dependency imported at start-up) fails.
+IMPORT_TIME_BUDGETS = {
+    'mf_translate': 0.5,
+    'mf_compare_query': 0.75,
+}
+
+# Importing either package must not pull in these packages, which are imported on first use (or, for dbt and
+# MetricFlow, only run as subprocesses).
+HEAVY_PACKAGES = ['pandas', 'looker_sdk', 'tabulate', 'lkml', 'ruamel', 'duckdb', 'dbt', 'metricflow']
+
+
+def cumulative_import_time(module, runs=3):
+    """
+    Returns the median cumulative import time of `module` in seconds over `runs` fresh interpreters.
+    """
+
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True)
+        match = re.search(rf'^import time:\s+\d+ \|\s+(\d+) \| {module}$', result.stderr, re.MULTILINE)
+        timings.append(int(match.group(1)) / 1e6)
+    return statistics.median(timings)
+
+
+@pytest.mark.parametrize('module', IMPORT_TIME_BUDGETS)
+def test_import_time_is_within_budget(module):
+
+    assert cumulative_import_time(module) <= IMPORT_TIME_BUDGETS[module]
+
+
+@pytest.mark.parametrize('module', IMPORT_TIME_BUDGETS)
+def test_heavy_dependencies_are_not_imported(module):
+
+    result = subprocess.run([sys.executable, '-c', f'import sys, {module}; print(" ".join(sorted(sys.modules)))'],
+                            capture_output=True, text=True, check=True)
+    loaded = {name.split('.')[0] for name in result.stdout.split()}
+
+    assert [heavy for heavy in HEAVY_PACKAGES if heavy in loaded] == []